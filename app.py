@@ -1,8 +1,8 @@
 import streamlit as st
-from utils import get_database, hash_password, verify_password, init_session_state, get_cookie_controller, COOKIE_PREFIX
+from utils import get_command_monitor, get_database, is_admin, start_client_warm_up, get_network_watcher, hash_password, verify_password, init_session_state, get_cookie_controller, read_session_cookie, set_session_cookie, SESSION_COOKIE
+from geo import to_point
 import uuid
 from datetime import datetime
-from bson.objectid import ObjectId
 import time
 
 
@@ -18,6 +18,9 @@ st.set_page_config(
 # Initialize session state
 init_session_state()
 
+# Connect in the background so logging in does not wait for the handshake
+start_client_warm_up()
+
 
 # Initialize controller with a container to hide it
 controller = get_cookie_controller()
@@ -26,40 +29,20 @@ with st.container(height=1, border=False):
 
 
 def try_auto_login_from_cookie():
-    """Auto-login from cookies if available"""
+    """Auto-login from a signed session cookie, checked locally without the database"""
     if st.session_state.get("logged_in"):
         return
 
-    time.sleep(0.5)
-    
-    try:
-        cookies = controller.getAll()
-        center_id_cookie = cookies.get(f"{COOKIE_PREFIX}_center_id")
-        email_cookie = cookies.get(f"{COOKIE_PREFIX}_email")
-
-        if not center_id_cookie or not email_cookie:
-            return
-
-        db = get_database()
-        if db is None:
-            return
-
-        centers = db["centers"]
-        try:
-            center = centers.find_one({"_id": ObjectId(center_id_cookie)})
-        except Exception:
-            return
-
-        if not center:
-            return
+    # The cookie component delivers its values on a rerun of its own, so a
+    # missing cookie on the very first run is not an error.
+    claims = read_session_cookie(controller)
+    if not claims:
+        return
 
-        st.session_state.logged_in = True
-        st.session_state.center_id = str(center["_id"])
-        st.session_state.center_name = center["center_name"]
-        st.session_state.center_email = center["email"]
-        
-    except Exception as e:
-        pass
+    st.session_state.logged_in = True
+    st.session_state.center_id = claims["cid"]
+    st.session_state.center_name = claims["name"]
+    st.session_state.center_email = claims["email"]
 
 
 try_auto_login_from_cookie()
@@ -67,8 +50,8 @@ try_auto_login_from_cookie()
 
 def logout():
     controller = get_cookie_controller()
-    controller.remove(f"{COOKIE_PREFIX}_center_id")
-    controller.remove(f"{COOKIE_PREFIX}_email")
+    if controller.get(SESSION_COOKIE) is not None:
+        controller.remove(SESSION_COOKIE)
 
     st.session_state.logged_in = False
     st.session_state.center_id = None
@@ -159,8 +142,7 @@ if not st.session_state.logged_in:
                         st.session_state.center_email = user["email"]
                         st.session_state.page = 'dashboard'
 
-                        controller.set(f"{COOKIE_PREFIX}_center_id", str(user["_id"]), max_age=7 * 24 * 60 * 60)
-                        controller.set(f"{COOKIE_PREFIX}_email", user["email"], max_age=7 * 24 * 60 * 60)
+                        set_session_cookie(controller, str(user["_id"]), user["email"], user["center_name"])
 
                         st.success("✅ Login successful! Redirecting...")
                         time.sleep(0.5)
@@ -222,11 +204,14 @@ if not st.session_state.logged_in:
                                     "lat": latitude,
                                     "lng": longitude
                                 },
+                                "location": to_point(latitude, longitude),
                                 "status": "active",
                                 "created_at": datetime.now(),
                                 "updated_at": datetime.now()
                             }
                             
+                            if center_data["location"] is None:
+                                del center_data["location"]  # the 2dsphere index rejects null points
                             result = users.insert_one(center_data)
                             st.success("✅ Account created successfully!")
                             st.info("📲 Redirecting to login page...")
@@ -242,34 +227,40 @@ if not st.session_state.logged_in:
         """, unsafe_allow_html=True)
 
 else:
+    # Keep this process in sync with writes made by other sessions/servers
+    get_network_watcher()
+
     # LOGGED IN - NO STYLING CHANGES, KEEP ORIGINAL
     with st.sidebar:
         st.markdown(f"### 👋 Welcome, {st.session_state.center_name}!")
         st.divider()
         
-        page = st.radio(
-            "Navigation",
-            ["Dashboard", "My Inventory", "My Requests", "Browse Items", "Settings"],
-            key="sidebar_nav"
-        )
+        pages = ["Dashboard", "My Inventory", "My Requests", "Browse Items", "Settings"]
+        if is_admin(st.session_state.center_email):
+            pages.append("Diagnostics")
+        page = st.radio("Navigation", pages, key="sidebar_nav")
         
         st.divider()
         if st.button("🚪 Logout", use_container_width=True):
             logout()
     
-    # Route to pages based on selection
-    if page == "Dashboard":
-        from components import dashboard
-        dashboard.show()
-    elif page == "My Inventory":
-        from components import inventory
-        inventory.show()
-    elif page == "My Requests":
-        from components import requests
-        requests.show()
-    elif page == "Browse Items":
-        from components import browse
-        browse.show()
-    elif page == "Settings":
-        from components import settings
-        settings.show()
+    # Route to pages based on selection; Mongo time is attributed to the page
+    with get_command_monitor().track_page(page):
+        if page == "Dashboard":
+            from components import dashboard
+            dashboard.show()
+        elif page == "My Inventory":
+            from components import inventory
+            inventory.show()
+        elif page == "My Requests":
+            from components import requests
+            requests.show()
+        elif page == "Browse Items":
+            from components import browse
+            browse.show()
+        elif page == "Settings":
+            from components import settings
+            settings.show()
+        elif page == "Diagnostics":
+            from components import diagnostics
+            diagnostics.show()
@@ -0,0 +1,281 @@
+"""Time every page's data path on synthetic data across scale tiers.
+
+Loads a seeded tier (see synthetic.py) into an in-memory mongomock database
+or, with --uri, into a local mongod, then times the queries and Python
+post-processing behind Dashboard, My Inventory, Browse and My Requests for a
+sample of centers. Results are written as JSON for comparison between
+commits:
+
+    python benchmarks/bench_pages.py --tiers tiny small
+    python benchmarks/bench_pages.py --uri mongodb://localhost:27017 --tiers medium large
+    python benchmarks/bench_pages.py --tiers small --compare benchmarks/results/<earlier run>.json
+
+Operators the backend does not implement (mongomock has no $text or
+$geoNear) are reported as skipped rather than failing the run.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd  # noqa: E402
+from migrations import DATABASE_NAME, run_migrations  # noqa: E402
+from components import browse, dashboard, inventory  # noqa: E402
+from geo import center_coordinates  # noqa: E402
+from matching import MatchIndex  # noqa: E402
+from search import TrigramIndex, fuzzy_search  # noqa: E402
+import synthetic  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BENCH_DATABASE = "helpkart_bench"
+REGRESSION_RATIO = 1.2
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(timings, docs):
+    return {
+        "runs": len(timings),
+        "min_ms": round(min(timings), 3),
+        "p50_ms": round(percentile(timings, 0.5), 3),
+        "p95_ms": round(percentile(timings, 0.95), 3),
+        "max_ms": round(max(timings), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "docs": round(statistics.fmean(docs), 1) if docs else 0,
+    }
+
+
+class Recorder:
+    """Collects timings per case; unsupported operators mark a case skipped"""
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.timings = {}
+        self.docs = {}
+        self.skipped = {}
+
+    def time(self, case, fn):
+        """Run fn repeat times and return its last result (None if skipped)"""
+        if case in self.skipped:
+            return None
+        result = None
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            try:
+                result = fn()
+            except NotImplementedError as e:
+                self.skipped[case] = str(e)
+                return None
+            self.timings.setdefault(case, []).append((time.perf_counter() - start) * 1000)
+        self.docs.setdefault(case, []).append(_count(result))
+        return result
+
+    def results(self):
+        cases = {case: summarize(values, self.docs.get(case, [])) for case, values in self.timings.items()}
+        for case, reason in self.skipped.items():
+            cases[case] = {"skipped": reason}
+        return cases
+
+
+def _count(result):
+    if isinstance(result, tuple):
+        result = result[0]
+    if isinstance(result, (list, pd.DataFrame)):
+        return len(result)
+    return 1 if result else 0
+
+
+def bench_center(recorder, db, center):
+    """Time the data path of each page for one center"""
+    center_id = str(center["_id"])
+    items = db["inventory"]
+
+    # Dashboard
+    recorder.time("dashboard.profile", lambda: db["centers"].find_one({"_id": center["_id"]}, {"password": 0}))
+    recorder.time("dashboard.load_metrics", lambda: dashboard.load_metrics(items, center_id))
+
+    # My Inventory: query plus the grid frame built from it
+    rows = recorder.time("inventory.load_items", lambda: inventory.load_items(items, center_id))
+    recorder.time("inventory.grid_frame", lambda: pd.DataFrame(
+        [{column: item.get(column) for column in inventory.GRID_COLUMNS} for item in rows]))
+
+    # Browse
+    query = browse.build_query(center_id, [], "", 0)
+    first = recorder.time("browse.first_page", lambda: browse.fetch_page(items, query, 25))
+    if first and first[0]:
+        last = first[0][-1]
+        cursor = (last.get("updated_at"), last["_id"])
+        recorder.time("browse.next_page", lambda: browse.fetch_page(items, query, 25, cursor))
+    filtered = browse.build_query(center_id, ["Medical"], "", 10)
+    recorder.time("browse.filtered_page", lambda: browse.fetch_page(items, filtered, 25))
+    recorder.time("browse.search", lambda: browse.search_page(
+        items, browse.build_query(center_id, [], "", 0), "bandage", browse.BROWSE_PROJECTION, 25))
+    origin = center_coordinates(center)
+    if origin is not None:
+        recorder.time("browse.nearest_page", lambda: browse.fetch_nearby_page(
+            db["centers"], origin, center_id, query, 25, max_km=50))
+
+    # My Requests
+    recorder.time("requests.list", lambda: list(db["requests"].find({"center_id": center_id})))
+
+
+def bench_indexes(recorder, db, sample):
+    """Time building the in-process indexes and a lookup per sampled center"""
+    docs = list(db["inventory"].find({}, {"center_id": 1, "item_name": 1, "description": 1,
+                                          "category": 1, "quantity": 1, "unit": 1, "updated_at": 1}))
+    match_index = MatchIndex()
+    trigram_index = TrigramIndex()
+
+    def build():
+        for doc in docs:
+            match_index.upsert(doc)
+            trigram_index.on_change(None, doc)
+
+    _once(recorder, "indexes.build", build)
+    for center in sample:
+        center_id = str(center["_id"])
+        for request in db["requests"].find({"center_id": center_id, "status": "Pending"}).limit(3):
+            recorder.time("matching.match", lambda: match_index.match(
+                request["item_name"], request["quantity"], center_id, 3))
+        recorder.time("search.fuzzy", lambda: fuzzy_search(match_index, trigram_index, "bandge", 0, center_id, 25))
+
+
+def _once(recorder, case, fn):
+    # Index builds are too slow to repeat and mutate state
+    repeat, recorder.repeat = recorder.repeat, 1
+    try:
+        recorder.time(case, fn)
+    finally:
+        recorder.repeat = repeat
+
+
+def bench_tier(db, tier, seed, samples, repeat):
+    print(f"📦 Loading tier {tier}...")
+    start = time.perf_counter()
+    counts = synthetic.load(db, tier, seed)
+    load_seconds = time.perf_counter() - start
+    try:
+        run_migrations(db, reconcile=True)
+        indexes = "applied"
+    except NotImplementedError as e:
+        indexes = f"skipped: {e}"
+    print(f"   {counts} in {load_seconds:.1f}s, indexes {indexes}")
+
+    rng = random.Random(seed)
+    centers = list(db["centers"].find({}, {"password": 0}))
+    sample = rng.sample(centers, min(samples, len(centers)))
+
+    recorder = Recorder(repeat)
+    for center in sample:
+        bench_center(recorder, db, center)
+    bench_indexes(recorder, db, sample)
+
+    return {
+        "counts": counts,
+        "load_seconds": round(load_seconds, 2),
+        "indexes": indexes,
+        "sampled_centers": len(sample),
+        "cases": recorder.results(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path, ratio=REGRESSION_RATIO):
+    """Print p50 changes against an earlier result file; return the regressions"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = []
+    for tier, result in current["tiers"].items():
+        before = baseline.get("tiers", {}).get(tier, {}).get("cases", {})
+        for case, stats in sorted(result["cases"].items()):
+            old = before.get(case, {})
+            if "p50_ms" not in stats or "p50_ms" not in old or not old["p50_ms"]:
+                continue
+            change = stats["p50_ms"] / old["p50_ms"]
+            marker = "🔴" if change > ratio else "🟢" if change < 1 / ratio else "  "
+            print(f"{marker} {tier:<7} {case:<26} {old['p50_ms']:>10.2f} -> {stats['p50_ms']:>10.2f} ms ({change:.2f}x)")
+            if change > ratio:
+                regressions.append((tier, case, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark page data paths on synthetic data")
+    parser.add_argument("--tiers", nargs="+", choices=list(synthetic.TIERS), default=["tiny", "small"])
+    parser.add_argument("--uri", help="local mongod to use instead of the in-memory mongomock")
+    parser.add_argument("--db", default=BENCH_DATABASE, help="database to fill (it is dropped first)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--samples", type=int, default=10, help="centers timed per tier")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case and center")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier result file to compare p50s with")
+    args = parser.parse_args()
+
+    if args.db == DATABASE_NAME:
+        raise ValueError(f"Refusing to overwrite the application database {DATABASE_NAME}")
+
+    if args.uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.uri)
+        backend = f"mongodb {client.server_info()['version']}"
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+        backend = f"mongomock {mongomock.__version__}"
+    db = client[args.db]
+
+    commit = git_commit()
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "commit": commit,
+        "backend": backend,
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "samples": args.samples,
+        "repeat": args.repeat,
+        "tiers": {},
+    }
+    for tier in args.tiers:
+        report["tiers"][tier] = bench_tier(db, tier, args.seed, args.samples, args.repeat)
+        for case, stats in sorted(report["tiers"][tier]["cases"].items()):
+            if "skipped" in stats:
+                print(f"   {case:<26} skipped")
+            else:
+                print(f"   {case:<26} p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit or 'nocommit'}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+    if args.compare and compare(report, args.compare):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
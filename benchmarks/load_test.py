@@ -0,0 +1,352 @@
+"""Drive concurrent simulated sessions through app.py to measure capacity.
+
+Each session is a Streamlit AppTest running the real app.py in this process,
+so sessions share the process-wide client, caches and watcher exactly like
+browser sessions on one server. A session logs in, then repeatedly opens the
+Dashboard, browses items, edits a row of the inventory grid and saves it,
+adds an inventory item and submits a request:
+
+    python benchmarks/load_test.py --sessions 20 --iterations 5
+    python benchmarks/load_test.py --uri mongodb://localhost:27017 --sessions 50 --tier medium
+
+Reported per run: script reruns per second, latency percentiles per page
+action, MongoDB time per page (with --uri, from the command monitor) and the
+resident memory added per session. Memory is measured for the whole process,
+so it includes AppTest's own bookkeeping and is an upper bound.
+
+mongomock is not thread-safe, so without --uri the sessions run one after
+another; those runs check that the pages work under the harness, but only
+--uri gives numbers for capacity planning.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bcrypt  # noqa: E402
+from unittest.mock import MagicMock  # noqa: E402
+from streamlit import config, runtime  # noqa: E402
+from streamlit.runtime import Runtime  # noqa: E402
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager  # noqa: E402
+from streamlit.runtime.media_file_manager import MediaFileManager  # noqa: E402
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage  # noqa: E402
+from streamlit.proto.WidgetStates_pb2 import WidgetState  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+from streamlit.testing.v1.element_tree import Widget  # noqa: E402
+import utils  # noqa: E402
+from migrations import DATABASE_NAME, run_migrations  # noqa: E402
+from bench_pages import BENCH_DATABASE, RESULTS_DIR, git_commit, summarize  # noqa: E402
+import synthetic  # noqa: E402
+
+APP = os.path.join(ROOT, "app.py")
+PASSWORD = "loadtest-password"
+SEARCH_TERMS = ["rice", "bandage", "blankets", "water", "tents"]
+
+
+def rss_mb():
+    """Current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        # Peak rather than current, but the best available off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Session:
+    """One simulated coordinator; records the latency of every action"""
+
+    def __init__(self, number, email, results, lock, think_seconds, text_search, timeout):
+        self.number = number
+        self.email = email
+        self.results = results
+        self.lock = lock
+        self.think_seconds = think_seconds
+        self.text_search = text_search
+        self.rng = random.Random(number)
+        self.at = AppTest.from_file(APP, default_timeout=timeout)
+        self.errors = []
+
+    def _record(self, action, fn):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        # st.error is also used for content (out of stock items), so only
+        # uncaught exceptions count as failures
+        failures = [e.value for e in self.at.exception]
+        with self.lock:
+            self.results["timings"].setdefault(action, []).append(elapsed)
+            self.results["reruns"] += 1
+            if failures:
+                self.results["errors"].append((action, str(failures[0])[:200]))
+        if self.think_seconds:
+            time.sleep(self.rng.uniform(0, 2 * self.think_seconds))
+
+    def _navigate(self, page):
+        self.at.sidebar.radio(key="sidebar_nav").set_value(page).run()
+
+    def login(self):
+        self._record("login_page", self.at.run)
+        self.at.text_input(key="login_email").input(self.email)
+        self.at.text_input(key="login_password").input(PASSWORD)
+        self._record("login", self.at.button(key="login_btn").click().run)
+        if not self.at.session_state["logged_in"]:
+            raise RuntimeError(f"session {self.number} could not log in as {self.email}")
+
+    def iteration(self, step):
+        self._record("dashboard", lambda: self._navigate("Dashboard"))
+
+        self._record("browse", lambda: self._navigate("Browse Items"))
+        category = self.rng.choice(synthetic.CATALOG)[1]
+        self._record("browse_filter", self.at.multiselect(key="browse_category").set_value([category]).run)
+        if self.text_search:
+            search = _by_label(self.at.text_input, "Search items")
+            self._record("browse_search", search.input(self.rng.choice(SEARCH_TERMS)).run)
+
+        self._record("inventory", lambda: self._navigate("My Inventory"))
+        grid = _grid(self.at)
+        if grid is not None and len(grid.value):
+            row = self.rng.randrange(len(grid.value))
+            _edit_grid(self.at, {"edited_rows": {str(row): {"quantity": self.rng.randint(0, 500)}},
+                                 "added_rows": [], "deleted_rows": []})
+            self._record("inventory_edit", self.at.run)
+            self._record("inventory_save", _by_prefix(self.at.button, "💾 Save").click().run)
+        name, _, _, description = self.rng.choice(synthetic.CATALOG)
+        _by_label(self.at.text_input, "Item Name").input(f"{name} (load {self.number}.{step})")
+        _by_label(self.at.number_input, "Quantity").set_value(self.rng.randint(1, 100))
+        _by_label(self.at.text_area, "Description").input(description)
+        self._record("inventory_add", _by_label(self.at.button, "Add Item").click().run)
+
+        self._record("requests", lambda: self._navigate("My Requests"))
+        _by_label(self.at.text_input, "Item Name").input(self.rng.choice(synthetic.CATALOG)[0])
+        _by_label(self.at.number_input, "Quantity").set_value(self.rng.randint(5, 200))
+        _by_label(self.at.text_area, "Reason for Request").input(self.rng.choice(synthetic.REASONS))
+        self._record("request_submit", _by_label(self.at.button, "Submit Request").click().run)
+
+
+def _by_label(widgets, label):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"no widget labelled {label!r} on the page")
+
+
+def _by_prefix(widgets, prefix):
+    for widget in widgets:
+        if widget.label.startswith(prefix):
+            return widget
+    raise LookupError(f"no widget labelled {prefix!r}... on the page")
+
+
+def _grid(at):
+    """The inventory data_editor, which AppTest shows as a read-only Dataframe"""
+    return next((node for node in at.get("arrow_data_frame") if "inventory_grid" in node.proto.id), None)
+
+
+class _GridEdit(Widget):
+    """Stands in for the data_editor so the next run receives edits, as from a browser"""
+
+    def __init__(self, grid, edits):
+        self.id = grid.proto.id
+        self.key = None
+        self.proto = grid.proto
+        self.root = grid.root
+        self.type = grid.type
+        self.edits = edits
+
+    @property
+    def value(self):
+        return self.edits
+
+    @property
+    def _widget_state(self):
+        state = WidgetState()
+        state.id = self.id
+        state.string_value = json.dumps(self.edits)
+        return state
+
+
+def _edit_grid(at, edits):
+    """Make the next run see edits ({"edited_rows", "added_rows", "deleted_rows"}) in the grid"""
+    grid = _grid(at)
+    blocks = [at._tree]
+    while blocks:
+        block = blocks.pop()
+        for index, child in getattr(block, "children", {}).items():
+            if child is grid:
+                block.children[index] = _GridEdit(grid, edits)
+                return
+            blocks.append(child)
+    raise LookupError("no inventory grid on the page")
+
+
+def share_runtime():
+    """Let AppTests run concurrently.
+
+    Every AppTest run installs its own mock Runtime singleton and clears it
+    when done, which breaks any other session running at the time. Serve one
+    shared mock instead, as a real server has one Runtime for all sessions.
+    """
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: shared)
+    runtime.get_instance = lambda: shared
+    # AppTest patches this option per run and restores the previous value
+    config.set_option("global.appTest", True)
+
+
+def use_database(client, db_name):
+    """Point the app's shared client at the load-test database"""
+    # utils.get_database looks both up at call time, so every page follows
+    utils.DATABASE_NAME = db_name
+    utils.get_mongo_client = lambda: client
+
+
+def prepare(db, tier, seed, sessions):
+    """Load a tier and give the first centers a known password; return their emails"""
+    print(f"📦 Loading tier {tier}...")
+    counts = synthetic.load(db, tier, seed)
+    try:
+        run_migrations(db, reconcile=True)
+    except NotImplementedError as e:
+        print(f"   indexes skipped: {e}")
+    print(f"   {counts}")
+
+    centers = list(db["centers"].find({}, {"email": 1}).sort("email", 1).limit(sessions))
+    if len(centers) < sessions:
+        raise ValueError(f"Tier {tier} has only {len(centers)} centers, use a larger tier")
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    db["centers"].update_many({"_id": {"$in": [c["_id"] for c in centers]}}, {"$set": {"password": hashed}})
+    return [c["email"] for c in centers]
+
+
+def run_session(session, iterations, start_barrier=None):
+    if start_barrier is not None:
+        start_barrier.wait()
+    try:
+        session.login()
+    except Exception as e:
+        session.errors.append(f"login: {type(e).__name__}: {e}")
+        return
+    for step in range(iterations):
+        try:
+            session.iteration(step)
+        except Exception as e:
+            # A page that failed to render has no widgets to drive; start the next cycle
+            session.errors.append(f"iteration {step}: {type(e).__name__}: {e}")
+
+
+def run_load(emails, iterations, think_seconds, text_search, timeout, serial=False):
+    lock = threading.Lock()
+    results = {"timings": {}, "reruns": 0, "errors": []}
+
+    before_mb = rss_mb()
+    sessions = [Session(number, email, results, lock, think_seconds, text_search, timeout)
+                for number, email in enumerate(emails)]
+    if serial:
+        start = time.perf_counter()
+        for session in sessions:
+            run_session(session, iterations)
+    else:
+        start_barrier = threading.Barrier(len(sessions) + 1)
+        threads = [threading.Thread(target=run_session, args=(session, iterations, start_barrier),
+                                    name=f"load-session-{session.number}") for session in sessions]
+        for thread in threads:
+            thread.start()
+        start_barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+    wall_seconds = time.perf_counter() - start
+    after_mb = rss_mb()
+
+    session_errors = [f"session {s.number} {error}" for s in sessions for error in s.errors]
+    return {
+        "sessions": len(sessions),
+        "concurrent": not serial,
+        "iterations": iterations,
+        "wall_seconds": round(wall_seconds, 2),
+        "reruns": results["reruns"],
+        "reruns_per_second": round(results["reruns"] / wall_seconds, 2) if wall_seconds else None,
+        "rss_before_mb": round(before_mb, 1),
+        "rss_after_mb": round(after_mb, 1),
+        "mb_per_session": round((after_mb - before_mb) / len(sessions), 2),
+        "actions": {action: summarize(values, []) for action, values in sorted(results["timings"].items())},
+        "page_errors": results["errors"][:50],
+        "session_errors": session_errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run concurrent simulated sessions against app.py")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=3, help="page cycles per session after login")
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds between actions")
+    parser.add_argument("--tier", choices=list(synthetic.TIERS), default="small")
+    parser.add_argument("--uri", help="local mongod to use instead of the in-memory mongomock")
+    parser.add_argument("--db", default=BENCH_DATABASE, help="database to fill (it is dropped first)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per script run")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/load_<time>_<commit>.json)")
+    args = parser.parse_args()
+
+    if args.db == DATABASE_NAME:
+        raise ValueError(f"Refusing to overwrite the application database {DATABASE_NAME}")
+
+    if args.uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.uri, event_listeners=[utils.get_command_monitor()])
+        backend = f"mongodb {client.server_info()['version']}"
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+        backend = f"mongomock {mongomock.__version__}"
+    db = client[args.db]
+    use_database(client, args.db)
+    share_runtime()
+
+    emails = prepare(db, args.tier, args.seed, args.sessions)
+    mode = "concurrent" if args.uri else "serial (mongomock is not thread-safe)"
+    print(f"🚦 {args.sessions} sessions x {args.iterations} iterations on {backend}, {mode}...")
+    # mongomock implements neither $text nor change streams
+    result = run_load(emails, args.iterations, args.think, bool(args.uri), args.timeout, serial=not args.uri)
+    if args.uri:
+        result["mongo_by_page"] = utils.get_command_monitor().page_stats()
+
+    for action, stats in result["actions"].items():
+        print(f"   {action:<16} n={stats['runs']:<5} p50 {stats['p50_ms']:>9.1f} ms  "
+              f"p95 {stats['p95_ms']:>9.1f} ms  max {stats['max_ms']:>9.1f} ms")
+    print(f"   {result['reruns']} reruns in {result['wall_seconds']}s = {result['reruns_per_second']} reruns/s, "
+          f"~{result['mb_per_session']} MB per session")
+    for error in result["session_errors"] + [f"{a}: {e}" for a, e in result["page_errors"]]:
+        print(f"⚠️ {error}")
+
+    commit = git_commit()
+    report = dict(result, generated_at=datetime.now().isoformat(), commit=commit, backend=backend,
+                  tier=args.tier, seed=args.seed, think_seconds=args.think)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit or 'nocommit'}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"✅ Results written to {output}")
+
+    if result["session_errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,229 @@
+"""Seeded synthetic helpkart data shaped like the documents in exports/.
+
+The same seed and tier always produce the same documents, so benchmark runs
+on different commits measure the code rather than the data.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+
+# Fixed reference date so generated timestamps do not drift between runs
+ANCHOR = datetime(2025, 12, 1)
+
+# name, category, unit, description
+CATALOG = [
+    ("Rice Bags", "Food", "bags", "Long-grain white rice bags for community kitchens"),
+    ("Wheat Flour", "Food", "kg", "Fortified wheat flour for bread and rotti"),
+    ("Red Lentils", "Food", "kg", "Dried red lentils, high protein staple"),
+    ("Drinking Water", "Food", "bottles", "Sealed 1.5 liter drinking water bottles"),
+    ("Canned Fish", "Food", "cartons", "Cartons of canned mackerel in tomato sauce"),
+    ("Milk Powder", "Food", "packets", "Full cream milk powder packets for families"),
+    ("Biscuits", "Food", "packets", "Energy biscuits for quick distribution"),
+    ("Sugar", "Food", "kg", "White sugar for relief kitchens"),
+    ("Baby Formula", "Food", "boxes", "Infant formula for babies under twelve months"),
+    ("Cooking Oil", "Food", "liters", "Vegetable cooking oil in sealed containers"),
+    ("Bandage Rolls", "Medical", "boxes", "Sterile cotton bandage rolls for wound dressing"),
+    ("Paracetamol Tablets", "Medical", "boxes", "Paracetamol 500mg tablets for fever and pain"),
+    ("Oral Rehydration Salts", "Medical", "packets", "ORS sachets for dehydration and diarrhoea"),
+    ("Antiseptic Liquid", "Medical", "bottles", "Antiseptic disinfectant for wound cleaning"),
+    ("Surgical Masks", "Medical", "boxes", "Disposable three-ply surgical face masks"),
+    ("Insulin Vials", "Medical", "pieces", "Insulin vials, keep refrigerated"),
+    ("Gauze Pads", "Medical", "packets", "Sterile gauze pads for first aid kits"),
+    ("Syringes", "Medical", "boxes", "Single-use sterile syringes"),
+    ("First Aid Kits", "Medical", "pieces", "Complete first aid kit for field teams"),
+    ("Gloves", "Medical", "boxes", "Nitrile examination gloves, assorted sizes"),
+    ("Blankets", "Clothing", "pieces", "Warm fleece blankets for shelters"),
+    ("T-Shirts", "Clothing", "pieces", "Cotton t-shirts, assorted sizes"),
+    ("Children's Clothes", "Clothing", "cartons", "Mixed children's clothing for ages two to ten"),
+    ("Rain Coats", "Clothing", "pieces", "Waterproof rain coats for volunteers"),
+    ("Sarongs", "Clothing", "pieces", "Cotton sarongs for displaced families"),
+    ("Towels", "Clothing", "pieces", "Bath towels for shelter residents"),
+    ("Slippers", "Clothing", "pieces", "Rubber slippers, assorted sizes"),
+    ("Bed Sheets", "Clothing", "pieces", "Single bed sheets for temporary camps"),
+    ("Tarpaulin Sheets", "Other", "pieces", "Heavy duty tarpaulin sheets for temporary roofing"),
+    ("Tents", "Other", "pieces", "Family tents for four people"),
+    ("Torches", "Other", "pieces", "Battery powered LED torches"),
+    ("Batteries", "Other", "packets", "AA batteries for torches and radios"),
+    ("Soap Bars", "Other", "cartons", "Antibacterial soap bars for hygiene kits"),
+    ("Sanitary Pads", "Other", "packets", "Sanitary pads for women's hygiene kits"),
+    ("Water Purification Tablets", "Other", "boxes", "Chlorine tablets for purifying drinking water"),
+    ("Buckets", "Other", "pieces", "Plastic buckets with lids"),
+    ("Mosquito Nets", "Other", "pieces", "Insecticide treated mosquito nets"),
+    ("Cooking Pots", "Other", "pieces", "Aluminium cooking pots for community kitchens"),
+    ("Rope", "Other", "meters", "Nylon rope for shelters and rescue"),
+    ("Candles", "Other", "packets", "Household candles for power outages"),
+]
+
+REASONS = [
+    "Stock ran out after the latest evacuation",
+    "Needed for families arriving at the shelter",
+    "Clinic first-aid box needs restocking",
+    "Community kitchen is serving more people this week",
+    "Replacing items damaged by flooding",
+]
+
+REQUEST_STATUSES = ["Pending", "Pending", "Pending", "Fulfilled", "Rejected"]
+
+# tier -> (centers, items per center, requests per center, transactions)
+TIERS = {
+    "tiny": (20, 50, 2, 100),
+    "small": (100, 100, 3, 1000),
+    "medium": (1000, 100, 3, 10000),
+    "large": (10000, 100, 3, 100000),
+}
+
+# Rough bounding box of Sri Lanka, where the real centers are
+LAT_RANGE = (5.9, 9.8)
+LNG_RANGE = (79.7, 81.9)
+
+
+def _object_id(rng):
+    return ObjectId(rng.randbytes(12))
+
+
+def _uuid(rng):
+    return str(uuid.UUID(bytes=rng.randbytes(16), version=4))
+
+
+def _timestamp(rng, days=180):
+    return ANCHOR - timedelta(seconds=rng.randrange(days * 24 * 3600))
+
+
+def _quantity(rng):
+    # Mostly healthy stock with a tail of low and empty items
+    roll = rng.random()
+    if roll < 0.05:
+        return 0
+    if roll < 0.15:
+        return rng.randint(1, 9)
+    return rng.randint(10, 500)
+
+
+def generate_centers(rng, count):
+    for number in range(count):
+        created_at = _timestamp(rng, 365)
+        lat, lng = rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)
+        yield {
+            "_id": _object_id(rng),
+            "center_id": _uuid(rng),
+            "center_name": f"Relief Center {number + 1:05d}",
+            "email": f"center{number + 1:05d}@example.org",
+            "password": "$2b$12$benchmark.placeholder.hash.not.a.real.password.value",
+            "phone": f"07{rng.randrange(10 ** 8):08d}",
+            "address": f"{rng.randint(1, 300)} Main Street, District {rng.randint(1, 25)}",
+            "location_coordinates": {"lat": lat, "lng": lng},
+            "location": {"type": "Point", "coordinates": [lng, lat]},
+            "status": "active",
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+
+def generate_inventory(rng, center_ids, per_center):
+    for center_id in center_ids:
+        for name, category, unit, description in rng.sample(CATALOG, min(per_center, len(CATALOG))):
+            yield _item(rng, center_id, name, category, unit, description)
+        # Centers with more items than the catalog get numbered batches
+        for extra in range(per_center - len(CATALOG)):
+            name, category, unit, description = rng.choice(CATALOG)
+            yield _item(rng, center_id, f"{name} (batch {extra + 1})", category, unit, description)
+
+
+def _item(rng, center_id, name, category, unit, description):
+    created_at = _timestamp(rng)
+    return {
+        "_id": _object_id(rng),
+        "item_id": _uuid(rng),
+        "center_id": center_id,
+        "item_name": name,
+        "category": category,
+        "quantity": _quantity(rng),
+        "unit": unit,
+        "description": description,
+        "version": rng.randint(0, 20),
+        "created_at": created_at,
+        "updated_at": created_at + timedelta(seconds=rng.randrange(30 * 24 * 3600)),
+    }
+
+
+def generate_requests(rng, center_ids, per_center):
+    for center_id in center_ids:
+        for _ in range(per_center):
+            created_at = _timestamp(rng, 60)
+            yield {
+                "_id": _object_id(rng),
+                "request_id": _uuid(rng),
+                "center_id": center_id,
+                "item_name": rng.choice(CATALOG)[0],
+                "quantity": rng.randint(5, 200),
+                "reason": rng.choice(REASONS),
+                "status": rng.choice(REQUEST_STATUSES),
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+
+
+def generate_transactions(rng, center_ids, count):
+    for _ in range(count):
+        from_center, to_center = rng.sample(center_ids, 2)
+        name, category, unit, _ = rng.choice(CATALOG)
+        created_at = _timestamp(rng, 90)
+        yield {
+            "_id": _object_id(rng),
+            "transaction_id": _uuid(rng),
+            "type": "transfer",
+            "from_center_id": from_center,
+            "to_center_id": to_center,
+            "item_id": _uuid(rng),
+            "item_name": name,
+            "category": category,
+            "unit": unit,
+            "quantity": rng.randint(1, 50),
+            "request_id": None,
+            "created_by": None,
+            "status": "completed",
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+
+def generate(tier, seed=0):
+    """Yield (collection, doc) pairs for a scale tier"""
+    centers, per_center, requests_per_center, transactions = TIERS[tier]
+    rng = random.Random(f"{tier}:{seed}")
+    center_ids = []
+    for center in generate_centers(rng, centers):
+        center_ids.append(str(center["_id"]))
+        yield "centers", center
+    for item in generate_inventory(rng, center_ids, per_center):
+        yield "inventory", item
+    for request in generate_requests(rng, center_ids, requests_per_center):
+        yield "requests", request
+    for transaction in generate_transactions(rng, center_ids, transactions):
+        yield "transactions", transaction
+
+
+def load(db, tier, seed=0, batch_size=5000):
+    """Replace db's collections with a tier's data; return documents per collection"""
+    counts = {}
+    batch = []
+    current = None
+
+    def flush():
+        if batch:
+            db[current].insert_many(batch, ordered=False)
+            batch.clear()
+
+    for name in ("centers", "inventory", "requests", "transactions"):
+        db[name].drop()
+    for collection, doc in generate(tier, seed):
+        if collection != current:
+            flush()
+            current = collection
+        batch.append(doc)
+        counts[collection] = counts.get(collection, 0) + 1
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return counts
@@ -0,0 +1,105 @@
+"""Process-wide read cache for page data.
+
+Entries are keyed by (center_id, collection, key). Every write path bumps
+the version of the center it touched, which drops that center's entries at
+once; entries also expire after a TTL and the least recently used ones are
+evicted when the cache is full.
+
+Cached values are shared between sessions, so callers must not mutate them.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# Pseudo center for data that spans the whole network (e.g. Browse pages)
+NETWORK = "*"
+
+
+class ReadCache:
+    """TTL + LRU cache with per-center version invalidation"""
+
+    def __init__(self, max_entries=512, ttl_seconds=60.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # (center_id, collection, key) -> (version, expires_at, value)
+        self._versions = {}
+        self._epoch = 0  # bumped by clear() to outdate every center at once
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def _version(self, center_id):
+        # Callers hold the lock
+        return self._epoch, self._versions.get(center_id, 0)
+
+    def get_or_load(self, center_id, collection, key, loader):
+        """Return the cached value or call loader() and cache its result"""
+        cache_key = (center_id, collection, key)
+        now = time.monotonic()
+
+        with self._lock:
+            version = self._version(center_id)
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                entry_version, expires_at, value = entry
+                if entry_version == version and expires_at > now:
+                    self._entries.move_to_end(cache_key)
+                    self._hits += 1
+                    return value
+                del self._entries[cache_key]
+            self._misses += 1
+
+        # Load outside the lock so a slow query does not block other sessions
+        value = loader()
+
+        with self._lock:
+            # A write that landed while we were loading makes this value stale
+            if self._version(center_id) == version:
+                self._store(cache_key, version, value)
+        return value
+
+    def _store(self, cache_key, version, value):
+        # Callers hold the lock
+        self._entries[cache_key] = (version, time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def put(self, center_id, collection, key, value):
+        """Store a value the caller already knows is current, e.g. after patching it"""
+        with self._lock:
+            self._store((center_id, collection, key), self._version(center_id), value)
+
+    def invalidate(self, *center_ids):
+        """Bump the version of each center and drop its cached entries"""
+        with self._lock:
+            for center_id in center_ids:
+                self._versions[center_id] = self._versions.get(center_id, 0) + 1
+                stale = [k for k in self._entries if k[0] == center_id]
+                for cache_key in stale:
+                    del self._entries[cache_key]
+                self._invalidations += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after losing track of remote writes"""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._invalidations += 1
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
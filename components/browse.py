@@ -1,60 +1,297 @@
+import re
 import streamlit as st
-from utils import get_database
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from pymongo.errors import OperationFailure
+from utils import (get_center_names, get_command_monitor, get_database, get_network_watcher, get_read_cache,
+                   get_match_index, get_trigram_index)
+from cache import NETWORK
+from constants import ITEM_CATEGORIES
+from geo import center_coordinates
+from expiry import expiring_query
+from search import fuzzy_search, search_page
+from stock_summary import SUMMARY_COLLECTION, item_totals
+
+PAGE_SIZES = [10, 25, 50, 100]
+SORT_MODES = ["Newest", "Nearest first"]
+LIVE_REFRESH_SECONDS = 10
+
+# Only the fields the Browse list renders (plus updated_at for the page cursor)
+BROWSE_PROJECTION = {
+    "item_name": 1,
+    "category": 1,
+    "quantity": 1,
+    "unit": 1,
+    "description": 1,
+    "earliest_expiry": 1,
+    "updated_at": 1,
+}
+
+BROWSE_SORT = [("updated_at", -1), ("_id", -1)]
+
+
+def build_query(center_id, categories, search_term, min_qty, expiring_days=0):
+    """Translate the Browse filters into a MongoDB query"""
+    query = {"center_id": {"$ne": center_id}}
+    if categories:
+        query["category"] = {"$in": list(categories)}
+    if search_term:
+        query["item_name"] = {"$regex": re.escape(search_term), "$options": "i"}
+    if min_qty:
+        query["quantity"] = {"$gte": min_qty}
+    if expiring_days:
+        query.update(expiring_query(expiring_days))
+    return query
+
+
+def fetch_page(inventory, query, page_size, cursor=None):
+    """Fetch one page of items after the given (updated_at, _id) cursor.
+
+    Returns the page and whether another page follows it.
+    """
+    if cursor is not None:
+        updated_at, last_id = cursor
+        query = {"$and": [query, {"$or": [
+            {"updated_at": {"$lt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$lt": last_id}},
+        ]}]}
+
+    # Ask for one extra document to know whether a next page exists
+    docs = list(inventory.find(query, BROWSE_PROJECTION).sort(BROWSE_SORT).limit(page_size + 1))
+    return docs[:page_size], len(docs) > page_size
+
+
+def build_nearby_pipeline(origin, center_id, query, page_size, cursor=None, max_km=None):
+    """$geoNear over centers joined with their matching inventory.
+
+    Items come back closest center first with their `distance_km` and
+    `center_name`; the page cursor is the last (distance_km, _id).
+    """
+    lat, lng = origin
+    near = {
+        "near": {"type": "Point", "coordinates": [lng, lat]},
+        "key": "location",
+        "distanceField": "distance",
+        "spherical": True,
+        "query": {"_id": {"$ne": ObjectId(center_id)}},
+    }
+    if max_km:
+        near["maxDistance"] = max_km * 1000
+    if cursor is not None:
+        # Skip centers closer than the last one shown, so a page does not
+        # join every earlier page again. minDistance is inclusive; the metre
+        # of slack covers rounding through distance_km, the $match below
+        # drops what it lets back in
+        near["minDistance"] = max(0.0, cursor[0] * 1000 - 1)
+
+    # Item filters apply inside the join; the center filter is handled by $geoNear
+    item_match = {field: condition for field, condition in query.items() if field != "center_id"}
+    item_match["$expr"] = {"$eq": ["$center_id", "$$center_id"]}
+
+    pipeline = [
+        {"$geoNear": near},
+        {"$project": {"center_name": 1, "distance": 1}},
+        {"$lookup": {
+            "from": "inventory",
+            "let": {"center_id": {"$toString": "$_id"}},
+            "pipeline": [{"$match": item_match}, {"$project": BROWSE_PROJECTION}],
+            "as": "item",
+        }},
+        {"$unwind": "$item"},
+        {"$replaceWith": {"$mergeObjects": [
+            "$item", {"center_name": "$center_name", "distance_km": {"$divide": ["$distance", 1000]}}
+        ]}},
+    ]
+    if cursor is not None:
+        distance_km, last_id = cursor
+        pipeline.append({"$match": {"$or": [
+            {"distance_km": {"$gt": distance_km}},
+            {"distance_km": distance_km, "_id": {"$gt": last_id}},
+        ]}})
+    pipeline += [{"$sort": {"distance_km": 1, "_id": 1}}, {"$limit": page_size + 1}]
+    return pipeline
+
+
+def fetch_nearby_page(centers, origin, center_id, query, page_size, cursor=None, max_km=None):
+    """Fetch one page of items ordered by distance from origin (lat, lng)"""
+    docs = list(centers.aggregate(build_nearby_pipeline(origin, center_id, query, page_size, cursor, max_km)))
+    return docs[:page_size], len(docs) > page_size
+
+
+def fuzzy_page(center_id, categories, search_term, min_qty, page_size, expiring_days=0):
+    """Close matches for a search term that found nothing exactly"""
+    match_index, trigram_index = get_match_index(), get_trigram_index()
+    if match_index is None or trigram_index is None:
+        return []
+    expiring_by = datetime.now() + timedelta(days=expiring_days) if expiring_days else None
+
+    def accept(doc):
+        if categories and doc.get("category") not in categories:
+            return False
+        return expiring_by is None or (doc.get("earliest_expiry") is not None and doc["earliest_expiry"] <= expiring_by)
+
+    matches = fuzzy_search(match_index, trigram_index, search_term, min_qty, center_id, page_size,
+                           accept if categories or expiring_by else None)
+    return [item for _, item in matches]
+
 
 def show():
     st.title("🔍 Browse Items")
-    
-    db = get_database()
+
+    # Other centers' stock may lag a little behind the primary
+    db = get_database("browse")
     if db is None:
         st.error("Database connection failed")
         return
-    
+
     center_id = st.session_state.center_id
-    inventory = db["inventory"]
-    
-    # Get all items from all centers except current center
-    all_items = list(inventory.find({"center_id": {"$ne": center_id}}))
-    
-    if all_items:
-        st.subheader(f"Available Items ({len(all_items)})")
-        
-        # Filter options
-        col1, col2, col3 = st.columns(3)
+
+    # Filter options
+    col1, col2, col3, col4 = st.columns([2, 2, 1.5, 1])
+    with col1:
+        category_filter = st.multiselect("Category", ITEM_CATEGORIES, key="browse_category")
+    with col2:
+        search_term = st.text_input("Search items")
+    with col3:
+        min_qty = st.number_input("Minimum Quantity", min_value=0, value=0)
+    with col4:
+        page_size = st.selectbox("Per page", PAGE_SIZES, index=1, key="browse_page_size")
+
+    col1, col2, col3 = st.columns([2, 2, 2])
+    with col1:
+        sort_mode = st.radio("Sort", SORT_MODES, horizontal=True, key="browse_sort")
+    with col3:
+        expiring_days = st.number_input("Expiring within (days, 0 = any)", min_value=0, value=0, step=7,
+                                        key="browse_expiring_days")
+    origin = None
+    max_km = 0
+    if sort_mode == "Nearest first":
+        center = get_read_cache().get_or_load(
+            center_id, "centers", "profile",
+            lambda: db["centers"].find_one({"_id": ObjectId(center_id)}, {"password": 0})
+        )
+        origin = center_coordinates(center) if center else None
+        if origin is None:
+            st.info("📍 Add your center's latitude and longitude in Settings to sort by distance")
+        else:
+            with col2:
+                max_km = st.number_input("Within (km, 0 = any distance)", min_value=0, value=0, step=10)
+
+    # Start again from the first page whenever the filters change
+    filter_key = (tuple(category_filter), search_term, min_qty, origin, max_km, page_size, expiring_days)
+    if st.session_state.get("browse_filter_key") != filter_key:
+        st.session_state.browse_filter_key = filter_key
+        st.session_state.browse_cursors = [None]
+
+    # Newest-first searches are ranked by the text index; nearest-first ones
+    # filter each center's items by name instead
+    ranked_search = bool(search_term) and origin is None
+    query = build_query(center_id, category_filter, "" if ranked_search else search_term, min_qty, expiring_days)
+    if search_term:
+        show_network_totals(db, search_term)
+    show_results(db, center_id, query, filter_key)
+
+
+def show_network_totals(db, search_term):
+    """How much of the searched item the network holds and where, from the stock summary"""
+    totals = get_read_cache().get_or_load(
+        NETWORK, SUMMARY_COLLECTION, ("items", search_term),
+        lambda: item_totals(db[SUMMARY_COLLECTION], search_term)
+    )
+    if not totals:
+        return
+    names = get_center_names()
+    with st.expander(f"📊 Network totals for \"{search_term}\""):
+        for total in totals[:5]:
+            holders = sorted(((qty, center_id) for center_id, qty in (total.get("by_center") or {}).items() if qty),
+                             reverse=True)
+            where = ", ".join(f"{names.get(center_id, 'Unknown center')} ({qty})" for qty, center_id in holders[:5])
+            more = f" and {len(holders) - 5} more" if len(holders) > 5 else ""
+            st.write(f"**{total.get('name') or total['key']}** - {total['quantity']} {total.get('unit') or 'units'} "
+                     f"across {len(holders)} center{'s' if len(holders) != 1 else ''}: {where}{more}")
+
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def show_results(db, center_id, query, filter_key):
+    """Render the current page; re-runs on its own to pick up remote changes"""
+    # Fragment reruns happen outside app.py's page tracking
+    with get_command_monitor().track_page("Browse Items"):
+        render_results(db, center_id, query, filter_key)
+
+
+def render_results(db, center_id, query, filter_key):
+    categories, search_term, min_qty, origin, max_km, page_size, expiring_days = filter_key
+    cursors = st.session_state.browse_cursors
+    ranked_search = bool(search_term) and origin is None
+
+    if origin is not None:
+        load = lambda: fetch_nearby_page(db["centers"], origin, center_id, query, page_size, cursors[-1], max_km)
+    elif ranked_search:
+        load = lambda: search_page(db["inventory"], query, search_term, BROWSE_PROJECTION, page_size, cursors[-1] or 0)
+    else:
+        load = lambda: fetch_page(db["inventory"], query, page_size, cursors[-1])
+
+    # Pages span every center, so any inventory write invalidates them
+    try:
+        items, has_next = get_read_cache().get_or_load(
+            NETWORK, "inventory", (center_id, filter_key, cursors[-1]), load
+        )
+    except OperationFailure as e:
+        st.error(f"Could not load items: {e}")
+        return
+
+    fuzzy = False
+    if ranked_search and not items and len(cursors) == 1:
+        items = fuzzy_page(center_id, categories, search_term, min_qty, page_size, expiring_days)
+        fuzzy = bool(items)
+
+    watcher = get_network_watcher()
+    if watcher is not None:
+        stats = watcher.stats()
+        st.caption(f"🟢 Live · {stats['items']} items across {stats['centers']} centers")
+
+    if items:
+        st.subheader(f"Available Items (page {len(cursors)})")
+        if fuzzy:
+            st.caption(f"No exact matches for \"{search_term}\", showing close matches")
+
+        # Display items
+        for item in items:
+            with st.container(border=True):
+                col1, col2, col3, col4, col5 = st.columns([2, 1.5, 1.5, 1.5, 1])
+                with col1:
+                    st.write(f"**{item.get('item_name', 'N/A')}**")
+                    if "distance_km" in item:
+                        st.caption(f"📍 {item['distance_km']:.1f} km · {item.get('center_name', '')}")
+                with col2:
+                    st.write(f"Category: {item.get('category', 'N/A')}")
+                with col3:
+                    st.write(f"Available: {item.get('quantity', 0)} {item.get('unit', '')}")
+                    if item.get("earliest_expiry"):
+                        st.caption(f"⏳ Expires {item['earliest_expiry'].strftime('%d %b %Y')}")
+                with col4:
+                    st.write(f"Description: {item.get('description', 'N/A')[:30]}...")
+                with col5:
+                    if st.button("Request", key=f"req_{item['_id']}"):
+                        st.success("Request sent!")
+
+        # Pagination
+        col1, col2, col3 = st.columns([1, 4, 1])
         with col1:
-            category_filter = st.multiselect("Category", ["Medical", "Food", "Clothing", "Other"], key="browse_category")
-        with col2:
-            search_term = st.text_input("Search by name")
+            if st.button("⬅️ Previous", disabled=len(cursors) == 1, use_container_width=True):
+                cursors.pop()
+                st.rerun()
         with col3:
-            min_qty = st.number_input("Minimum Quantity", min_value=0, value=0)
-        
-        # Apply filters
-        filtered_items = all_items
-        
-        if category_filter:
-            filtered_items = [i for i in filtered_items if i.get("category") in category_filter]
-        
-        if search_term:
-            filtered_items = [i for i in filtered_items if search_term.lower() in i.get("item_name", "").lower()]
-        
-        filtered_items = [i for i in filtered_items if i.get("quantity", 0) >= min_qty]
-        
-        # Display items
-        if filtered_items:
-            for item in filtered_items:
-                with st.container(border=True):
-                    col1, col2, col3, col4, col5 = st.columns([2, 1.5, 1.5, 1.5, 1])
-                    with col1:
-                        st.write(f"**{item.get('item_name', 'N/A')}**")
-                    with col2:
-                        st.write(f"Category: {item.get('category', 'N/A')}")
-                    with col3:
-                        st.write(f"Available: {item.get('quantity', 0)} {item.get('unit', '')}")
-                    with col4:
-                        st.write(f"Description: {item.get('description', 'N/A')[:30]}...")
-                    with col5:
-                        if st.button("Request", key=f"req_{item['_id']}"):
-                            st.success("Request sent!")
-        else:
-            st.info("No items match your filters")
+            if st.button("Next ➡️", disabled=not has_next, use_container_width=True):
+                last = items[-1]
+                if origin is not None:
+                    cursors.append((last["distance_km"], last["_id"]))
+                elif ranked_search:
+                    cursors.append((cursors[-1] or 0) + page_size)
+                else:
+                    cursors.append((last.get("updated_at"), last["_id"]))
+                st.rerun()
+    elif len(cursors) > 1 or len(query) > 1 or search_term:
+        st.info("No items match your filters")
     else:
         st.info("No items available from other centers")
@@ -1,14 +1,194 @@
 import streamlit as st
-from utils import get_database
+import pandas as pd
+from utils import get_center_names, get_database, get_query_pool, get_read_cache
+from data_access import fan_out
+from expiry import EXPIRING_SOON_DAYS, expiring_query
+from history import FORECAST_WINDOW_DAYS, GRANULARITIES, ROLLUP_COLLECTION, TREND_DAYS, burn_down, load_rollups
 from datetime import datetime
 from bson.objectid import ObjectId
 from datetime import timedelta
 
+LOW_STOCK_THRESHOLD = 10
+
+# Fields needed by the attention and recent item lists
+ITEM_SUMMARY_PROJECTION = {"item_name": 1, "category": 1, "quantity": 1, "unit": 1, "created_at": 1}
+
+RECENT_LIMIT = 5
+
+HOURLY_TREND_HOURS = 48
+
+
+def load_metrics(inventory, center_id):
+    """Compute every dashboard figure for a center in one aggregation"""
+    now = datetime.now()
+    month_start = datetime(now.year, now.month, 1)
+    qty = {"$ifNull": ["$quantity", 0]}
+    is_low = {"$and": [{"$gt": [qty, 0]}, {"$lt": [qty, LOW_STOCK_THRESHOLD]}]}
+    is_out = {"$eq": [qty, 0]}
+
+    pipeline = [
+        {"$match": {"center_id": center_id}},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "total_items": {"$sum": 1},
+                    "total_quantity": {"$sum": qty},
+                    "low_stock": {"$sum": {"$cond": [is_low, 1, 0]}},
+                    "out_of_stock": {"$sum": {"$cond": [is_out, 1, 0]}},
+                    "items_this_month": {"$sum": {"$cond": [
+                        {"$gte": [{"$ifNull": ["$created_at", now]}, month_start]}, 1, 0
+                    ]}},
+                }},
+            ],
+            "categories": [
+                {"$group": {"_id": {"$ifNull": ["$category", "Other"]}, "count": {"$sum": 1}, "quantity": {"$sum": qty}}},
+                {"$sort": {"count": -1, "_id": 1}},
+            ],
+            "out_of_stock_items": [
+                {"$match": {"$expr": is_out}},
+                {"$limit": 5},
+                {"$project": ITEM_SUMMARY_PROJECTION},
+            ],
+            "low_stock_items": [
+                {"$match": {"$expr": is_low}},
+                {"$sort": {"quantity": 1}},
+                {"$limit": 5},
+                {"$project": ITEM_SUMMARY_PROJECTION},
+            ],
+            "recent_items": [
+                {"$sort": {"created_at": -1}},
+                {"$limit": 5},
+                {"$project": ITEM_SUMMARY_PROJECTION},
+            ],
+        }},
+    ]
+
+    result = next(inventory.aggregate(pipeline), {})
+    totals = (result.get("totals") or [{}])[0]
+    return {
+        "total_items": totals.get("total_items", 0),
+        "total_quantity": totals.get("total_quantity", 0),
+        "low_stock": totals.get("low_stock", 0),
+        "out_of_stock": totals.get("out_of_stock", 0),
+        "items_this_month": totals.get("items_this_month", 0),
+        "categories": [(c["_id"], c["count"]) for c in result.get("categories", [])],
+        "category_quantities": {c["_id"]: c["quantity"] for c in result.get("categories", [])},
+        "out_of_stock_items": result.get("out_of_stock_items", []),
+        "low_stock_items": result.get("low_stock_items", []),
+        "recent_items": result.get("recent_items", []),
+    }
+
+
+def load_expiring(inventory, center_id, days=EXPIRING_SOON_DAYS):
+    """A center's items with lots expiring within days, soonest first"""
+    query = dict({"center_id": center_id}, **expiring_query(days))
+    projection = {"item_name": 1, "category": 1, "unit": 1, "lots": 1, "earliest_expiry": 1}
+    return list(inventory.find(query, projection).sort("earliest_expiry", 1).limit(RECENT_LIMIT))
+
+
+def load_pending_requests(requests, center_id):
+    """Number of open requests of a center and the most recent of them"""
+    # Requests created before statuses were stored count as pending
+    query = {"center_id": center_id, "status": {"$in": ["Pending", None]}}
+    return {
+        "count": requests.count_documents(query),
+        "recent": list(requests.find(query, {"item_name": 1, "quantity": 1, "created_at": 1})
+                       .sort("created_at", -1).limit(RECENT_LIMIT)),
+    }
+
+
+def load_recent_transfers(transactions, center_id):
+    """Latest transfers sent or received by a center, newest first"""
+    return list(transactions.find(
+        {"$or": [{"from_center_id": center_id}, {"to_center_id": center_id}]},
+        {"from_center_id": 1, "to_center_id": 1, "item_name": 1, "quantity": 1, "unit": 1, "created_at": 1},
+    ).sort("created_at", -1).limit(RECENT_LIMIT))
+
+
+def trend_frame(rollups):
+    """Units added and removed per period across categories, for charting"""
+    frame = pd.DataFrame([{"Period": r["period"], "Added": r.get("added", 0), "Removed": r.get("removed", 0)}
+                          for r in rollups])
+    if frame.empty:
+        return frame
+    return frame.groupby("Period").sum()
+
+
+def show_trends(db, center_id, metrics, daily):
+    """Consumption trend chart and burn-down forecast from the stock rollups"""
+    st.write("## 📉 Stock Trends")
+    if daily is None:
+        st.warning("⚠️ Stock history is unavailable right now")
+        return
+    if not daily:
+        st.info("No stock changes recorded yet")
+        return
+
+    if st.toggle(f"Last {HOURLY_TREND_HOURS} hours by hour", key="dashboard_hourly_trend"):
+        since = GRANULARITIES["hour"](datetime.now()) - timedelta(hours=HOURLY_TREND_HOURS - 1)
+        rollups = get_read_cache().get_or_load(
+            center_id, ROLLUP_COLLECTION, "hourly",
+            lambda: load_rollups(db[ROLLUP_COLLECTION], center_id, "hour", since))
+    else:
+        rollups = daily
+    st.bar_chart(trend_frame(rollups), stack=False)
+
+    st.subheader("🔥 Burn-down Forecast")
+    st.caption(f"Days of stock left at the average removal rate of the last {FORECAST_WINDOW_DAYS} days")
+    rows = [row for row in burn_down(metrics.get("category_quantities", {}), daily) if row["removed_per_day"]]
+    if rows:
+        st.dataframe(pd.DataFrame(rows).sort_values("days_left"), hide_index=True, column_config={
+            "category": "Category",
+            "quantity": "In Stock",
+            "removed_per_day": "Used per Day",
+            "days_left": st.column_config.NumberColumn("Days Left", format="%.1f"),
+        })
+    else:
+        st.info(f"No stock was used in the last {FORECAST_WINDOW_DAYS} days")
+
+    st.divider()
+
+
+def show_activity(center_id, pending, transfers):
+    """Open requests and recent transfers"""
+    st.write("## 🔄 Requests & Transfers")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("🆘 Open Requests")
+        if pending is None:
+            st.warning("⚠️ Requests are unavailable right now")
+        elif pending["count"]:
+            st.metric("Pending", pending["count"])
+            for req in pending["recent"]:
+                st.write(f"• **{req.get('item_name', 'N/A')}** - {req.get('quantity', 0)}")
+        else:
+            st.success("✅ No open requests")
+
+    with col2:
+        st.subheader("🚚 Recent Transfers")
+        if transfers is None:
+            st.warning("⚠️ Transfers are unavailable right now")
+        elif transfers:
+            names = get_center_names()
+            for transfer in transfers:
+                if transfer.get("from_center_id") == center_id:
+                    direction = f"➡️ to {names.get(transfer.get('to_center_id'), 'another center')}"
+                else:
+                    direction = f"⬅️ from {names.get(transfer.get('from_center_id'), 'another center')}"
+                st.write(f"• **{transfer.get('item_name', 'N/A')}** - {transfer.get('quantity', 0)} "
+                         f"{transfer.get('unit') or 'units'} {direction}")
+        else:
+            st.info("No transfers yet")
+
+    st.divider()
+
 
 def show():
     st.title("📊 Dashboard")
     
-    db = get_database()
+    db = get_database("dashboard")
     if db is None:
         st.error("Database connection failed")
         return
@@ -22,35 +202,55 @@ def show():
         st.error("Invalid center ID")
         return
     
-    # Get center data
-    centers = db["centers"]
-    center = centers.find_one({"_id": center_oid})
-    
+    cache = get_read_cache()
+    centers, inventory = db["centers"], db["inventory"]
+    requests, transactions = db["requests"], db["transactions"]
+    trend_since = GRANULARITIES["day"](datetime.now()) - timedelta(days=TREND_DAYS - 1)
+
+    # Independent queries run concurrently; only the profile is required
+    loaded, failed = fan_out(get_query_pool(), {
+        "center": lambda: cache.get_or_load(center_id, "centers", "profile",
+                                            lambda: centers.find_one({"_id": center_oid}, {"password": 0})),
+        "metrics": lambda: cache.get_or_load(center_id, "inventory", "metrics",
+                                             lambda: load_metrics(inventory, center_id)),
+        "expiring": lambda: cache.get_or_load(center_id, "inventory", "expiring",
+                                              lambda: load_expiring(inventory, center_id)),
+        "pending": lambda: cache.get_or_load(center_id, "requests", "pending",
+                                             lambda: load_pending_requests(requests, center_id)),
+        "transfers": lambda: cache.get_or_load(center_id, "transactions", "recent",
+                                               lambda: load_recent_transfers(transactions, center_id)),
+        "daily": lambda: cache.get_or_load(center_id, ROLLUP_COLLECTION, "daily",
+                                           lambda: load_rollups(db[ROLLUP_COLLECTION], center_id, "day", trend_since)),
+    })
+
+    if "center" in failed:
+        st.error(f"Could not load your center: {failed['center']}")
+        return
+    center = loaded["center"]
     if not center:
         st.error("Center not found")
         return
     
-    # Get inventory data
-    inventory = db["inventory"]
-    items = list(inventory.find({"center_id": center_id}))
-    
     # ===== HEADER SECTION =====
     st.write(f"### Welcome back, {center['center_name']}! 👋")
     st.write(f"📍 {center['address']}")
     st.divider()
+
+    show_activity(center_id, loaded.get("pending"), loaded.get("transfers"))
+
+    if "metrics" in failed:
+        st.warning(f"⚠️ Inventory figures are unavailable right now: {failed['metrics']}")
+        return
+    metrics = loaded["metrics"]
     
     # ===== KEY METRICS =====
     st.write("## 📈 Quick Metrics")
     
-    total_items = len(items)
-    total_quantity = sum([i.get("quantity", 0) for i in items])
-    low_stock = len([i for i in items if 0 < i.get("quantity", 0) < 10])
-    out_of_stock = len([i for i in items if i.get("quantity", 0) == 0])
-    
-    # Calculate items added this month
-    today = datetime.now()
-    month_start = datetime(today.year, today.month, 1)
-    items_this_month = len([i for i in items if i.get("created_at", datetime.now()) >= month_start])
+    total_items = metrics["total_items"]
+    total_quantity = metrics["total_quantity"]
+    low_stock = metrics["low_stock"]
+    out_of_stock = metrics["out_of_stock"]
+    items_this_month = metrics["items_this_month"]
     
     col1, col2, col3, col4, col5 = st.columns(5)
     
@@ -72,7 +272,7 @@ def show():
     st.divider()
     
     # ===== INVENTORY HEALTH =====
-    if items:
+    if total_items:
         st.write("## 🏥 Inventory Health")
         
         col1, col2 = st.columns(2)
@@ -80,14 +280,8 @@ def show():
         with col1:
             st.subheader("📦 Category Breakdown")
             
-            # Count items by category
-            categories = {}
-            for item in items:
-                cat = item.get("category", "Other")
-                categories[cat] = categories.get(cat, 0) + 1
-            
             # Display as text-based summary
-            for cat, count in sorted(categories.items(), key=lambda x: x[1], reverse=True):
+            for cat, count in metrics["categories"]:
                 st.write(f"**{cat}:** {count} item{'s' if count != 1 else ''}")
         
         with col2:
@@ -103,12 +297,14 @@ def show():
                 st.success("🟢 All items well stocked!")
         
         st.divider()
-        
+
+        show_trends(db, center_id, metrics, loaded.get("daily"))
+
         # ===== ITEMS NEEDING ATTENTION =====
         st.write("## 🚨 Items Needing Attention")
         
         # Out of stock items
-        out_of_stock_items = [i for i in items if i.get("quantity", 0) == 0]
+        out_of_stock_items = metrics["out_of_stock_items"]
         
         if out_of_stock_items:
             st.subheader("🔴 Out of Stock")
@@ -116,7 +312,7 @@ def show():
                 st.write(f"• **{item['item_name']}** ({item['category']})")
         
         # Low stock items
-        low_stock_items = [i for i in items if 0 < i.get("quantity", 0) < 10]
+        low_stock_items = metrics["low_stock_items"]
         
         if low_stock_items:
             st.subheader("🟡 Low Stock (< 10 units)")
@@ -124,7 +320,21 @@ def show():
                 qty = item.get("quantity", 0)
                 st.write(f"• **{item['item_name']}** ({item['category']}) - {qty} {item.get('unit', 'units')}")
         
-        if not out_of_stock_items and not low_stock_items:
+        # Lots about to expire
+        expiring_items = loaded.get("expiring")
+        if "expiring" in failed:
+            st.warning("⚠️ Expiry dates are unavailable right now")
+        elif expiring_items:
+            st.subheader(f"⏳ Expiring Within {EXPIRING_SOON_DAYS} Days")
+            soon = datetime.now() + timedelta(days=EXPIRING_SOON_DAYS)
+            for item in expiring_items:
+                units = sum(lot["quantity"] for lot in item.get("lots", []) if lot["expiry_date"] <= soon)
+                days_left = (item["earliest_expiry"].date() - datetime.now().date()).days
+                when = "today" if days_left <= 0 else f"in {days_left} day{'s' if days_left != 1 else ''}"
+                st.write(f"• **{item['item_name']}** ({item.get('category', 'Other')}) - "
+                         f"{units} {item.get('unit', 'units')} expiring, first {when}")
+
+        if not out_of_stock_items and not low_stock_items and not expiring_items:
             st.success("✅ All items are well stocked!")
         
         st.divider()
@@ -132,9 +342,7 @@ def show():
         # ===== RECENT ITEMS =====
         st.write("## 📋 Recently Added Items")
         
-        # Sort by created_at
-        sorted_items = sorted(items, key=lambda x: x.get("created_at", datetime.now()), reverse=True)
-        recent_items = sorted_items[:5]
+        recent_items = metrics["recent_items"]
         
         if recent_items:
             for item in recent_items:
@@ -0,0 +1,61 @@
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+from utils import get_command_monitor, get_network_watcher, get_read_cache, is_admin
+
+
+def show():
+    st.title("🩺 Diagnostics")
+
+    if not is_admin(st.session_state.get("center_email")):
+        st.error("This page is only available to administrators.")
+        return
+
+    monitor = get_command_monitor()
+
+    st.subheader("Pages")
+    st.caption("Render and MongoDB time per page over the most recent renders (milliseconds)")
+    page_stats = monitor.page_stats()
+    if page_stats:
+        st.dataframe(pd.DataFrame(page_stats), use_container_width=True, hide_index=True)
+    else:
+        st.info("No page renders recorded yet.")
+
+    st.subheader("Commands")
+    command_stats = monitor.command_stats()
+    if command_stats:
+        st.dataframe(pd.DataFrame(command_stats), use_container_width=True, hide_index=True)
+    else:
+        st.info("No MongoDB commands recorded yet.")
+
+    st.subheader(f"Slow queries (≥ {monitor.slow_ms:g} ms)")
+    slow = monitor.slow_queries()
+    if slow:
+        st.dataframe(pd.DataFrame([{
+            "time": datetime.fromtimestamp(at),
+            "page": page,
+            "command": command,
+            "collection": collection,
+            "ms": round(ms, 1),
+            "filter": str(shape),
+        } for at, page, command, collection, ms, shape in reversed(slow)]),
+            use_container_width=True, hide_index=True)
+    else:
+        st.success("✅ No slow queries")
+
+    st.subheader("Caches")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Read cache**")
+        st.json(get_read_cache().stats())
+    with col2:
+        st.markdown("**Network watcher**")
+        watcher = get_network_watcher()
+        if watcher is not None:
+            st.json({key: str(value) if isinstance(value, datetime) else value
+                     for key, value in watcher.stats().items()})
+
+    metrics = monitor.prometheus_text()
+    with st.expander("Prometheus metrics"):
+        st.code(metrics, language="text")
+    st.download_button("📥 Download metrics", metrics, file_name="helpkart_metrics.txt", mime="text/plain")
@@ -1,114 +1,273 @@
 import streamlit as st
-from utils import get_database
+import pandas as pd
+from utils import get_database, get_read_cache, get_center_names
+from cache import NETWORK
+from constants import ITEM_CATEGORIES, ITEM_UNITS
 from datetime import datetime
 import uuid
 from bson.objectid import ObjectId
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from importer import import_items, iter_rows
+from transfers import TransferError, transfer_stock, version_filter
+from expiry import fit_lots, new_lot, set_lots
+from history import change, changes_from, record_changes
+from matching import normalize
+from stock_summary import record_summary
+
+GRID_COLUMNS = ["item_name", "category", "quantity", "unit", "description", "earliest_expiry", "updated_at"]
+EDITABLE_COLUMNS = ["item_name", "category", "quantity", "unit", "description"]
+GRID_PROJECTION = dict({column: 1 for column in GRID_COLUMNS}, version=1, item_id=1, center_id=1, lots=1)
+
+
+def load_items(inventory, center_id, ids=None):
+    """Fetch a center's grid rows, or only the given _ids"""
+    query = {"center_id": center_id}
+    if ids is not None:
+        query["_id"] = {"$in": list(ids)}
+    return list(inventory.find(query, GRID_PROJECTION).sort("_id", 1))
+
+
+def pending_count(grid_state):
+    return (len(grid_state.get("edited_rows", {})) + len(grid_state.get("deleted_rows", []))
+            + len(grid_state.get("added_rows", [])))
+
+
+def rendered_rows(state, grid_key, items):
+    """The rows the grid was drawn from, pinned while it has unsaved edits.
+
+    data_editor reports edits and deletes by row position, so positions must
+    keep pointing at the same documents even if the cached items change (a
+    save or delete in another session) between drawing the grid and saving.
+    """
+    rows_key = f"{grid_key}_rows"
+    if rows_key not in state or not pending_count(state.get(grid_key, {})):
+        state[rows_key] = items
+    return state[rows_key]
+
+
+def build_changes(items, grid_state, center_id):
+    """Turn the data_editor's pending edits into bulk write operations.
+
+    Updates and deletes only apply to rows still at the version that was
+    loaded. Returns the operations, the _ids they touch (existing rows
+    first, then inserted ones) and the validation errors found.
+    """
+    operations = []
+    touched_ids = []
+    inserted_ids = []
+    errors = []
+    now = datetime.now()
+
+    for row, changes in grid_state.get("edited_rows", {}).items():
+        item = items[int(row)]
+        update = {column: value for column, value in changes.items() if column in EDITABLE_COLUMNS}
+        if not update:
+            continue
+        if "item_name" in update and not str(update["item_name"] or "").strip():
+            errors.append(f"{item.get('item_name', 'Item')}: name cannot be empty")
+            continue
+        if "quantity" in update:
+            if update["quantity"] is None or update["quantity"] < 0:
+                errors.append(f"{item.get('item_name', 'Item')}: quantity must be 0 or more")
+                continue
+            update["quantity"] = int(update["quantity"])
+        update["updated_at"] = now
+        operation = {"$set": update, "$inc": {"version": 1}}
+        if "quantity" in update and item.get("lots"):
+            # Removed stock is taken from the earliest-expiring lots
+            set_lots(operation, fit_lots(item["lots"], update["quantity"]))
+        operations.append(UpdateOne(dict({"_id": item["_id"], "center_id": center_id}, **version_filter(item)),
+                                    operation))
+        touched_ids.append(item["_id"])
+
+    for row in grid_state.get("deleted_rows", []):
+        item = items[int(row)]
+        operations.append(DeleteOne(dict({"_id": item["_id"], "center_id": center_id}, **version_filter(item))))
+        touched_ids.append(item["_id"])
+
+    for row in grid_state.get("added_rows", []):
+        if not str(row.get("item_name") or "").strip():
+            errors.append("New row: name is required")
+            continue
+        inserted_ids.append(ObjectId())
+        operations.append(InsertOne({
+            "_id": inserted_ids[-1],
+            "item_id": str(uuid.uuid4()),
+            "center_id": center_id,
+            "item_name": row["item_name"],
+            "category": row.get("category") or "Other",
+            "quantity": int(row.get("quantity") or 0),
+            "unit": row.get("unit") or "pieces",
+            "description": row.get("description") or "",
+            "version": 0,
+            "created_at": now,
+            "updated_at": now
+        }))
+
+    return operations, touched_ids, inserted_ids, errors
+
+
+def find_conflicts(items, grid_state, fresh):
+    """Names of edited or deleted rows that someone else changed first"""
+    deleted = {items[int(row)]["_id"] for row in grid_state.get("deleted_rows", [])}
+    conflicts = []
+    for row in grid_state.get("edited_rows", {}):
+        item = items[int(row)]
+        doc = fresh.get(item["_id"])
+        if doc is None or doc.get("version") != item.get("version", 0) + 1:
+            conflicts.append(item.get("item_name", "Item"))
+    for _id in deleted:
+        if _id in fresh:
+            conflicts.append(fresh[_id].get("item_name", "Item"))
+    return conflicts
+
+
+def applied_rows(items, grid_state, fresh, inserted_ids):
+    """(before, after) pairs of the rows a grid save actually changed"""
+    pairs = []
+    for row in grid_state.get("edited_rows", {}):
+        item = items[int(row)]
+        doc = fresh.get(item["_id"])
+        if doc is not None and doc.get("version") == item.get("version", 0) + 1:
+            pairs.append((item, doc))
+    for row in grid_state.get("deleted_rows", []):
+        item = items[int(row)]
+        if item["_id"] not in fresh:
+            pairs.append((item, None))
+    pairs += [(None, fresh[_id]) for _id in inserted_ids if _id in fresh]
+    return pairs
+
+
+def save_changes(inventory, center_id, items, grid_state, cached=None):
+    """Apply pending grid changes with one bulk_write and patch the cached rows.
+
+    items are the rows the grid was drawn from (see rendered_rows); cached
+    are the current cached rows to patch, by _id (default: items). Nothing is
+    written while any row fails validation. Rows changed by someone else
+    since they were loaded are left alone and returned as conflicts, with
+    their latest values in the cache.
+    """
+    operations, touched_ids, inserted_ids, errors = build_changes(items, grid_state, center_id)
+    if errors or not operations:
+        return 0, errors, []
+
+    result = inventory.bulk_write(operations, ordered=False)
+
+    # Re-fetch only what changed; deleted rows simply do not come back
+    fresh = {doc["_id"]: doc for doc in load_items(inventory, center_id, touched_ids + inserted_ids)}
+    conflicts = []
+    if result.matched_count + result.deleted_count < len(touched_ids):
+        conflicts = find_conflicts(items, grid_state, fresh)
+    pairs = applied_rows(items, grid_state, fresh, inserted_ids)
+    record_changes(inventory.database, changes_from(pairs), "edit")
+    record_summary(inventory.database, pairs)
+
+    touched = set(touched_ids)
+    patched = [fresh.get(item["_id"]) if item["_id"] in touched else item
+               for item in (items if cached is None else cached)]
+    patched = [item for item in patched if item is not None]
+    known = {item["_id"] for item in patched}
+    patched += [fresh[_id] for _id in inserted_ids if _id in fresh and _id not in known]
+
+    cache = get_read_cache()
+    cache.invalidate(center_id, NETWORK)
+    cache.put(center_id, "inventory", "items", patched)
+    applied = result.modified_count + result.deleted_count + result.inserted_count
+    return applied, errors, conflicts
 
 
 def show():
     st.title("📦 My Inventory")
-    
+
     db = get_database()
     if db is None:
         st.error("Database connection failed")
         return
-    
+
     center_id = st.session_state.center_id
     inventory = db["inventory"]
-    
-    # Dialog function for editing
-    @st.dialog("✏️ Edit Item")
-    def edit_item_dialog(item_id):
-        try:
-            selected_item = inventory.find_one({"_id": ObjectId(item_id)})
-            
-            if selected_item:
-                col1, col2 = st.columns(2)
-                with col1:
-                    new_quantity = st.number_input("New Quantity", value=selected_item.get("quantity", 0), min_value=0)
-                    new_category = st.selectbox("Category", ["Medical", "Food", "Clothing", "Other"], 
-                                               index=["Medical", "Food", "Clothing", "Other"].index(selected_item.get("category", "Other")))
-                
-                with col2:
-                    new_unit = st.selectbox(
-                        "Unit",
-                        ["kg", "liters", "pieces", "grams", "meters", "boxes", "bottles", "packets", "cartons", "bags", "Other"],
-                        index=["kg", "liters", "pieces", "grams", "meters", "boxes", "bottles", "packets", "cartons", "bags", "Other"].index(selected_item.get("unit", "kg"))
-                    )
-                    new_description = st.text_area("Description", value=selected_item.get("description", ""))
-                
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("💾 Save Changes", use_container_width=True):
-                        inventory.update_one(
-                            {"_id": selected_item["_id"]},
-                            {"$set": {
-                                "quantity": new_quantity,
-                                "category": new_category,
-                                "unit": new_unit,
-                                "description": new_description,
-                                "updated_at": datetime.now()
-                            }}
-                        )
-                        st.success("Item updated successfully! ✅")
-                        st.rerun()
-                
-                with col2:
-                    if st.button("❌ Cancel", use_container_width=True):
-                        st.rerun()
-        except Exception as e:
-            st.error(f"Error: {str(e)}")
-    
+    cache = get_read_cache()
+
     # Tabs for different actions
-    tab1, tab2 = st.tabs(["View Items", "Add Item"])
-    
+    tab1, tab2, tab3, tab4 = st.tabs(["View Items", "Add Item", "Bulk Import", "Transfer"])
+
     with tab1:
         st.subheader("View All Items")
-        items = list(inventory.find({"center_id": center_id}))
-        
+        items = cache.get_or_load(center_id, "inventory", "items",
+                                  lambda: load_items(inventory, center_id))
+
+        for name in st.session_state.pop("inventory_conflicts", []):
+            st.warning(f"⚠️ {name} was changed by someone else before your save. "
+                       "The latest values are shown, please re-apply your edit.")
+
         if items:
-            for item in items:
-                with st.container(border=True):
-                    col1, col2, col3, col4, col5, col6 = st.columns(6)
-                    with col1:
-                        st.write(f"**{item.get('item_name', 'N/A')}**")
-                    with col2:
-                        st.write(f"Category: {item.get('category', 'N/A')}")
-                    with col3:
-                        st.write(f"Qty: {item.get('quantity', 0)}")
-                    with col4:
-                        st.write(f"Unit: {item.get('unit', 'N/A')}")
-                    with col5:
-                        if st.button("✏️ Edit", key=f"edit_{item['_id']}"):
-                            edit_item_dialog(str(item["_id"]))
-                    with col6:
-                        if st.button("🗑️ Delete", key=f"del_{item['_id']}"):
-                            inventory.delete_one({"_id": item["_id"]})
-                            st.success("Item deleted!")
-                            st.rerun()
+            # Edits stay in the browser until saved; a new key resets the grid
+            grid_key = f"inventory_grid_{st.session_state.get('inventory_grid_version', 0)}"
+            rows = rendered_rows(st.session_state, grid_key, items)
+            frame = pd.DataFrame([{column: item.get(column) for column in GRID_COLUMNS} for item in rows])
+
+            st.caption("Edit cells, select rows and press Delete to remove them, then save all changes at once.")
+            st.data_editor(
+                frame,
+                key=grid_key,
+                hide_index=True,
+                num_rows="dynamic",
+                height=min(600, 40 + 35 * (len(rows) + 1)),
+                disabled=["earliest_expiry", "updated_at"],
+                column_config={
+                    "item_name": st.column_config.TextColumn("Item", required=True),
+                    "category": st.column_config.SelectboxColumn("Category", options=ITEM_CATEGORIES, required=True),
+                    "quantity": st.column_config.NumberColumn("Qty", min_value=0, step=1, required=True),
+                    "unit": st.column_config.SelectboxColumn("Unit", options=ITEM_UNITS, required=True),
+                    "description": st.column_config.TextColumn("Description"),
+                    "earliest_expiry": st.column_config.DatetimeColumn("Expires", format="D MMM YYYY"),
+                    "updated_at": st.column_config.DatetimeColumn("Updated", format="D MMM YYYY, HH:mm"),
+                },
+            )
+
+            grid_state = st.session_state.get(grid_key, {})
+            pending = pending_count(grid_state)
+
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button(f"💾 Save {pending} change{'s' if pending != 1 else ''}",
+                             disabled=pending == 0, use_container_width=True):
+                    applied, errors, conflicts = save_changes(inventory, center_id, rows, grid_state, items)
+                    for error in errors:
+                        st.error(error)
+                    if not errors:
+                        st.session_state.pop(f"{grid_key}_rows", None)
+                        st.session_state.inventory_grid_version = st.session_state.get("inventory_grid_version", 0) + 1
+                        st.session_state.inventory_conflicts = conflicts
+                        st.success(f"{applied} change{'s' if applied != 1 else ''} saved! ✅")
+                        st.rerun()
+            with col2:
+                if st.button("↩️ Discard changes", disabled=pending == 0, use_container_width=True):
+                    st.session_state.pop(f"{grid_key}_rows", None)
+                    st.session_state.inventory_grid_version = st.session_state.get("inventory_grid_version", 0) + 1
+                    st.rerun()
         else:
             st.info("No items in inventory")
-    
+
     with tab2:
         st.subheader("Add New Item")
-        
+
         with st.form("add_item_form", clear_on_submit=True):
             col1, col2 = st.columns(2)
             with col1:
                 item_name = st.text_input("Item Name")
-                category = st.selectbox("Category", ["Medical", "Food", "Clothing", "Other"])
-            
+                category = st.selectbox("Category", ITEM_CATEGORIES)
+
             with col2:
                 quantity = st.number_input("Quantity", min_value=0)
-                unit = st.selectbox(
-                    "Unit",
-                    ["kg", "liters", "pieces", "grams", "meters", "boxes", "bottles", "packets", "cartons", "bags", "Other"]
-                )
-            
+                unit = st.selectbox("Unit", ITEM_UNITS)
+
             description = st.text_area("Description")
-            
+            expiry_date = st.date_input("Expiry Date (optional)", value=None,
+                                        help="Leave empty for items that do not expire")
+
             submitted = st.form_submit_button("Add Item", use_container_width=True)
-        
+
         if submitted:
             if item_name and quantity >= 0:
                 item_data = {
@@ -119,11 +278,85 @@ def show():
                     "quantity": quantity,
                     "unit": unit,
                     "description": description,
+                    "version": 0,
                     "created_at": datetime.now(),
                     "updated_at": datetime.now()
                 }
-                inventory.insert_one(item_data)
+                if expiry_date is not None and quantity > 0:
+                    item_data["lots"] = [new_lot(quantity, expiry_date)]
+                    item_data["earliest_expiry"] = item_data["lots"][0]["expiry_date"]
+                result = inventory.insert_one(item_data)
+                record_changes(inventory.database,
+                               [change(dict(item_data, _id=result.inserted_id), quantity, quantity)], "add")
+                record_summary(inventory.database, [(None, item_data)])
+                cache.invalidate(center_id, NETWORK)
                 st.success("Item added successfully! ✅")
                 st.rerun()
             else:
                 st.error("Please fill in all required fields")
+
+    with tab3:
+        st.subheader("Bulk Import")
+        st.caption("Upload a CSV (item_name, category, quantity, unit, description, optional item_id and "
+                   "expiry_date), a JSON list of items or a Helpkart export. Rows with an existing item_id are updated.")
+
+        uploaded = st.file_uploader("Inventory file", type=["csv", "json", "ndjson", "jsonl"])
+        if uploaded is not None and st.button("📥 Import", use_container_width=True):
+            try:
+                with st.spinner("Importing..."):
+                    report = import_items(inventory, iter_rows(uploaded, uploaded.name), center_id)
+            except ValueError as e:
+                st.error(f"Could not read file: {e}")
+            else:
+                cache.invalidate(center_id, NETWORK)
+                st.success(f"✅ {report.rows} rows: {report.inserted} added, {report.updated} updated, "
+                           f"{report.unchanged} unchanged")
+                if report.failed:
+                    st.warning(f"⚠️ {report.failed} row{'s' if report.failed != 1 else ''} skipped")
+                    st.dataframe(pd.DataFrame(report.errors, columns=["Row", "Error"]), hide_index=True)
+
+    with tab4:
+        st.subheader("Transfer Stock")
+        show_transfer_form(db, center_id)
+
+
+def show_transfer_form(db, center_id):
+    """Send stock to another center, optionally fulfilling one of its requests"""
+    cache = get_read_cache()
+    items = cache.get_or_load(center_id, "inventory", "items",
+                              lambda: load_items(db["inventory"], center_id))
+    in_stock = [item for item in items if item.get("quantity", 0) > 0]
+    centers = {cid: name for cid, name in get_center_names().items() if cid != center_id}
+    if not in_stock:
+        st.info("No items in stock to transfer")
+        return
+    if not centers:
+        st.info("No other centers to transfer to")
+        return
+
+    item = st.selectbox("Item", in_stock, key="transfer_item",
+                        format_func=lambda i: f"{i['item_name']} ({i['quantity']} {i.get('unit', '')})")
+    to_center = st.selectbox("Receiving center", list(centers), format_func=centers.get, key="transfer_center")
+
+    their_requests = cache.get_or_load(to_center, "requests", "list",
+                                       lambda: list(db["requests"].find({"center_id": to_center})))
+    # Only requests for the item being sent can be fulfilled by it
+    pending = [req for req in their_requests if req.get("status", "Pending") == "Pending"
+               and normalize(req.get("item_name")) == normalize(item["item_name"])]
+    request = st.selectbox("Fulfils request", [None] + pending, key="transfer_request",
+                           format_func=lambda r: "Not linked to a request" if r is None
+                           else f"{r.get('item_name', 'N/A')} × {r.get('quantity', 0) - r.get('fulfilled_quantity', 0)}")
+
+    quantity = st.number_input("Quantity", min_value=1, max_value=int(item["quantity"]), key="transfer_quantity")
+
+    if st.button("🚚 Transfer", use_container_width=True):
+        try:
+            transfer_stock(db, item["_id"], center_id, to_center, quantity,
+                           request_id=request["_id"] if request else None,
+                           created_by=st.session_state.get("center_email"))
+        except TransferError as e:
+            st.error(f"Transfer failed: {e}")
+        else:
+            cache.invalidate(center_id, to_center, NETWORK)
+            st.success(f"Sent {quantity} {item.get('unit', '')} of {item['item_name']} to {centers[to_center]} ✅")
+            st.rerun()
@@ -1,8 +1,28 @@
 import streamlit as st
-from utils import get_database
+from utils import get_database, get_read_cache, get_match_index, get_center_names
 from datetime import datetime
 import uuid
 
+MATCHES_PER_REQUEST = 3
+
+
+def show_matches(req, center_id):
+    """List surplus from other centers that could cover a pending request"""
+    index = get_match_index()
+    if index is None:
+        return
+    matches = index.match(req.get("item_name", ""), min_quantity=req.get("quantity", 0),
+                          exclude_center=center_id, k=MATCHES_PER_REQUEST)
+    if not matches:
+        return
+    names = get_center_names()
+    with st.expander(f"🔎 {len(matches)} possible match{'es' if len(matches) != 1 else ''}"):
+        for _, item in matches:
+            center_name = names.get(item.get("center_id"), "Unknown center")
+            st.write(f"• **{item.get('item_name', 'N/A')}** at {center_name} - "
+                     f"{item.get('quantity', 0)} {item.get('unit', '')} available")
+
+
 def show():
     st.title("📬 My Requests")
     
@@ -13,12 +33,14 @@ def show():
     
     center_id = st.session_state.center_id
     requests_col = db["requests"]
+    cache = get_read_cache()
     
     tab1, tab2 = st.tabs(["View Requests", "Create Request"])
     
     with tab1:
         st.subheader("Your Requests")
-        user_requests = list(requests_col.find({"center_id": center_id}))
+        user_requests = cache.get_or_load(center_id, "requests", "list",
+                                          lambda: list(requests_col.find({"center_id": center_id})))
         
         if user_requests:
             for req in user_requests:
@@ -28,8 +50,13 @@ def show():
                         st.write(f"**Item**: {req.get('item_name', 'N/A')}")
                     with col2:
                         st.write(f"**Quantity**: {req.get('quantity', 0)}")
+                        if req.get("fulfilled_quantity"):
+                            st.caption(f"{req['fulfilled_quantity']} received so far")
                     with col3:
                         st.write(f"**Status**: {req.get('status', 'Pending')}")
+
+                    if req.get("status", "Pending") == "Pending":
+                        show_matches(req, center_id)
         else:
             st.info("No requests yet")
     
@@ -53,6 +80,7 @@ def show():
                     "updated_at": datetime.now()
                 }
                 requests_col.insert_one(request_data)
+                cache.invalidate(center_id)
                 st.success("Request submitted successfully!")
                 st.rerun()
             else:
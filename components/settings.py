@@ -1,6 +1,9 @@
 import streamlit as st
-from utils import get_database, hash_password
+from utils import get_database, get_read_cache, hash_password, get_cookie_controller, set_session_cookie
+from cache import NETWORK
+from geo import to_point
 from bson.objectid import ObjectId
+from datetime import datetime
 
 
 def show():
@@ -23,13 +26,15 @@ def show():
         return
 
     centers = db["centers"]
+    cache = get_read_cache()
     
     tab1, tab2 = st.tabs(["Profile Settings", "Change Password"])
     
     with tab1:
         st.subheader("Update Profile")
         
-        center = centers.find_one({"_id": center_oid})
+        center = cache.get_or_load(st.session_state.center_id, "centers", "profile",
+                                   lambda: centers.find_one({"_id": center_oid}, {"password": 0}))
         
         if center:
             # Optional: small summary card at top
@@ -44,19 +49,39 @@ def show():
             with col2:
                 new_address = st.text_area("Address", value=center.get("address", ""))
                 new_email = st.text_input("Email", value=center.get("email", ""))
+
+            coordinates = center.get("location_coordinates") or {}
+            col_lat, col_lng = st.columns(2)
+            with col_lat:
+                new_latitude = st.number_input("Latitude", format="%.6f", value=float(coordinates.get("lat") or 0.0),
+                                               min_value=-90.0, max_value=90.0)
+            with col_lng:
+                new_longitude = st.number_input("Longitude", format="%.6f", value=float(coordinates.get("lng") or 0.0),
+                                                min_value=-180.0, max_value=180.0)
             
             if st.button("Update Profile", use_container_width=True):
-                centers.update_one(
-                    {"_id": center_oid},
-                    {"$set": {
+                location = to_point(new_latitude, new_longitude)
+                update = {
+                    "$set": {
                         "center_name": new_center_name,
                         "phone": new_phone,
                         "address": new_address,
                         "email": new_email,
-                    }}
-                )
+                        "location_coordinates": {"lat": new_latitude, "lng": new_longitude},
+                        "updated_at": datetime.now(),
+                    }
+                }
+                if location is None:
+                    update["$unset"] = {"location": ""}
+                else:
+                    update["$set"]["location"] = location
+                centers.update_one({"_id": center_oid}, update)
+                # Names and locations also show up in other centers' Browse and match lists
+                cache.invalidate(st.session_state.center_id, NETWORK)
                 st.session_state.center_name = new_center_name
                 st.session_state.center_email = new_email
+                # The session cookie carries name and email, so reissue it
+                set_session_cookie(get_cookie_controller(), st.session_state.center_id, new_email, new_center_name)
                 st.success("Profile updated successfully!")
                 st.rerun()
         else:
@@ -89,6 +114,6 @@ def show():
                 hashed_pwd = hash_password(new_password)
                 centers.update_one(
                     {"_id": center_oid},
-                    {"$set": {"password": hashed_pwd}}
+                    {"$set": {"password": hashed_pwd, "updated_at": datetime.now()}}
                 )
                 st.success("Password changed successfully!")
@@ -0,0 +1,5 @@
+"""Vocabularies shared by the inventory forms, Browse filters and imports"""
+
+ITEM_CATEGORIES = ["Medical", "Food", "Clothing", "Other"]
+
+ITEM_UNITS = ["kg", "liters", "pieces", "grams", "meters", "boxes", "bottles", "packets", "cartons", "bags", "Other"]
@@ -0,0 +1,91 @@
+"""Concurrent loading of a page's independent queries.
+
+A page hands fan_out() its queries as loader functions; they run at once on
+a shared thread pool (see utils.get_query_pool) so the page waits about as
+long as its slowest query rather than the sum of all of them. Each loader
+runs under pymongo.timeout(), so the server gives up on it too, and a failed
+or timed-out query is reported separately instead of failing the page.
+Timeouts count from when a loader gets a worker; a loader still queued
+after QUEUE_TIMEOUT_SECONDS (the pool is busy with other pages) is
+cancelled before it takes one and reported as timed out.
+
+Loaders run in a copy of the caller's context, which keeps MongoDB commands
+attributed to the page that issued them (see monitoring.track_page).
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import pymongo
+from pymongo.errors import PyMongoError
+
+DEFAULT_TIMEOUT_SECONDS = 5.0
+
+# Longest a loader may wait for a free worker of the shared pool
+QUEUE_TIMEOUT_SECONDS = 1.0
+
+# Extra wait for a loader to notice its own timeout before giving up on it
+_GRACE_SECONDS = 0.5
+
+
+class QueryTimeout(Exception):
+    """A query that did not finish within its timeout"""
+
+
+class _Start:
+    """When a loader got a worker"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.at = None
+
+    def mark(self):
+        self.at = time.monotonic()
+        self.event.set()
+
+
+def _run(loader, timeout, start):
+    start.mark()
+    with pymongo.timeout(timeout):
+        return loader()
+
+
+def _result(name, future, start, deadline, timeout):
+    """Wait for a loader: until deadline for a worker, then timeout from its start"""
+    if not start.event.wait(max(0.0, deadline - time.monotonic())) and future.cancel():
+        raise QueryTimeout(f"{name} did not get a worker in time, the server is busy")
+    start.event.wait()
+    remaining = start.at + timeout + _GRACE_SECONDS - time.monotonic()
+    try:
+        return future.result(timeout=max(0.0, remaining))
+    except FutureTimeoutError:
+        raise QueryTimeout(f"{name} did not finish within {timeout:g}s")
+
+
+def fan_out(pool, queries, timeout=DEFAULT_TIMEOUT_SECONDS, timeouts=None, queue_timeout=QUEUE_TIMEOUT_SECONDS):
+    """Run {name: loader} concurrently; return ({name: result}, {name: exception}).
+
+    timeouts overrides the timeout (seconds) for individual queries.
+    """
+    timeouts = timeouts or {}
+    deadline = time.monotonic() + queue_timeout
+    futures = {}
+    for name, loader in queries.items():
+        context = contextvars.copy_context()
+        start = _Start()
+        futures[name] = (pool.submit(context.run, _run, loader, timeouts.get(name, timeout), start), start)
+
+    results, errors = {}, {}
+    for name, (future, start) in futures.items():
+        try:
+            results[name] = _result(name, future, start, deadline, timeouts.get(name, timeout))
+        except QueryTimeout as e:
+            errors[name] = e
+        except PyMongoError as e:
+            if e.timeout:
+                errors[name] = QueryTimeout(f"{name} did not finish within {timeouts.get(name, timeout):g}s")
+            else:
+                errors[name] = e
+        except Exception as e:
+            errors[name] = e
+    return results, errors
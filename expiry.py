@@ -0,0 +1,176 @@
+"""Lot-level expiry dates and first-expired-first-out (FEFO) allocation.
+
+An inventory item's `quantity` is its total stock. Stock with a known expiry
+date is recorded as lots ({lot_id, quantity, expiry_date}) in `lots`; any
+quantity not covered by a lot has no expiry date. The earliest expiry date of
+the lots is kept in `earliest_expiry` (absent without lots), which migration 7
+indexes for the expiring-soon queries.
+
+Stock leaves first-expired-first-out: transfers and quantity reductions use
+up the lot that expires first and undated stock last. Expired lots are moved
+to `expired_lots` by archive_expired(), run daily by the archive workflow:
+
+    python expiry.py
+    python expiry.py --dry-run
+"""
+import argparse
+import sys
+import uuid
+from datetime import date, datetime, time, timedelta
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from history import changes_from, record_changes
+from migrations import DATABASE_NAME
+from mongo_config import create_client
+from stock_summary import record_summary
+
+EXPIRING_SOON_DAYS = 14
+ARCHIVE_COLLECTION = "expired_lots"
+
+
+def as_expiry(value):
+    """Normalize a date, datetime or ISO string to a datetime (None if empty)"""
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, time.min)
+    return datetime.fromisoformat(str(value).strip())
+
+
+def new_lot(quantity, expiry_date, lot_id=None):
+    return {"lot_id": lot_id or str(uuid.uuid4()), "quantity": int(quantity), "expiry_date": as_expiry(expiry_date)}
+
+
+def _consume(lots, units):
+    """Take units from lots in order; return (remaining lots, taken lots)"""
+    remaining, taken = [], []
+    for lot in lots:
+        used = min(units, lot["quantity"])
+        units -= used
+        if used:
+            taken.append(dict(lot, quantity=used))
+        if lot["quantity"] > used:
+            remaining.append(dict(lot, quantity=lot["quantity"] - used))
+    return remaining, taken
+
+
+def fit_lots(lots, total):
+    """An item's lots in expiry order, holding at most its total quantity.
+
+    Writes that lower the quantity without naming a lot (older clients,
+    imports without dates) are taken to have used the earliest lots.
+    """
+    lots = sorted((lot for lot in lots or [] if lot.get("quantity", 0) > 0 and lot.get("expiry_date")),
+                  key=lambda lot: lot["expiry_date"])
+    excess = sum(lot["quantity"] for lot in lots) - total
+    if excess > 0:
+        lots, _ = _consume(lots, excess)
+    return lots
+
+
+def allocate_fefo(lots, total, quantity):
+    """Take quantity units from an item holding total units, earliest expiry first.
+
+    Returns (lots left on the item, lots taken); units taken beyond the lots
+    are undated.
+    """
+    return _consume(fit_lots(lots, total), quantity)
+
+
+def earliest_expiry(lots):
+    dates = [lot["expiry_date"] for lot in lots or [] if lot.get("quantity", 0) > 0 and lot.get("expiry_date")]
+    return min(dates) if dates else None
+
+
+def set_lots(update, lots):
+    """Add the operators that store lots and their earliest expiry to an update"""
+    update.setdefault("$set", {})["lots"] = lots
+    first = earliest_expiry(lots)
+    if first is None:
+        update.setdefault("$unset", {})["earliest_expiry"] = ""
+    else:
+        update["$set"]["earliest_expiry"] = first
+    return update
+
+
+def add_lots(update, lots):
+    """Add the operators that append lots to an item (also valid for upserts)"""
+    lots = [lot for lot in lots if lot.get("expiry_date")]
+    if lots:
+        update["$push"] = {"lots": {"$each": lots}}
+        update["$min"] = {"earliest_expiry": earliest_expiry(lots)}
+    return update
+
+
+def expiring_query(days=EXPIRING_SOON_DAYS, now=None):
+    """Condition for items with a lot expiring within days (expired lots are archived)"""
+    now = now or datetime.now()
+    return {"earliest_expiry": {"$lte": now + timedelta(days=days)}}
+
+
+def archive_expired(db, now=None, dry_run=False):
+    """Move lots that expired before now out of inventory; return (items, lots, units)"""
+    now = now or datetime.now()
+    inventory = db["inventory"]
+    items = lots_archived = units = 0
+
+    projection = {"center_id": 1, "item_id": 1, "item_name": 1, "category": 1, "unit": 1, "quantity": 1, "lots": 1}
+    for item in inventory.find({"earliest_expiry": {"$lt": now}}, projection):
+        lots = fit_lots(item.get("lots"), item.get("quantity", 0))
+        expired = [lot for lot in lots if lot["expiry_date"] < now]
+        kept = [lot for lot in lots if lot["expiry_date"] >= now]
+        expired_units = sum(lot["quantity"] for lot in expired)
+
+        if not dry_run:
+            # Archive first, so a crash before the item update leaves an
+            # archive record (rewritten by the next run) rather than lost lots.
+            # Transferred lots keep their lot_id, hence the item in the key
+            keys = [{"inventory_id": item["_id"], "lot_id": lot.get("lot_id")} for lot in expired]
+            if expired:
+                db[ARCHIVE_COLLECTION].bulk_write([UpdateOne(key, {"$set": dict(
+                    lot,
+                    item_id=item.get("item_id"),
+                    center_id=item.get("center_id"),
+                    item_name=item.get("item_name"),
+                    unit=item.get("unit"),
+                    archived_at=now,
+                )}, upsert=True) for key, lot in zip(keys, expired)], ordered=False)
+
+            update = set_lots({"$inc": {"quantity": -expired_units, "version": 1}, "$set": {"updated_at": now}}, kept)
+            # Only while the item still holds what we read; a later run retries
+            result = inventory.update_one({"_id": item["_id"], "quantity": item.get("quantity", 0),
+                                           "lots": item["lots"] if "lots" in item else {"$exists": False}}, update)
+            if not result.modified_count:
+                if expired:
+                    db[ARCHIVE_COLLECTION].delete_many({"$or": keys})
+                continue
+            pairs = [(item, dict(item, quantity=item.get("quantity", 0) - expired_units))]
+            record_changes(db, changes_from(pairs), "expired", now)
+            record_summary(db, pairs)
+
+        items += 1
+        lots_archived += len(expired)
+        units += expired_units
+    return items, lots_archived, units
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive expired inventory lots")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be archived")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = create_client()[DATABASE_NAME]
+    items, lots, units = archive_expired(db, dry_run=args.dry_run)
+    verb = "Would archive" if args.dry_run else "Archived"
+    print(f"✅ {verb} {lots} expired lot{'s' if lots != 1 else ''} ({units} units) from {items} item{'s' if items != 1 else ''}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
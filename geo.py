@@ -0,0 +1,122 @@
+"""Center locations: GeoJSON points, distances and an in-process k-d tree.
+
+Centers store their position twice: the `location_coordinates` {lat, lng}
+pair entered at signup and a GeoJSON `location` point backed by a 2dsphere
+index, which is what $geoNear queries use. (0, 0) is the signup form's
+default and is treated as "no location".
+
+CenterTree answers nearest-neighbour questions without a database, e.g. over
+export snapshots (see scripts/nearest_supply.py). Points are stored as unit
+vectors, so chord length orders them exactly like great-circle distance.
+"""
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_point(lat, lng):
+    """GeoJSON point for a coordinate pair, or None if it is missing or invalid"""
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or (lat == 0 and lng == 0):
+        return None
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def center_coordinates(center):
+    """(lat, lng) of a center document, or None"""
+    location = center.get("location") or {}
+    if location.get("type") == "Point":
+        lng, lat = location["coordinates"]
+        return lat, lng
+    coordinates = center.get("location_coordinates") or {}
+    if to_point(coordinates.get("lat"), coordinates.get("lng")) is None:
+        return None
+    return float(coordinates["lat"]), float(coordinates["lng"])
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _unit_vector(lat, lng):
+    phi, lam = math.radians(lat), math.radians(lng)
+    return (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+
+
+def _chord(km):
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def _km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+class CenterTree:
+    """Static 3-d tree over (lat, lng, payload) points"""
+
+    def __init__(self, points):
+        nodes = [(_unit_vector(lat, lng), payload) for lat, lng, payload in points]
+        self._size = len(nodes)
+        self._root = self._build(nodes, 0)
+
+    def __len__(self):
+        return self._size
+
+    def _build(self, nodes, axis):
+        if not nodes:
+            return None
+        nodes.sort(key=lambda node: node[0][axis])
+        middle = len(nodes) // 2
+        vector, payload = nodes[middle]
+        following = (axis + 1) % 3
+        return (vector, payload, axis,
+                self._build(nodes[:middle], following),
+                self._build(nodes[middle + 1:], following))
+
+    def nearest(self, lat, lng, k=5, max_km=None, accept=None):
+        """Return up to k (distance_km, payload) pairs, closest first.
+
+        accept, if given, is called with each payload and filters candidates.
+        """
+        if k <= 0 or self._root is None:
+            return []
+        target = _unit_vector(lat, lng)
+        limit = _chord(max_km) ** 2 if max_km is not None else math.inf
+        heap = []  # max-heap of (-squared chord, tiebreak, payload)
+        counter = 0
+
+        def radius():
+            return -heap[0][0] if len(heap) == k else limit
+
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            vector, payload, axis, left, right = node
+            squared = sum((a - b) ** 2 for a, b in zip(vector, target))
+            if squared <= radius() and (accept is None or accept(payload)):
+                counter += 1
+                if len(heap) < k:
+                    heapq.heappush(heap, (-squared, counter, payload))
+                else:
+                    heapq.heapreplace(heap, (-squared, counter, payload))
+
+            offset = target[axis] - vector[axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            # Visit the far side only if the splitting plane is within range;
+            # pushed first so the near side is explored first
+            if offset * offset <= radius():
+                stack.append(far)
+            stack.append(near)
+
+        ranked = sorted(heap, reverse=True)
+        return [(_km(math.sqrt(-squared)), payload) for squared, _, payload in ranked]
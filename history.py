@@ -0,0 +1,145 @@
+"""Stock-level history as a bucketed time series plus incremental rollups.
+
+Every quantity change is appended to `stock_history`, one bucket document
+per item per day holding that day's events (a busy item opens another bucket
+for the same day after BUCKET_SIZE events). At the same time the hourly and
+daily rollup documents in `stock_rollups` for the item's center and category
+are incremented, so trends and forecasts read a few dozen small documents
+instead of raw events.
+
+Each write path records what it changed (see change()) in the same
+bulk_write: the inventory grid, the Add Item form, imports, transfers and the
+expired-lot archive job.
+"""
+import logging
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+HISTORY_COLLECTION = "stock_history"
+ROLLUP_COLLECTION = "stock_rollups"
+BUCKET_SIZE = 500
+GRANULARITIES = {
+    "hour": lambda at: at.replace(minute=0, second=0, microsecond=0),
+    "day": lambda at: at.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+
+TREND_DAYS = 30
+FORECAST_WINDOW_DAYS = 14
+
+
+def change(item, delta, quantity):
+    """One quantity change of an inventory item: delta units, quantity afterwards"""
+    return {
+        "inventory_id": item["_id"],
+        "item_id": item.get("item_id"),
+        "center_id": item.get("center_id"),
+        "item_name": item.get("item_name"),
+        "category": item.get("category") or "Other",
+        "delta": int(delta),
+        "quantity": int(quantity),
+    }
+
+
+def changes_from(pairs):
+    """Changes of (before, after) item pairs; before is None for new items, after for deleted ones"""
+    return [change(after or before, (after or {}).get("quantity", 0) - (before or {}).get("quantity", 0),
+                   (after or {}).get("quantity", 0)) for before, after in pairs]
+
+
+def history_operations(changes, source, now):
+    """Bucket appends and rollup increments for a list of changes"""
+    buckets = []
+    rollups = {}
+    for c in changes:
+        if not c["delta"]:
+            continue
+        day = GRANULARITIES["day"](now)
+        buckets.append(UpdateOne(
+            {"inventory_id": c["inventory_id"], "day": day, "count": {"$lt": BUCKET_SIZE}},
+            {
+                "$push": {"events": {"at": now, "delta": c["delta"], "quantity": c["quantity"], "source": source}},
+                "$inc": {"count": 1},
+                "$min": {"low": c["quantity"]},
+                "$max": {"high": c["quantity"]},
+                "$set": {"last_quantity": c["quantity"], "item_name": c["item_name"], "category": c["category"]},
+                "$setOnInsert": {"center_id": c["center_id"], "item_id": c["item_id"],
+                                 "first_quantity": c["quantity"] - c["delta"]},
+            },
+            upsert=True,
+        ))
+        for granularity, truncate in GRANULARITIES.items():
+            key = (granularity, c["center_id"], c["category"], truncate(now))
+            totals = rollups.setdefault(key, {"added": 0, "removed": 0, "net": 0, "events": 0,
+                                              f"by_source.{source}": 0})
+            totals["added"] += max(c["delta"], 0)
+            totals["removed"] += max(-c["delta"], 0)
+            totals["net"] += c["delta"]
+            totals["events"] += 1
+            totals[f"by_source.{source}"] += c["delta"]
+
+    increments = []
+    for (granularity, center_id, category, period), totals in rollups.items():
+        increments.append(UpdateOne(
+            {"_id": f"{granularity}:{center_id}:{category}:{period:%Y%m%d%H}"},
+            {
+                "$inc": totals,
+                "$setOnInsert": {"granularity": granularity, "center_id": center_id,
+                                 "category": category, "period": period},
+            },
+            upsert=True,
+        ))
+    return buckets, increments
+
+
+def record_changes(db, changes, source, now=None, session=None):
+    """Append quantity changes to the history and rollups.
+
+    History is secondary to the stock itself, so outside a transaction a
+    failure is logged rather than undoing a write that already succeeded.
+    """
+    buckets, increments = history_operations(changes, source, now or datetime.now())
+    if not buckets:
+        return
+    try:
+        db[HISTORY_COLLECTION].bulk_write(buckets, ordered=False, session=session)
+        db[ROLLUP_COLLECTION].bulk_write(increments, ordered=False, session=session)
+    except Exception as e:
+        if session is not None:
+            raise
+        logger.warning("Could not record %d stock changes from %s: %s", len(changes), source, e)
+
+
+def load_rollups(rollups, center_id, granularity="day", since=None):
+    """A center's rollup documents of one granularity, oldest first"""
+    query = {"center_id": center_id, "granularity": granularity}
+    if since is not None:
+        query["period"] = {"$gte": since}
+    return list(rollups.find(query, {"by_source": 0}).sort("period", 1))
+
+
+def burn_down(stock_by_category, daily_rollups, window_days=FORECAST_WINDOW_DAYS, now=None):
+    """Days of stock left per category at the average removal rate of the last window_days.
+
+    Returns rows of {category, quantity, removed_per_day, days_left}; days_left
+    is None when nothing was removed in the window.
+    """
+    now = now or datetime.now()
+    since = GRANULARITIES["day"](now) - timedelta(days=window_days - 1)
+    removed = {}
+    for rollup in daily_rollups:
+        if rollup["period"] >= since:
+            removed[rollup["category"]] = removed.get(rollup["category"], 0) + rollup.get("removed", 0)
+
+    rows = []
+    for category in sorted(set(stock_by_category) | set(removed)):
+        quantity = stock_by_category.get(category, 0)
+        per_day = removed.get(category, 0) / window_days
+        rows.append({
+            "category": category,
+            "quantity": quantity,
+            "removed_per_day": round(per_day, 1),
+            "days_left": round(quantity / per_day, 1) if per_day else None,
+        })
+    return rows
@@ -0,0 +1,253 @@
+"""Bulk inventory import from CSV, JSON or helpkart export files.
+
+Rows are streamed, validated against the category/unit vocabularies of the
+Add Item form and upserted by (center_id, item_id) in unordered bulk_write
+batches. An optional expiry_date (YYYY-MM-DD) records the row as one lot;
+an undated row that lowers the quantity gives up the earliest-expiring lots.
+Every rejected row is reported with its row number.
+Rows that match the stored item are left alone, so re-importing a file does
+not bump versions or updated_at.
+
+    python importer.py supplies.csv --center-id 692e62e4ce5678d6a18ac0e7
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import sys
+import uuid
+from datetime import datetime
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from constants import ITEM_CATEGORIES, ITEM_UNITS
+from expiry import as_expiry, fit_lots, new_lot, set_lots
+from history import changes_from, record_changes
+from stock_summary import record_summary
+from migrations import DATABASE_NAME
+from mongo_config import create_client
+from transfers import version_filter
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+_CATEGORIES = {category.lower(): category for category in ITEM_CATEGORIES}
+_UNITS = {unit.lower(): unit for unit in ITEM_UNITS}
+
+
+class ImportReport:
+    """Counts and per-row errors of one import"""
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.errors = []  # (row number, message)
+
+    def add_error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, message))
+
+
+def iter_rows(fileobj, filename):
+    """Yield (row number, raw row) pairs from a CSV, JSON or NDJSON file.
+
+    Accepts a plain list of items, a helpkart export ({"data": {"inventory":
+    [...]}}) or an NDJSON export. fileobj may be binary or text.
+    """
+    if isinstance(fileobj, (io.RawIOBase, io.BufferedIOBase)):
+        fileobj = io.TextIOWrapper(fileobj, encoding="utf-8-sig")
+
+    name = filename.lower()
+    if name.endswith(".csv"):
+        yield from enumerate(csv.DictReader(fileobj), start=2)  # row 1 is the header
+    elif name.endswith(".ndjson") or name.endswith(".jsonl"):
+        for number, line in enumerate(fileobj, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                yield number, record
+            elif "collection" in record:
+                # helpkart NDJSON export: only its inventory records
+                if record["collection"] == "inventory":
+                    yield number, record["doc"]
+            elif "generated_at" not in record and "summary" not in record:
+                yield number, record
+    elif name.endswith(".json"):
+        document = json.load(fileobj)
+        if isinstance(document, dict):
+            data = document.get("data", {})
+            document = data.get("inventory", []) if isinstance(data, dict) else None
+        if not isinstance(document, list):
+            raise ValueError("expected a list of items or a helpkart export")
+        yield from enumerate(document, start=1)
+    else:
+        raise ValueError("Unsupported file type, use .csv, .json or .ndjson")
+
+
+def validate_row(row):
+    """Return (fields, None) for a valid row or (None, error message)"""
+    if not isinstance(row, dict):
+        return None, f"row {row!r} is not an object"
+    item_name = str(row.get("item_name") or "").strip()
+    if not item_name:
+        return None, "item_name is required"
+
+    try:
+        quantity = float(row.get("quantity"))
+    except (TypeError, ValueError):
+        return None, f"quantity {row.get('quantity')!r} is not a number"
+    if not math.isfinite(quantity) or quantity < 0 or quantity != int(quantity):
+        return None, f"quantity {row.get('quantity')!r} must be a whole number of 0 or more"
+
+    category = _CATEGORIES.get(str(row.get("category") or "Other").strip().lower())
+    if category is None:
+        return None, f"unknown category {row.get('category')!r}"
+
+    unit = _UNITS.get(str(row.get("unit") or "").strip().lower())
+    if unit is None:
+        return None, f"unknown unit {row.get('unit')!r}"
+
+    try:
+        expiry_date = as_expiry(row.get("expiry_date"))
+    except (TypeError, ValueError):
+        return None, f"expiry_date {row.get('expiry_date')!r} is not a date (use YYYY-MM-DD)"
+
+    return {
+        "expiry_date": expiry_date,
+        "item_id": str(row.get("item_id") or "").strip() or str(uuid.uuid4()),
+        "item_name": item_name,
+        "category": category,
+        "quantity": int(quantity),
+        "unit": unit,
+        "description": str(row.get("description") or "")
+    }, None
+
+
+def _quantities(collection, center_id, item_ids):
+    query = {"center_id": center_id, "item_id": {"$in": list(set(item_ids))}}
+    projection = {"item_id": 1, "center_id": 1, "item_name": 1, "category": 1, "unit": 1, "quantity": 1,
+                  "lots": 1, "version": 1}
+    return {doc["_id"]: doc for doc in collection.find(query, projection)}
+
+
+def row_operations(center_id, item_id, fields, expiry_date, now):
+    """Two writes per row: update the item only if it differs, insert it if missing"""
+    key = {"center_id": center_id, "item_id": item_id}
+    current = dict(fields)
+    update = {"$set": dict(fields, updated_at=now), "$inc": {"version": 1}}
+    if expiry_date is not None:
+        # A dated row replaces the item's lots with one lot of its quantity
+        lots = [new_lot(fields["quantity"], expiry_date)] if fields["quantity"] else []
+        set_lots(update, lots)
+        current["lots"] = {"$size": len(lots)}
+        if lots:
+            current["lots.0.quantity"] = lots[0]["quantity"]
+            current["lots.0.expiry_date"] = lots[0]["expiry_date"]
+    insert = dict(update["$set"], version=0, created_at=now)
+    return [
+        UpdateOne(dict(key, **{"$nor": [current]}), update),
+        UpdateOne(key, {"$setOnInsert": insert}, upsert=True),
+    ]
+
+
+def _trim_lots(collection, items):
+    """Drop the earliest lots of items that undated rows left holding fewer units than their lots"""
+    operations = []
+    for item in items:
+        lots = item.get("lots") or []
+        if sum(lot.get("quantity", 0) for lot in lots) > item.get("quantity", 0):
+            update = set_lots({"$inc": {"version": 1}}, fit_lots(lots, item.get("quantity", 0)))
+            operations.append(UpdateOne(dict({"_id": item["_id"]}, **version_filter(item)), update))
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+
+def _flush(collection, operations, row_numbers, report, center_id=None, item_ids=None):
+    if not operations:
+        return
+    before = _quantities(collection, center_id, item_ids) if item_ids else {}
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        details = result.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        for error in details.get("writeErrors", []):
+            report.add_error(row_numbers[error["index"] // 2], error.get("errmsg", "write failed"))
+    # Only the conditional updates modify; the insert of an existing item
+    # matches without changing it
+    upserted = details.get("nUpserted", 0)
+    modified = details.get("nModified", 0)
+    existing = details.get("nMatched", 0) - modified
+    report.inserted += upserted
+    report.updated += modified
+    report.unchanged += existing - modified
+    if item_ids:
+        after = _quantities(collection, center_id, item_ids)
+        _trim_lots(collection, after.values())
+        # Compare with the items before the batch, so repeated rows count once
+        pairs = [(before.get(_id), doc) for _id, doc in after.items()]
+        record_changes(collection.database, changes_from(pairs), "import")
+        record_summary(collection.database, pairs)
+        item_ids.clear()
+    operations.clear()
+    row_numbers.clear()
+
+
+def import_items(collection, rows, center_id, batch_size=BATCH_SIZE):
+    """Upsert validated rows into a center's inventory; return an ImportReport"""
+    report = ImportReport()
+    operations = []
+    row_numbers = []
+    item_ids = []
+
+    for row_number, row in rows:
+        report.rows += 1
+        fields, error = validate_row(row)
+        if error:
+            report.add_error(row_number, error)
+            continue
+
+        item_id = fields.pop("item_id")
+        expiry_date = fields.pop("expiry_date")
+        operations += row_operations(center_id, item_id, fields, expiry_date, datetime.now())
+        row_numbers.append(row_number)
+        item_ids.append(item_id)
+        if len(row_numbers) >= batch_size:
+            _flush(collection, operations, row_numbers, report, center_id, item_ids)
+
+    _flush(collection, operations, row_numbers, report, center_id, item_ids)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import inventory items for a center")
+    parser.add_argument("file", help=".csv, .json, .ndjson or a helpkart export")
+    parser.add_argument("--center-id", required=True, help="_id of the receiving center")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = create_client()
+    collection = client[DATABASE_NAME]["inventory"]
+
+    with open(args.file, encoding="utf-8-sig") as f:
+        report = import_items(collection, iter_rows(f, args.file), args.center_id, args.batch_size)
+
+    print(f"✅ {report.rows} rows: {report.inserted} added, {report.updated} updated, "
+          f"{report.unchanged} unchanged, {report.failed} failed")
+    for row_number, message in report.errors:
+        print(f"   row {row_number}: {message}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,201 @@
+"""Request-to-surplus matching over an inverted item-name index.
+
+MatchIndex keeps token -> {item _id: weight} postings for every inventory
+item in the network. It is fed incrementally by the network watcher (see
+utils.get_match_index), so a lookup only touches the postings of the
+request's own tokens instead of scanning every item.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+NAME_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on",
+    "or", "the", "to", "with", "need", "needed", "needs", "urgent", "urgently", "please", "our", "we",
+}
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_EPSILON = 1e-9
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation to single spaces"""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def stem(token):
+    """Very small plural stemmer: bandages -> bandage, boxes -> box, supplies -> supply"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("ches", "shes", "sses", "xes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Normalized, stemmed tokens without stopwords"""
+    return [stem(token) for token in normalize(text).split() if token not in STOPWORDS and len(token) > 1]
+
+
+class MatchIndex:
+    """Incrementally maintained inverted index over network inventory.
+
+    Each token has a postings dict (_id -> weight) for random access and,
+    per weight, a tier list sorted by descending quantity. New entries are
+    merged into a tier when it is next read, so bulk loads do not pay for a
+    sorted insert per item. Lookups walk the
+    tiers of the rarest tokens first and stop as soon as no remaining item
+    can beat the current top-k (MaxScore-style pruning), so common tokens do
+    not force a scan of every item that contains them.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(dict)                    # token -> {seq: weight}
+        self._tiers = defaultdict(lambda: defaultdict(list))  # token -> weight -> [(-quantity, seq)]
+        self._pending = defaultdict(set)                      # (token, weight) -> unmerged tier entries
+        self._items = {}                                      # seq -> (doc, {token: weight})
+        self._seqs = {}                                       # _id -> seq
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def _item_tokens(self, doc):
+        weights = {}
+        for token in tokenize(doc.get("description")):
+            weights[token] = DESCRIPTION_WEIGHT
+        for token in tokenize(doc.get("item_name")):
+            weights[token] = NAME_WEIGHT
+        return weights
+
+    def _remove_locked(self, _id):
+        seq = self._seqs.pop(_id, None)
+        if seq is None:
+            return
+        doc, weights = self._items.pop(seq)
+        key = (-(doc.get("quantity") or 0), seq)
+        for token, weight in weights.items():
+            del self._postings[token][seq]
+            pending = self._pending.get((token, weight))
+            if pending and key in pending:
+                pending.remove(key)
+            else:
+                tier = self._tiers[token][weight]
+                del tier[bisect.bisect_left(tier, key)]
+            if not self._postings[token]:
+                del self._postings[token]
+                del self._tiers[token]
+                for tier_weight in (NAME_WEIGHT, DESCRIPTION_WEIGHT):
+                    self._pending.pop((token, tier_weight), None)
+
+    def upsert(self, doc):
+        weights = self._item_tokens(doc)
+        with self._lock:
+            self._remove_locked(doc["_id"])
+            seq = self._next_seq
+            self._next_seq += 1
+            self._seqs[doc["_id"]] = seq
+            self._items[seq] = (doc, weights)
+            key = (-(doc.get("quantity") or 0), seq)
+            for token, weight in weights.items():
+                self._postings[token][seq] = weight
+                self._tiers[token][weight]  # make the weight known to lookups
+                self._pending[(token, weight)].add(key)
+
+    def _tier(self, token, weight):
+        """Sorted tier of a token, with pending entries merged in"""
+        tier = self._tiers[token][weight]
+        pending = self._pending.pop((token, weight), None)
+        if pending:
+            if len(pending) > 32:
+                tier.extend(pending)
+                tier.sort()
+            else:
+                for key in pending:
+                    bisect.insort(tier, key)
+        return tier
+
+    def remove(self, _id):
+        with self._lock:
+            self._remove_locked(_id)
+
+    def on_change(self, old, new):
+        """NetworkView listener"""
+        if new is None:
+            self.remove(old["_id"])
+        else:
+            self.upsert(new)
+
+    def match(self, text, min_quantity=0, exclude_center=None, k=5):
+        """Return the top-k (score, item) candidates for a free-text need.
+
+        Items must hold at least min_quantity and belong to another center.
+        Ties are broken by larger quantity.
+        """
+        return self.match_tokens(tokenize(text), min_quantity, exclude_center, k)
+
+    def match_tokens(self, tokens, min_quantity=0, exclude_center=None, k=5, accept=None, boosts=None):
+        """Rank items for already tokenized terms.
+
+        boosts optionally scales each token's contribution (e.g. by fuzzy
+        similarity) and accept(doc) can reject items on other criteria.
+        """
+        boosts = boosts or {}
+        with self._lock:
+            tokens = [t for t in set(tokens) if t in self._postings]
+            if not tokens or k <= 0:
+                return []
+
+            total = len(self._items)
+            idf = {t: math.log(1 + total / len(self._postings[t])) * boosts.get(t, 1.0) for t in tokens}
+            best = {t: idf[t] * max(self._tiers[t]) for t in tokens}
+            tokens.sort(key=best.get, reverse=True)
+
+            heap = []  # min-heap of (score, quantity, seq)
+            seen = set()
+
+            def beaten(bound, quantity):
+                # True when an item with this score bound cannot enter the top-k
+                if len(heap) < k:
+                    return False
+                floor_score, floor_quantity, _ = heap[0]
+                return bound < floor_score - _EPSILON or (
+                    bound <= floor_score + _EPSILON and quantity <= floor_quantity)
+
+            for i, token in enumerate(tokens):
+                # Items first seen here are absent from every rarer token's postings
+                rest = sum(best[t] for t in tokens[i + 1:])
+                for weight in sorted(self._tiers[token], reverse=True):
+                    bound = idf[token] * weight + rest
+                    for negative_quantity, seq in self._tier(token, weight):
+                        quantity = -negative_quantity
+                        if quantity < min_quantity or beaten(bound, quantity):
+                            break
+                        if seq in seen:
+                            continue
+                        seen.add(seq)
+                        doc = self._items[seq][0]
+                        if exclude_center is not None and doc.get("center_id") == exclude_center:
+                            continue
+                        if accept is not None and not accept(doc):
+                            continue
+                        score = sum(idf[t] * self._postings[t].get(seq, 0) for t in tokens)
+                        entry = (score, quantity, seq)
+                        if len(heap) < k:
+                            heapq.heappush(heap, entry)
+                        elif entry > heap[0]:
+                            heapq.heapreplace(heap, entry)
+
+            ranked = sorted(heap, reverse=True)
+            return [(score, self._items[seq][0]) for score, _, seq in ranked]
@@ -0,0 +1,239 @@
+"""Versioned index migrations for helpkart_db.
+
+Migrations run once per process from utils.get_mongo_client and can also be
+run by hand:
+
+    python migrations.py              # apply pending migrations
+    python migrations.py --status     # show the applied schema version
+    python migrations.py --reconcile  # re-check every index, even applied ones
+"""
+import argparse
+import sys
+from datetime import datetime
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from geo import to_point
+from mongo_config import create_client
+
+DATABASE_NAME = "helpkart_db"
+SCHEMA_COLLECTION = "schema_migrations"
+
+
+# version -> (description, {collection: [IndexModel, ...]})
+MIGRATIONS = {
+    1: ("Initial lookup indexes", {
+        "centers": [
+            IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        ],
+        "inventory": [
+            IndexModel([("center_id", ASCENDING), ("category", ASCENDING), ("quantity", ASCENDING)],
+                       name="center_category_quantity"),
+            IndexModel([("center_id", ASCENDING), ("quantity", ASCENDING)], name="center_quantity"),
+            IndexModel([("updated_at", DESCENDING), ("_id", DESCENDING)], name="updated_at_id"),
+            IndexModel([("category", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)],
+                       name="category_updated_at_id"),
+        ],
+        "requests": [
+            IndexModel([("center_id", ASCENDING), ("status", ASCENDING)], name="center_status"),
+            IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+        ],
+    }),
+    2: ("Polling index for the network watcher", {
+        "requests": [
+            IndexModel([("updated_at", DESCENDING), ("_id", DESCENDING)], name="updated_at_id"),
+        ],
+    }),
+    3: ("Upsert key for bulk imports", {
+        "inventory": [
+            IndexModel([("center_id", ASCENDING), ("item_id", ASCENDING)], name="center_item_id_unique", unique=True),
+        ],
+    }),
+    4: ("GeoJSON center locations for nearest-first Browse", {
+        "centers": [
+            IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+        ],
+    }),
+    5: ("Weighted text index for ranked Browse search", {
+        "inventory": [
+            IndexModel([("item_name", TEXT), ("description", TEXT)], name="item_name_description_text",
+                       weights={"item_name": 10, "description": 2}),
+        ],
+    }),
+    6: ("Inventory versions and the transfer ledger", {
+        "transactions": [
+            IndexModel([("from_center_id", ASCENDING), ("created_at", DESCENDING)], name="from_center_created_at"),
+            IndexModel([("to_center_id", ASCENDING), ("created_at", DESCENDING)], name="to_center_created_at"),
+        ],
+    }),
+    7: ("Expiring-soon lookups over lot expiry dates", {
+        "inventory": [
+            IndexModel([("earliest_expiry", ASCENDING)], name="earliest_expiry"),
+            IndexModel([("center_id", ASCENDING), ("earliest_expiry", ASCENDING)], name="center_earliest_expiry"),
+        ],
+        "expired_lots": [
+            IndexModel([("center_id", ASCENDING), ("archived_at", DESCENDING)], name="center_archived_at"),
+        ],
+    }),
+    8: ("Stock history buckets and rollups", {
+        "stock_history": [
+            IndexModel([("inventory_id", ASCENDING), ("day", DESCENDING)], name="inventory_day"),
+            IndexModel([("center_id", ASCENDING), ("day", DESCENDING)], name="center_day"),
+        ],
+        "stock_rollups": [
+            IndexModel([("center_id", ASCENDING), ("granularity", ASCENDING), ("period", ASCENDING)],
+                       name="center_granularity_period"),
+        ],
+    }),
+    9: ("Stock summary lookups", {
+        "stock_summary": [
+            IndexModel([("scope", ASCENDING), ("key", ASCENDING)], name="scope_key"),
+        ],
+    }),
+    10: ("Upsert key for archived lots", {
+        "expired_lots": [
+            IndexModel([("inventory_id", ASCENDING), ("lot_id", ASCENDING)], name="inventory_lot"),
+        ],
+    }),
+}
+
+
+def backfill_center_locations(db):
+    """Derive the GeoJSON `location` of older centers from location_coordinates"""
+    operations = []
+    for center in db["centers"].find({"location": {"$exists": False}}, {"location_coordinates": 1}):
+        coordinates = center.get("location_coordinates") or {}
+        point = to_point(coordinates.get("lat"), coordinates.get("lng"))
+        if point is not None:
+            operations.append(UpdateOne({"_id": center["_id"]}, {"$set": {"location": point}}))
+    if operations:
+        db["centers"].bulk_write(operations, ordered=False)
+
+
+def backfill_inventory_versions(db):
+    """Start the optimistic-concurrency counter of existing items at 0"""
+    db["inventory"].update_many({"version": {"$exists": False}}, {"$set": {"version": 0}})
+
+
+def seed_stock_summary(db):
+    """Build the stock summary from inventory the first time"""
+    # Imported here: stock_summary needs DATABASE_NAME from this module
+    from stock_summary import SUMMARY_COLLECTION, expected_totals
+    if db[SUMMARY_COLLECTION].find_one() is None:
+        totals = list(expected_totals(db["inventory"]).values())
+        try:
+            if totals:
+                db[SUMMARY_COLLECTION].insert_many(totals, ordered=False)
+        except BulkWriteError:
+            # Another process seeded it first
+            pass
+
+
+# version -> function(db) run before that version's indexes are built
+DATA_MIGRATIONS = {
+    4: backfill_center_locations,
+    6: backfill_inventory_versions,
+    9: seed_stock_summary,
+}
+
+LATEST_VERSION = max(MIGRATIONS)
+
+
+def _index_matches(existing, model):
+    """Check whether an existing index has the same keys and options as the model"""
+    wanted = model.document
+    # The server may report numeric directions as floats (1.0 / -1.0)
+    existing_keys = [(field, int(direction) if isinstance(direction, float) else direction)
+                     for field, direction in existing["key"]]
+    wanted_keys = list(wanted["key"].items())
+    if TEXT in wanted["key"].values():
+        # Text indexes report their fields as _fts/_ftsx plus `weights`
+        existing_keys = [(field, TEXT) for field in sorted(existing.get("weights", {}))] + [
+            (field, direction) for field, direction in existing_keys if field not in ("_fts", "_ftsx")]
+        wanted_keys = sorted((field, direction) for field, direction in wanted_keys if direction == TEXT) + [
+            (field, direction) for field, direction in wanted_keys if direction != TEXT]
+    if existing_keys != wanted_keys:
+        return False
+    for option, value in wanted.items():
+        if option in ("key", "name"):
+            continue
+        if existing.get(option) != value:
+            return False
+    return True
+
+
+def reconcile_indexes(collection, models):
+    """Create missing indexes and rebuild the ones whose definition drifted"""
+    existing = collection.index_information()
+    for model in models:
+        name = model.document["name"]
+        current = existing.get(name)
+        if current is not None:
+            if _index_matches(current, model):
+                continue
+            collection.drop_index(name)
+        collection.create_indexes([model])
+
+
+def applied_version(db):
+    """Return the highest schema version recorded in the database"""
+    latest = db[SCHEMA_COLLECTION].find_one(sort=[("_id", DESCENDING)])
+    return latest["_id"] if latest else 0
+
+
+def run_migrations(db, reconcile=False):
+    """Apply pending migrations and return the resulting schema version.
+
+    Safe to call from several processes at once: index creation and data
+    backfills are idempotent and each version is recorded under a unique _id.
+    """
+    current = applied_version(db)
+    if current >= LATEST_VERSION and not reconcile:
+        return current
+
+    for version in sorted(MIGRATIONS):
+        if version <= current and not reconcile:
+            continue
+        description, indexes = MIGRATIONS[version]
+        if version in DATA_MIGRATIONS:
+            DATA_MIGRATIONS[version](db)
+        for collection_name, models in indexes.items():
+            reconcile_indexes(db[collection_name], models)
+        if version > current:
+            try:
+                db[SCHEMA_COLLECTION].insert_one({
+                    "_id": version,
+                    "description": description,
+                    "applied_at": datetime.now()
+                })
+            except DuplicateKeyError:
+                # Another process recorded the same version first
+                pass
+
+    return applied_version(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply helpkart_db index migrations")
+    parser.add_argument("--status", action="store_true", help="only print the applied schema version")
+    parser.add_argument("--reconcile", action="store_true", help="re-check indexes of applied versions too")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = create_client()
+    db = client[DATABASE_NAME]
+
+    if args.status:
+        print(f"📋 Schema version {applied_version(db)} (latest {LATEST_VERSION})")
+        return
+
+    version = run_migrations(db, reconcile=args.reconcile)
+    print(f"✅ Schema at version {version}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
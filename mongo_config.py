@@ -0,0 +1,137 @@
+"""MongoDB client settings shared by the app and the scripts.
+
+Every process builds its client through create_client() so pool sizes,
+timeouts, wire compression and retries are configured in one place from
+MONGO_* environment variables. Only pymongo is needed, so the export
+workflows can use it too.
+
+Reads are routed per workload. Browse and exports show other centers' data
+that is allowed to lag a little, so by default they prefer a secondary
+(bounded by MONGO_MAX_STALENESS_SECONDS); everything else reads the primary.
+Override a workload with MONGO_READ_PREFERENCE_<WORKLOAD>, e.g.
+MONGO_READ_PREFERENCE_DASHBOARD=secondaryPreferred.
+"""
+import importlib.util
+import os
+import threading
+from pymongo import MongoClient
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from pymongo.server_api import ServerApi
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+WORKLOAD_READ_PREFERENCES = {
+    "browse": "secondaryPreferred",
+    "export": "secondaryPreferred",
+    "dashboard": "primary",
+}
+
+# The server rejects anything below 90 seconds
+MIN_STALENESS_SECONDS = 90
+
+# Compressor -> module it needs (zlib ships with Python)
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": None}
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def available_compressors(names):
+    """The requested compressors whose Python module is installed, in order"""
+    available = []
+    for name in names.split(","):
+        name = name.strip()
+        if name not in COMPRESSOR_MODULES:
+            raise ValueError(f"Unknown MongoDB compressor {name!r}")
+        module = COMPRESSOR_MODULES[name]
+        if module is None or importlib.util.find_spec(module) is not None:
+            available.append(name)
+    return available
+
+
+def client_options():
+    """MongoClient keyword arguments from the environment"""
+    options = {
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE", 100),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE", 2),
+        "maxIdleTimeMS": _env_int("MONGO_MAX_IDLE_TIME_MS", 600000),
+        "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS", 10000),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000),
+        "retryWrites": _env_bool("MONGO_RETRY_WRITES", True),
+        "retryReads": _env_bool("MONGO_RETRY_READS", True),
+        "appname": os.environ.get("MONGO_APP_NAME") or "helpkart",
+    }
+    socket_timeout = _env_int("MONGO_SOCKET_TIMEOUT_MS", 0)
+    if socket_timeout:
+        options["socketTimeoutMS"] = socket_timeout
+    compressors = available_compressors(os.environ.get("MONGO_COMPRESSORS") or "zstd,snappy,zlib")
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+    return options
+
+
+def read_preference_name(workload):
+    """Configured read preference mode for a workload (primary when unknown)"""
+    name = (os.environ.get(f"MONGO_READ_PREFERENCE_{workload.upper()}")
+            or WORKLOAD_READ_PREFERENCES.get(workload, "primary"))
+    if name not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference {name!r} for {workload}")
+    return name
+
+
+def max_staleness_seconds():
+    return max(MIN_STALENESS_SECONDS, _env_int("MONGO_MAX_STALENESS_SECONDS", 120))
+
+
+def read_preference(workload):
+    """pymongo read preference for a workload, for with_options()/get_collection()"""
+    name = read_preference_name(workload)
+    if name == "primary":
+        return Primary()
+    return READ_PREFERENCES[name](max_staleness=max_staleness_seconds())
+
+
+def create_client(uri=None, workload=None, **overrides):
+    """Build a configured MongoClient; workload sets its default read preference"""
+    options = client_options()
+    if workload is not None and read_preference_name(workload) != "primary":
+        options["readPreference"] = read_preference_name(workload)
+        options["maxStalenessSeconds"] = max_staleness_seconds()
+    options.update(overrides)
+    return MongoClient(uri if uri is not None else os.environ.get("MONGODB_URI"),
+                       server_api=ServerApi("1"), **options)
+
+
+def warm_up(client, connections=None):
+    """Open pooled connections in the background so the first requests skip the handshakes"""
+    if connections is None:
+        connections = _env_int("MONGO_WARM_CONNECTIONS", max(client.options.pool_options.min_pool_size, 4))
+
+    def ping():
+        try:
+            client.admin.command("ping")
+        except Exception:
+            # The first real query reports connection problems
+            pass
+
+    # Concurrent pings each check out their own connection
+    threads = [threading.Thread(target=ping, name=f"helpkart-mongo-warm-up-{n}", daemon=True)
+               for n in range(connections)]
+    for thread in threads:
+        thread.start()
+    return threads
@@ -0,0 +1,266 @@
+"""MongoDB command monitoring for the app process.
+
+CommandMonitor is a pymongo CommandListener registered on the shared client
+(see utils.get_mongo_client). Every command is recorded with its latency,
+documents returned and the page that issued it into a bounded ring buffer;
+commands slower than a threshold are also logged with the shape of their
+filter. Measuring reply sizes means re-encoding every reply, so only slow
+commands are sized unless size_replies is on. app.py wraps each page render in track_page() so Mongo time
+can be told apart from the time spent rendering.
+
+Listeners run on the thread that issued the command, so the page is carried
+in a context variable. Work on other threads (the network watcher) is
+attributed to "background".
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bson
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND = "background"
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Commands whose first-level filter is worth showing in the slow log
+_FILTER_FIELDS = {"find": "filter", "count": "query", "distinct": "query", "delete": "deletes",
+                  "update": "updates", "findAndModify": "query", "aggregate": "pipeline"}
+
+_page = contextvars.ContextVar("helpkart_page", default=BACKGROUND)
+_page_mongo_ms = contextvars.ContextVar("helpkart_page_mongo_ms", default=None)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def filter_shape(value):
+    """Replace the literal values of a query with "?" but keep fields and operators"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        shapes = []
+        for item in value:
+            shape = filter_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return "?"
+
+
+def _returned(reply):
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if "value" in reply:  # findAndModify
+        return 1 if reply["value"] else 0
+    return reply.get("n", 0)
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Ring buffer of recent commands plus per-page render timings"""
+
+    def __init__(self, capacity=5000, slow_ms=200.0, size_replies=False):
+        self.slow_ms = slow_ms
+        self.size_replies = size_replies
+        self.commands = deque(maxlen=capacity)   # (time, page, command, collection, ms, docs, bytes, ok)
+        self.renders = deque(maxlen=capacity)    # (time, page, render ms, mongo ms)
+        self.slow = deque(maxlen=200)            # (time, page, command, collection, ms, shape)
+        self.totals = Counter()                  # (page, command, collection) -> commands
+        self.total_seconds = Counter()           # (page, command, collection) -> seconds
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    # CommandListener interface
+
+    def started(self, event):
+        command = event.command
+        collection = command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = command.get("collection", "")
+        shape_source = command.get(_FILTER_FIELDS.get(event.command_name, ""), None)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                _page.get(), collection, shape_source, _page_mongo_ms.get())
+
+    def succeeded(self, event):
+        sized = self.size_replies or event.duration_micros / 1000 >= self.slow_ms
+        self._finish(event, True, _returned(event.reply), len(bson.encode(event.reply)) if sized else 0)
+
+    def failed(self, event):
+        self._finish(event, False, 0, 0)
+
+    def _finish(self, event, ok, docs, size):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        page, collection, shape_source, page_total = pending
+        ms = event.duration_micros / 1000
+        key = (page, event.command_name, collection)
+
+        with self._lock:
+            if page_total is not None:
+                page_total[0] += ms
+            self.commands.append((time.time(), page, event.command_name, collection, ms, docs, size, ok))
+            self.totals[key] += 1
+            self.total_seconds[key] += ms / 1000
+
+        if ms >= self.slow_ms:
+            shape = filter_shape(shape_source) if shape_source is not None else None
+            with self._lock:
+                self.slow.append((time.time(), page, event.command_name, collection, ms, shape))
+            logger.warning("Slow %s on %s from %s: %.1f ms, filter %s",
+                           event.command_name, collection, page, ms, shape)
+
+    # Page attribution
+
+    @contextmanager
+    def track_page(self, name):
+        """Attribute the commands issued inside the block to a page and time its render.
+
+        Nested calls (a fragment rendered as part of its page) are folded into
+        the outer page.
+        """
+        if _page_mongo_ms.get() is not None:
+            yield
+            return
+        page_token = _page.set(name)
+        total = [0.0]
+        total_token = _page_mongo_ms.set(total)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            render_ms = (time.perf_counter() - start) * 1000
+            _page.reset(page_token)
+            _page_mongo_ms.reset(total_token)
+            with self._lock:
+                self.renders.append((time.time(), name, render_ms, total[0]))
+
+    # Reports
+
+    def page_stats(self):
+        """Per page: renders, p50/p95/p99 render and Mongo milliseconds, commands"""
+        with self._lock:
+            renders = list(self.renders)
+            commands = list(self.commands)
+        by_page = {}
+        for _, page, render_ms, mongo_ms in renders:
+            entry = by_page.setdefault(page, {"render": [], "mongo": [], "commands": []})
+            entry["render"].append(render_ms)
+            entry["mongo"].append(mongo_ms)
+        for _, page, _, _, ms, _, _, _ in commands:
+            by_page.setdefault(page, {"render": [], "mongo": [], "commands": []})["commands"].append(ms)
+
+        rows = []
+        for page, entry in sorted(by_page.items()):
+            row = {"page": page, "renders": len(entry["render"]), "commands": len(entry["commands"])}
+            for label, values in (("render", entry["render"]), ("mongo", entry["mongo"]),
+                                  ("command", entry["commands"])):
+                for q in QUANTILES:
+                    row[f"{label}_p{int(q * 100)}_ms"] = round(percentile(values, q), 2) if values else None
+            rows.append(row)
+        return rows
+
+    def command_stats(self):
+        """Per (command, collection): count, p95 milliseconds, documents and bytes returned (of sized replies)"""
+        with self._lock:
+            commands = list(self.commands)
+        grouped = {}
+        for _, _, name, collection, ms, docs, size, ok in commands:
+            entry = grouped.setdefault((name, collection), {"ms": [], "docs": 0, "bytes": 0, "errors": 0})
+            entry["ms"].append(ms)
+            entry["docs"] += docs
+            entry["bytes"] += size
+            entry["errors"] += not ok
+        return [{
+            "command": name,
+            "collection": collection,
+            "count": len(entry["ms"]),
+            "p95_ms": round(percentile(entry["ms"], 0.95), 2),
+            "docs": entry["docs"],
+            "bytes": entry["bytes"],
+            "errors": entry["errors"],
+        } for (name, collection), entry in sorted(grouped.items(), key=lambda pair: -len(pair[1]["ms"]))]
+
+    def slow_queries(self):
+        with self._lock:
+            return list(self.slow)
+
+    def prometheus_text(self):
+        """Metrics in the Prometheus text exposition format"""
+        with self._lock:
+            totals = dict(self.totals)
+            seconds = dict(self.total_seconds)
+            renders = list(self.renders)
+
+        lines = [
+            "# HELP helpkart_mongo_commands_total MongoDB commands issued",
+            "# TYPE helpkart_mongo_commands_total counter",
+        ]
+        for (page, command, collection), count in sorted(totals.items()):
+            lines.append(f"helpkart_mongo_commands_total{_labels(page=page, command=command, collection=collection)} {count}")
+        lines += [
+            "# HELP helpkart_mongo_command_seconds_total Time spent in MongoDB commands",
+            "# TYPE helpkart_mongo_command_seconds_total counter",
+        ]
+        for (page, command, collection), total in sorted(seconds.items()):
+            lines.append(f"helpkart_mongo_command_seconds_total"
+                         f"{_labels(page=page, command=command, collection=collection)} {total:.6f}")
+
+        lines += [
+            "# HELP helpkart_page_render_seconds Page render time over the recent window",
+            "# TYPE helpkart_page_render_seconds summary",
+        ]
+        by_page = {}
+        for _, page, render_ms, _ in renders:
+            by_page.setdefault(page, []).append(render_ms / 1000)
+        for page, values in sorted(by_page.items()):
+            for q in QUANTILES:
+                lines.append(f"helpkart_page_render_seconds{_labels(page=page, quantile=q)} {percentile(values, q):.6f}")
+            lines.append(f"helpkart_page_render_seconds_sum{_labels(page=page)} {sum(values):.6f}")
+            lines.append(f"helpkart_page_render_seconds_count{_labels(page=page)} {len(values)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels):
+    pairs = []
+    for key, value in labels.items():
+        text = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{text}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def start_metrics_server(monitor, port, extra=None, host="127.0.0.1"):
+    """Serve monitor.prometheus_text() (plus extra() text) on http://host:port/metrics.
+
+    The endpoint has no authentication, so it only listens locally unless
+    another host is given.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = (monitor.prometheus_text() + (extra() if extra else "")).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="helpkart-metrics", daemon=True).start()
+    return server
@@ -1,62 +1,423 @@
+import argparse
+import glob
 import json
 import os
+import sys
 from datetime import datetime
-from pymongo import MongoClient
 from bson import ObjectId
+from export_io import (COMPRESSIONS, FORMATS, WRITERS, DeltaWriter, SummaryCounter, export_filename,
+                       iter_delta, iter_export, open_output, read_delta_header, read_header, serialize)
+import snapshot_store
+import parquet_export
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mongo_config import create_client  # noqa: E402
 
 # Get MongoDB URI from environment
 MONGODB_URI = os.environ.get("MONGODB_URI")
-client = MongoClient(MONGODB_URI)
+# Exports read from a secondary when one is available
+client = create_client(MONGODB_URI, workload="export")
 db = client["helpkart_db"]
 
-def serialize(obj):
-    """Convert MongoDB objects to JSON-serializable format"""
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    return str(obj)
-
-def compile_data():
-    """Fetch all data and compile to JSON"""
-    
-    print("📦 Fetching data from MongoDB...")
-    
-    # Fetch collections
-    centers = list(db["centers"].find({}, {"password": 0}))  # Exclude passwords!
-    inventory = list(db["inventory"].find({}))
-    requests_list = list(db["requests"].find({}))
-    transactions = list(db["transactions"].find({}))
-    
-    # Create compiled data
-    compiled = {
-        "generated_at": datetime.now().isoformat(),
-        "summary": {
-            "total_centers": len(centers),
-            "total_items": len(inventory),
-            "open_requests": len([r for r in requests_list if not r.get("fulfilled")]),
-            "transactions": len(transactions)
-        },
-        "data": {
-            "centers": centers,
-            "inventory": inventory,
-            "requests": requests_list,
-            "transactions": transactions
-        }
-    }
-    
-    # Save to file
-    filename = f"exports/helpkart_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    os.makedirs("exports", exist_ok=True)
-    
+EXPORT_DIR = "exports"
+STATE_DIR = os.path.join(EXPORT_DIR, "state")
+STATE_FILE = os.path.join(STATE_DIR, "export_state.json")
+
+COLLECTIONS = ["centers", "inventory", "requests", "transactions"]
+
+# Fields that must never leave the database
+PROJECTIONS = {"centers": {"password": 0}}
+
+# Documents fetched per round trip while streaming an export
+DEFAULT_BATCH_SIZE = 1000
+
+def timestamp():
+    return datetime.now().strftime('%Y%m%d_%H%M%S')
+
+def write_json(filename, payload):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
     with open(filename, "w") as f:
-        json.dump(compiled, f, default=serialize, indent=2)
-    
+        json.dump(payload, f, default=serialize, indent=2)
+
+def compile_data(fmt="json", compression=None, batch_size=DEFAULT_BATCH_SIZE, on_doc=None):
+    """Stream all collections into one export file.
+
+    Documents are written as the cursors return them, so memory use stays
+    flat however large the collections are. on_doc(collection, doc) is
+    called for every exported document.
+    """
+
+    print("📦 Fetching data from MongoDB...")
+
+    filename = os.path.join(EXPORT_DIR, export_filename(f"helpkart_export_{timestamp()}", fmt, compression))
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    summary = SummaryCounter()
+
+    with open_output(filename, compression) as out:
+        writer = WRITERS[fmt](out)
+        writer.start({"generated_at": datetime.now().isoformat()})
+        for name in COLLECTIONS:
+            writer.start_collection(name)
+            for doc in db[name].find({}, PROJECTIONS.get(name), batch_size=batch_size):
+                writer.write_doc(name, doc)
+                summary.add(name, doc)
+                if on_doc is not None:
+                    on_doc(name, doc)
+            writer.end_collection(name)
+        writer.finish(summary.as_dict())
+
     print(f"✅ Data compiled: {filename}")
+    return filename
+
+
+# ---- incremental export ----
+#
+# exports/state/export_state.json keeps, per collection, the (updated_at, _id)
+# high-water mark of the last run and the newest _id of each type among
+# documents without updated_at, plus the base snapshot and the deltas
+# written on top of it. Deletes cannot be seen through updated_at, so the
+# sorted _id list of each collection is kept next to it
+# (exports/state/<collection>.ids, one id per line so git stores it as a
+# small diff) and compared against an _id-only scan of the collection.
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return None
+    with open(STATE_FILE) as f:
+        return json.load(f)
+
+def save_state(state):
+    write_json(STATE_FILE, state)
+
+def ids_path(name):
+    return os.path.join(STATE_DIR, f"{name}.ids")
+
+def load_ids(name):
+    if not os.path.exists(ids_path(name)):
+        return set()
+    with open(ids_path(name)) as f:
+        return {line.strip() for line in f if line.strip()}
+
+def save_ids(name, ids):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(ids_path(name), "w") as f:
+        f.writelines(f"{_id}\n" for _id in sorted(ids))
+
+# BSON $type aliases of the _id types that get a high-water mark. A $gt
+# query only matches ids of its own type, so each type keeps its own mark
+# and ids are never compared across types. Listed in BSON sort order
+ID_TYPES = [("number", (int, float)), ("string", str), ("objectId", ObjectId), ("date", datetime)]
+
+def id_type(_id):
+    if isinstance(_id, bool):
+        return None
+    return next((name for name, types in ID_TYPES if isinstance(_id, types)), None)
+
+def bson_order(_id):
+    """Sort key ordering ids of different types the way MongoDB does"""
+    kind = id_type(_id)
+    if kind is None:
+        return (len(ID_TYPES), str(_id))
+    return ([name for name, _ in ID_TYPES].index(kind), _id)
+
+def encode_id(kind, _id):
+    if kind == "objectId":
+        return str(_id)
+    if kind == "date":
+        return _id.isoformat()
+    return _id
+
+def decode_id(kind, value):
+    if kind == "objectId":
+        return ObjectId(value)
+    if kind == "date":
+        return datetime.fromisoformat(value)
+    return value
+
+def id_marks(mark):
+    """{id type: newest _id} of documents without updated_at in a stored mark"""
+    if not mark:
+        return {}
+    if "ids" in mark:
+        return {kind: decode_id(kind, value) for kind, value in mark["ids"].items()}
+    if not mark.get("updated_at"):
+        # Marks written before ids were tracked per type
+        kind = "objectId" if ObjectId.is_valid(mark["_id"]) else "string"
+        return {kind: decode_id(kind, mark["_id"])}
+    return {}
+
+class MarkTracker:
+    """Tracks the high-water marks of documents seen.
+
+    Documents with updated_at move the (updated_at, _id) mark; those without
+    it move an _id-only mark per id type, so later runs pick up their new
+    documents instead of re-exporting them all.
+    """
+
+    def __init__(self, previous=None):
+        self.previous = previous or {}
+        self.newest = None
+        self.newest_ids = id_marks(previous)
+
+    def add(self, doc):
+        if isinstance(doc.get("updated_at"), datetime):
+            mark = (doc["updated_at"], bson_order(doc["_id"]), doc["_id"])
+            if self.newest is None or mark > self.newest:
+                self.newest = mark
+            return
+        kind = id_type(doc["_id"])
+        if kind is not None and (kind not in self.newest_ids or doc["_id"] > self.newest_ids[kind]):
+            self.newest_ids[kind] = doc["_id"]
+
+    def as_dict(self):
+        mark = {}
+        if self.newest is not None:
+            updated_at, _, _id = self.newest
+            mark = {"updated_at": updated_at.isoformat(), "_id": str(_id)}
+        elif self.previous.get("updated_at"):
+            mark = {"updated_at": self.previous["updated_at"], "_id": self.previous["_id"]}
+        mark["ids"] = {kind: encode_id(kind, _id) for kind, _id in self.newest_ids.items()}
+        return mark
+
+def changed_since(mark):
+    """Query for documents written after a high-water mark"""
+    if not mark:
+        return {}
+    # Without updated_at only inserts are visible; deletes come from the .ids files
+    ids = id_marks(mark)
+    undated = [{"_id": {"$gt": _id}} for _id in ids.values()]
+    undated.append({"$nor": [{"_id": {"$type": kind}} for kind in ids]} if ids else {})
+    branches = [{"updated_at": {"$not": {"$type": "date"}}, "$or": undated}]
+    if mark.get("updated_at"):
+        last_id = ObjectId(mark["_id"]) if ObjectId.is_valid(mark["_id"]) else mark["_id"]
+        updated_at = datetime.fromisoformat(mark["updated_at"])
+        branches += [
+            {"updated_at": {"$gt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$gt": last_id}},
+        ]
+    return {"$or": branches}
+
+def start_base(**export_options):
+    """Write a full export and reset the incremental state on top of it"""
+    marks = {name: MarkTracker() for name in COLLECTIONS}
+    ids = {name: set() for name in COLLECTIONS}
+
+    def track(name, doc):
+        marks[name].add(doc)
+        ids[name].add(str(doc["_id"]))
+
+    filename = compile_data(on_doc=track, **export_options)
+    state = {"base": os.path.basename(filename), "deltas": [], "collections": {}}
+    for name in COLLECTIONS:
+        state["collections"][name] = {"mark": marks[name].as_dict()}
+        save_ids(name, ids[name])
+    save_state(state)
+    return filename
+
+def compile_delta(batch_size=DEFAULT_BATCH_SIZE, **export_options):
+    """Export only what was inserted, updated or deleted since the last run"""
+    state = load_state()
+    if state is None:
+        print("📭 No incremental state yet, writing a full base export")
+        return start_base(batch_size=batch_size, **export_options)
+
+    print("📦 Fetching changes from MongoDB...")
+
+    filename = os.path.join(EXPORT_DIR, f"helpkart_delta_{timestamp()}.json")
+    summary = {}
+    changed = False
+    # Changed documents are written as the cursors return them
+    with open_output(filename) as out:
+        writer = DeltaWriter(out)
+        writer.start({"generated_at": datetime.now().isoformat(), "base": state["base"]})
+        for name in COLLECTIONS:
+            mark = state["collections"].get(name, {}).get("mark")
+            tracker = MarkTracker(mark)
+            upserted = 0
+            writer.start_collection(name)
+            for doc in db[name].find(changed_since(mark), PROJECTIONS.get(name), batch_size=batch_size):
+                writer.write_doc(name, doc)
+                tracker.add(doc)
+                upserted += 1
+
+            known_ids = load_ids(name)
+            live_ids = {str(d["_id"]) for d in db[name].find({}, {"_id": 1}, batch_size=batch_size)}
+            deleted = sorted(known_ids - live_ids)
+            writer.end_collection(name, deleted)
+
+            summary[name] = {"upserted": upserted, "deleted": len(deleted)}
+            state["collections"][name] = {"mark": tracker.as_dict()}
+            if upserted or deleted or live_ids != known_ids:
+                changed = True
+                save_ids(name, live_ids)
+        writer.finish(summary)
+
+    if not changed:
+        os.remove(filename)
+        print("✅ No changes since the last export")
+        return None
+
+    state["deltas"].append(os.path.basename(filename))
+    save_state(state)
+
+    print(f"✅ Delta compiled: {filename}")
+    return filename
+
+def rebuild_snapshot(base=None, until=None):
+    """Rebuild a full snapshot from a base export plus its deltas.
+
+    Deltas are applied in order; `until` (ISO timestamp) stops at the last
+    delta generated at or before that time. The base and the deltas are
+    streamed: only the ids of changed documents are held in memory.
+    """
+    state = load_state() or {}
+    base = base or state.get("base")
+    if not base:
+        raise ValueError("No base export to rebuild from")
+
+    base_name = os.path.basename(base)
+    base_path = os.path.join(EXPORT_DIR, base_name)
+    generated_at = read_header(base_path)["generated_at"]
+
+    # Which delta holds the last version of each changed document (None: deleted)
+    deltas = []
+    latest = {name: {} for name in COLLECTIONS}
+    for path in sorted(glob.glob(os.path.join(EXPORT_DIR, "helpkart_delta_*.json"))):
+        header = read_delta_header(path)
+        if header.get("base") != base_name:
+            continue
+        if until and header["generated_at"] > until:
+            break
+        for name, kind, value in iter_delta(path):
+            if kind == "upserted":
+                latest.setdefault(name, {})[value["_id"]] = len(deltas)
+            else:
+                latest.setdefault(name, {})[value] = None
+        deltas.append(path)
+        generated_at = header["generated_at"]
+
+    filename = os.path.join(EXPORT_DIR, f"helpkart_snapshot_{timestamp()}.json")
+    summary = SummaryCounter()
+    with open_output(filename) as out:
+        writer = WRITERS["json"](out)
+        writer.start({"generated_at": generated_at, "rebuilt_from": base_name})
+        base_docs = iter_export(base_path)
+        pending = next(base_docs, None)
+        for name in COLLECTIONS:
+            changed = latest[name]
+            writer.start_collection(name)
+            # Base exports list their collections in COLLECTIONS order
+            while pending is not None and pending[0] == name:
+                doc = pending[1]
+                if doc["_id"] not in changed:
+                    writer.write_doc(name, doc)
+                    summary.add(name, doc)
+                pending = next(base_docs, None)
+            for index, path in enumerate(deltas):
+                for collection, kind, doc in iter_delta(path):
+                    if collection == name and kind == "upserted" and changed.get(doc["_id"]) == index:
+                        writer.write_doc(name, doc)
+                        summary.add(name, doc)
+                        changed[doc["_id"]] = None  # written once even if listed twice
+            writer.end_collection(name)
+        writer.finish(summary.as_dict())
+
+    print(f"✅ Snapshot rebuilt: {filename}")
+    return filename
+
+def compile_store(batch_size=DEFAULT_BATCH_SIZE, **export_options):
+    """Add the current data to the content-addressed store in exports/store"""
+
+    print("📦 Fetching data from MongoDB...")
+
+    summary = SummaryCounter()
+    name, changed = snapshot_store.snapshot(db, COLLECTIONS, PROJECTIONS, batch_size, summary)
+    if not changed:
+        print(f"✅ No changes, latest snapshot is still {name}")
+        return name
+
+    manifest = snapshot_store.load_manifest(name)
+    print(f"✅ Snapshot stored: {name} ({manifest['new_bytes']} new bytes)")
+    return name
+
+def compile_parquet(batch_size=DEFAULT_BATCH_SIZE, **export_options):
+    """Write one Parquet file per collection, partitioned by export date"""
+
+    print("📦 Fetching data from MongoDB...")
+
+    paths = parquet_export.export_parquet(db, COLLECTIONS, PROJECTIONS, batch_size)
+    for path in paths:
+        print(f"✅ Parquet written: {path}")
+    return paths
+
+def checkout_snapshot(name=None, fmt="json", compression=None, **export_options):
+    """Write a stored snapshot (default: HEAD) out as a regular export file"""
+    manifest = snapshot_store.load_manifest(name) if name else snapshot_store.read_head()
+    if manifest is None:
+        raise ValueError("The snapshot store is empty")
+
+    stem = f"helpkart_export_{manifest['name'].split('_')[0]}_{manifest['name'].split('_')[1]}"
+    filename = os.path.join(EXPORT_DIR, export_filename(stem, fmt, compression))
+    summary = SummaryCounter()
+    with open_output(filename, compression) as out:
+        writer = WRITERS[fmt](out)
+        writer.start({"generated_at": manifest["generated_at"]})
+        current = None
+        for collection, doc in snapshot_store.iter_snapshot(manifest):
+            if collection != current:
+                if current is not None:
+                    writer.end_collection(current)
+                writer.start_collection(collection)
+                current = collection
+            writer.write_doc(collection, doc)
+            summary.add(collection, doc)
+        if current is not None:
+            writer.end_collection(current)
+        writer.finish(summary.as_dict())
+
+    print(f"✅ Snapshot checked out: {filename}")
+    return filename
+
+def main():
+    parser = argparse.ArgumentParser(description="Export helpkart_db to JSON")
+    parser.add_argument("--mode", choices=["full", "incremental", "store", "parquet"], default="full",
+                        help="full snapshot (default), only the changes since the last run, "
+                             "a deduplicated snapshot in exports/store, or Parquet tables")
+    parser.add_argument("--checkout", nargs="?", const="", metavar="MANIFEST",
+                        help="write a stored snapshot (default: the latest) as a regular export")
+    parser.add_argument("--new-base", action="store_true",
+                        help="start a new incremental chain from a fresh full export")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="rebuild a full snapshot from the base export and its deltas")
+    parser.add_argument("--base", help="base export to rebuild from (default: the current one)")
+    parser.add_argument("--until", help="only apply deltas generated up to this ISO timestamp")
+    parser.add_argument("--format", choices=FORMATS, default="json",
+                        help="layout of full exports: indented JSON (default) or NDJSON")
+    parser.add_argument("--compress", choices=[c for c in COMPRESSIONS if c], default=None,
+                        help="compress full exports with gzip or zstd")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="documents fetched per round trip")
+    args = parser.parse_args()
+
+    export_options = {"fmt": args.format, "compression": args.compress, "batch_size": args.batch_size}
+    if args.rebuild:
+        rebuild_snapshot(args.base, args.until)
+    elif args.checkout is not None:
+        checkout_snapshot(args.checkout or None, **export_options)
+    elif args.new_base:
+        start_base(**export_options)
+    elif args.mode == "incremental":
+        compile_delta(**export_options)
+    elif args.mode == "store":
+        compile_store(**export_options)
+    elif args.mode == "parquet":
+        compile_parquet(**export_options)
+    else:
+        compile_data(**export_options)
 
 if __name__ == "__main__":
     try:
-        compile_data()
+        main()
     except Exception as e:
         print(f"❌ Error: {e}")
         exit(1)
@@ -0,0 +1,326 @@
+"""Streaming readers and writers for helpkart export files.
+
+Exports are written one document at a time, so memory use does not depend on
+collection size. Two layouts are supported:
+
+- json:   the classic {"generated_at", "data": {...}, "summary"} document,
+          indented like json.dump(..., indent=2)
+- ndjson: one record per line; a header line, one {"collection", "doc"}
+          line per document and a final {"summary"} line
+
+Either can be wrapped in gzip (stdlib) or zstd (needs the optional
+`zstandard` package); the compression is inferred from the file extension
+when reading.
+"""
+import gzip
+import io
+import json
+import textwrap
+from datetime import datetime
+from bson import ObjectId
+
+FORMATS = ("json", "ndjson")
+COMPRESSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def serialize(obj):
+    """Convert MongoDB objects to JSON-serializable format"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return str(obj)
+
+
+def export_filename(stem, fmt="json", compression=None):
+    return f"{stem}.{fmt}{COMPRESSIONS[compression]}"
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd compression needs the zstandard package (pip install zstandard)")
+    return zstandard
+
+
+def open_output(filename, compression=None):
+    """Open an export file for text writing, optionally compressed"""
+    if compression == "gzip":
+        return gzip.open(filename, "wt", encoding="utf-8")
+    if compression == "zstd":
+        writer = _zstandard().ZstdCompressor().stream_writer(open(filename, "wb"))
+        return io.TextIOWrapper(writer, encoding="utf-8")
+    return open(filename, "w", encoding="utf-8")
+
+
+def open_input(filename):
+    """Open an export file for text reading, decompressing by extension"""
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "rt", encoding="utf-8")
+    if filename.endswith(".zst"):
+        reader = _zstandard().ZstdDecompressor().stream_reader(open(filename, "rb"))
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(filename, encoding="utf-8")
+
+
+class SummaryCounter:
+    """Builds the export summary block one document at a time"""
+
+    def __init__(self):
+        self.counts = {"centers": 0, "inventory": 0, "requests": 0, "transactions": 0}
+        self.open_requests = 0
+
+    def add(self, collection, doc):
+        self.counts[collection] = self.counts.get(collection, 0) + 1
+        if collection == "requests" and not doc.get("fulfilled"):
+            self.open_requests += 1
+
+    def as_dict(self):
+        return {
+            "total_centers": self.counts["centers"],
+            "total_items": self.counts["inventory"],
+            "open_requests": self.open_requests,
+            "transactions": self.counts["transactions"]
+        }
+
+
+class JsonExportWriter:
+    """Writes the classic indented export layout incrementally"""
+
+    def __init__(self, out):
+        self.out = out
+        self._first_collection = True
+        self._first_doc = True
+
+    def start(self, header):
+        self.out.write("{\n")
+        for key, value in header.items():
+            self.out.write(f'  {json.dumps(key)}: {json.dumps(value, default=serialize)},\n')
+        self.out.write('  "data": {')
+
+    def start_collection(self, name):
+        self.out.write("\n" if self._first_collection else ",\n")
+        self.out.write(f'    {json.dumps(name)}: [')
+        self._first_collection = False
+        self._first_doc = True
+
+    def write_doc(self, name, doc):
+        self.out.write("\n" if self._first_doc else ",\n")
+        self.out.write(textwrap.indent(json.dumps(doc, default=serialize, indent=2), " " * 6))
+        self._first_doc = False
+
+    def end_collection(self, name):
+        self.out.write("]" if self._first_doc else "\n    ]")
+
+    def finish(self, summary):
+        self.out.write("\n  },\n")
+        summary_json = textwrap.indent(json.dumps(summary, indent=2), "  ").lstrip()
+        self.out.write(f'  "summary": {summary_json}\n}}\n')
+
+
+class NdjsonExportWriter:
+    """Writes one JSON record per line"""
+
+    def __init__(self, out):
+        self.out = out
+
+    def _line(self, record):
+        self.out.write(json.dumps(record, default=serialize))
+        self.out.write("\n")
+
+    def start(self, header):
+        self._line(header)
+
+    def start_collection(self, name):
+        pass
+
+    def write_doc(self, name, doc):
+        self._line({"collection": name, "doc": doc})
+
+    def end_collection(self, name):
+        pass
+
+    def finish(self, summary):
+        self._line({"summary": summary})
+
+
+WRITERS = {"json": JsonExportWriter, "ndjson": NdjsonExportWriter}
+
+
+class DeltaWriter:
+    """Writes an incremental export ({"generated_at", "base", "changes", "summary"}) incrementally"""
+
+    def __init__(self, out):
+        self.out = out
+        self._first_collection = True
+        self._first_doc = True
+
+    def start(self, header):
+        self.out.write("{\n")
+        for key, value in header.items():
+            self.out.write(f'  {json.dumps(key)}: {json.dumps(value, default=serialize)},\n')
+        self.out.write('  "changes": {')
+
+    def start_collection(self, name):
+        self.out.write("\n" if self._first_collection else ",\n")
+        self.out.write(f'    {json.dumps(name)}: {{\n      "upserted": [')
+        self._first_collection = False
+        self._first_doc = True
+
+    def write_doc(self, name, doc):
+        self.out.write("\n" if self._first_doc else ",\n")
+        self.out.write(textwrap.indent(json.dumps(doc, default=serialize, indent=2), " " * 8))
+        self._first_doc = False
+
+    def end_collection(self, name, deleted):
+        self.out.write("],\n" if self._first_doc else "\n      ],\n")
+        self.out.write(f'      "deleted": {json.dumps(deleted)}\n    }}')
+
+    def finish(self, summary):
+        self.out.write("\n  },\n")
+        summary_json = textwrap.indent(json.dumps(summary, indent=2), "  ").lstrip()
+        self.out.write(f'  "summary": {summary_json}\n}}\n')
+
+
+class _JsonStream:
+    """Decodes one JSON value at a time from a text stream through a small buffer"""
+
+    def __init__(self, f, chunk_size=1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        data = self.f.read(self.chunk_size)
+        self.eof = not data
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+
+    def peek(self):
+        """Next non-whitespace character ("" at the end of the stream)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Malformed export: expected {chars!r}, found {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buf) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+
+def _object(stream):
+    """Yield the keys of a JSON object; the caller reads each value before the next key"""
+    stream.expect("{")
+    while stream.peek() != "}":
+        key = stream.value()
+        stream.expect(":")
+        yield key
+        if stream.peek() == ",":
+            stream.pos += 1
+    stream.expect("}")
+
+
+def _array(stream):
+    """Yield the values of a JSON array one at a time"""
+    stream.expect("[")
+    while stream.peek() != "]":
+        yield stream.value()
+        if stream.peek() == ",":
+            stream.pos += 1
+    stream.expect("]")
+
+
+def _iter_json_export(f, header):
+    """Yield (collection, doc) pairs from the classic layout, one document at a time.
+
+    Top-level fields other than data are stored in header as they are read.
+    """
+    stream = _JsonStream(f)
+    for key in _object(stream):
+        if key != "data":
+            header[key] = stream.value()
+            continue
+        for name in _object(stream):
+            for doc in _array(stream):
+                yield name, doc
+
+
+def iter_export(filename, header=None):
+    """Yield (collection, doc) pairs from an export file.
+
+    Both layouts are streamed, so memory use does not depend on the size of
+    the file. Top-level fields other than data (ndjson: the header and
+    summary lines) are collected into header when one is given.
+    """
+    header = {} if header is None else header
+    with open_input(filename) as f:
+        if ".ndjson" in filename:
+            for line in f:
+                record = json.loads(line)
+                if "collection" in record:
+                    yield record["collection"], record["doc"]
+                else:
+                    header.update(record)
+            return
+        yield from _iter_json_export(f, header)
+
+
+def read_header(filename):
+    """Return the top-level fields written ahead of an export's data"""
+    header = {}
+    for _ in iter_export(filename, header):
+        break
+    return header
+
+
+def iter_delta(filename, header=None):
+    """Yield (collection, "upserted", doc) and (collection, "deleted", _id) from a delta file.
+
+    The file is streamed like iter_export; its other top-level fields are
+    collected into header when one is given.
+    """
+    header = {} if header is None else header
+    with open_input(filename) as f:
+        stream = _JsonStream(f)
+        for key in _object(stream):
+            if key != "changes":
+                header[key] = stream.value()
+                continue
+            for name in _object(stream):
+                for kind in _object(stream):
+                    for value in _array(stream):
+                        yield name, kind, value
+
+
+def read_delta_header(filename):
+    """Return the top-level fields written ahead of a delta's changes"""
+    header = {}
+    for _ in iter_delta(filename, header):
+        break
+    return header
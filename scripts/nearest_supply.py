@@ -0,0 +1,115 @@
+"""Offline distance analytics over an export or a stored snapshot.
+
+Loads centers and inventory from an export file (or the latest snapshot in
+exports/store), indexes center locations in a k-d tree and answers:
+
+    python scripts/nearest_supply.py nearest --lat 6.93 --lng 79.85 --item insulin
+    python scripts/nearest_supply.py coverage --category Medical --max-km 50
+
+`nearest` lists the closest centers holding matching stock; `coverage` lists,
+for every center, how far the nearest other center with matching stock is.
+"""
+import argparse
+import os
+import sys
+from collections import defaultdict
+from export_io import iter_export
+import snapshot_store
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from geo import CenterTree, center_coordinates  # noqa: E402
+from matching import tokenize  # noqa: E402
+
+
+def load_network(export=None):
+    """Return (centers by _id, {center _id: [items]}) from an export or HEAD"""
+    if export:
+        records = iter_export(export)
+    else:
+        manifest = snapshot_store.read_head()
+        if manifest is None:
+            raise ValueError("The snapshot store is empty, pass --export")
+        records = snapshot_store.iter_snapshot(manifest)
+
+    centers = {}
+    items = defaultdict(list)
+    for collection, doc in records:
+        if collection == "centers":
+            centers[str(doc["_id"])] = doc
+        elif collection == "inventory":
+            items[str(doc.get("center_id"))].append(doc)
+    return centers, items
+
+
+def stock_filter(item=None, category=None, min_qty=1):
+    """Predicate for inventory docs matching an item name, category and quantity"""
+    wanted = set(tokenize(item)) if item else set()
+
+    def accept(doc):
+        if (doc.get("quantity") or 0) < min_qty:
+            return False
+        if category and doc.get("category") != category:
+            return False
+        return wanted <= set(tokenize(doc.get("item_name")))
+    return accept
+
+
+def build_tree(centers, items, accept):
+    """k-d tree of centers holding stock accepted by the filter; payload (center, quantity)"""
+    points = []
+    for center_id, center in centers.items():
+        coordinates = center_coordinates(center)
+        if coordinates is None:
+            continue
+        quantity = sum(doc.get("quantity") or 0 for doc in items.get(center_id, []) if accept(doc))
+        if quantity:
+            points.append((coordinates[0], coordinates[1], (center_id, quantity)))
+    return CenterTree(points)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distance analytics over helpkart exports")
+    parser.add_argument("--export", help="export file to read (default: latest stored snapshot)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("nearest", "closest centers holding matching stock"),
+                            ("coverage", "distance from each center to the nearest other supplier")):
+        command = sub.add_parser(name, help=help_text)
+        command.add_argument("--item", help="item name words that must all match")
+        command.add_argument("--category")
+        command.add_argument("--min-qty", type=int, default=1, help="minimum quantity per item")
+        command.add_argument("--max-km", type=float, help="ignore centers farther than this")
+        if name == "nearest":
+            command.add_argument("--lat", type=float, required=True)
+            command.add_argument("--lng", type=float, required=True)
+            command.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    centers, items = load_network(args.export)
+    tree = build_tree(centers, items, stock_filter(args.item, args.category, args.min_qty))
+    print(f"📍 {len(tree)} of {len(centers)} centers hold matching stock")
+
+    if args.command == "nearest":
+        for distance, (center_id, quantity) in tree.nearest(args.lat, args.lng, args.k, args.max_km):
+            print(f"{distance:>9.1f} km  {centers[center_id].get('center_name', center_id):<30} {quantity:>8}")
+        return
+
+    for center_id, center in sorted(centers.items(), key=lambda pair: pair[1].get("center_name", "")):
+        coordinates = center_coordinates(center)
+        if coordinates is None:
+            continue
+        found = tree.nearest(coordinates[0], coordinates[1], 1, args.max_km,
+                             accept=lambda payload: payload[0] != center_id)
+        if found:
+            distance, (supplier_id, quantity) = found[0]
+            print(f"{center.get('center_name', center_id):<30} {distance:>9.1f} km  "
+                  f"{centers[supplier_id].get('center_name', supplier_id)} ({quantity})")
+        else:
+            print(f"{center.get('center_name', center_id):<30}      none within range")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
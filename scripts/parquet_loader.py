@@ -0,0 +1,89 @@
+"""Query the Parquet export archive without reparsing JSON.
+
+Datasets are opened through a memory-mapped local filesystem and filtered on
+the export_date partition, so only the files (and columns) a query needs are
+touched.
+
+    python scripts/parquet_loader.py stock --since 2025-12-01 --category Medical
+    python scripts/parquet_loader.py stock --item insulin --latest
+"""
+import argparse
+import os
+import sys
+from parquet_export import PARQUET_DIR
+
+
+def open_dataset(collection, root=PARQUET_DIR):
+    """Open a collection's dataset with memory-mapped file access"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    return ds.dataset(
+        os.path.join(root, collection),
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("export_date", pa.string())]), flavor="hive"),
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+
+
+def load_table(collection, since=None, until=None, columns=None, root=PARQUET_DIR):
+    """Load a collection across snapshots, optionally bounded by export date"""
+    import pyarrow.dataset as ds
+
+    dataset = open_dataset(collection, root)
+    condition = None
+    if since:
+        condition = ds.field("export_date") >= since
+    if until:
+        upper = ds.field("export_date") <= until
+        condition = upper if condition is None else condition & upper
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+def fleet_stock(since=None, until=None, category=None, item=None, latest=False, root=PARQUET_DIR):
+    """Total quantity per snapshot and category across every center"""
+    import pyarrow.compute as pc
+
+    table = load_table("inventory", since, until,
+                       columns=["snapshot_at", "center_id", "item_name", "category", "quantity"], root=root)
+    if category:
+        table = table.filter(pc.equal(table["category"].cast("string"), category))
+    if item:
+        names = pc.utf8_lower(table["item_name"])
+        table = table.filter(pc.match_substring(names, item.lower()))
+    if latest and table.num_rows:
+        table = table.filter(pc.equal(table["snapshot_at"], pc.max(table["snapshot_at"])))
+
+    table = table.set_column(table.schema.get_field_index("category"), "category",
+                             table["category"].cast("string"))
+    grouped = table.group_by(["snapshot_at", "category"]).aggregate([
+        ("quantity", "sum"),
+        ("center_id", "count_distinct"),
+    ])
+    return grouped.sort_by([("snapshot_at", "ascending"), ("category", "ascending")])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the Parquet export archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    stock = sub.add_parser("stock", help="fleet-wide stock per snapshot and category")
+    stock.add_argument("--since", help="first export date (YYYY-MM-DD)")
+    stock.add_argument("--until", help="last export date (YYYY-MM-DD)")
+    stock.add_argument("--category")
+    stock.add_argument("--item", help="case-insensitive item name substring")
+    stock.add_argument("--latest", action="store_true", help="only the most recent snapshot")
+    args = parser.parse_args()
+
+    result = fleet_stock(args.since, args.until, args.category, args.item, args.latest)
+    for row in result.to_pylist():
+        print(f"{row['snapshot_at']:%Y-%m-%d %H:%M}  {row['category']:<10} "
+              f"{row['quantity_sum']:>10}  ({row['center_id_count_distinct']} centers)")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
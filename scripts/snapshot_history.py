@@ -0,0 +1,384 @@
+"""Diffs and point-in-time queries over the exports archive.
+
+Every full snapshot in exports/ (helpkart_export_* and helpkart_snapshot_*
+files in any format, plus the manifests of exports/store) is indexed once
+into a SQLite file: which documents each snapshot held, their updated_at
+and a hash of their content. Document bodies are stored once per distinct
+content, so an archive of thousands of mostly unchanged snapshots stays
+small, and files are streamed while indexing rather than loaded whole.
+Re-running index only reads new or changed files.
+
+    python scripts/snapshot_history.py index
+    python scripts/snapshot_history.py list
+    python scripts/snapshot_history.py diff 2025-12-02T09:19 2025-12-02T10:24
+    python scripts/snapshot_history.py at 2025-12-02T10:00 --item "rice"
+    python scripts/snapshot_history.py history inventory 692e6bac6c2b27c38d3315c7
+
+Snapshots are named by file name or by a time, meaning the latest snapshot
+taken at or before it.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime
+from export_io import iter_export
+from snapshot_store import canonical, iter_snapshot, sha256
+
+EXPORT_DIR = "exports"
+INDEX_FILE = os.path.join(EXPORT_DIR, "state", "snapshot_index.sqlite")
+SNAPSHOT_PATTERNS = ["helpkart_export_*", "helpkart_snapshot_*"]
+
+# Fields shown as a document's name in listings
+NAME_FIELDS = {"centers": "center_name", "inventory": "item_name", "requests": "item_name",
+               "transactions": "item_name"}
+
+# Sortable text form of every stored time
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL UNIQUE,
+    generated_at TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    documents INTEGER
+);
+CREATE INDEX IF NOT EXISTS snapshots_generated_at ON snapshots (generated_at);
+CREATE TABLE IF NOT EXISTS documents (
+    snapshot_id INTEGER NOT NULL,
+    collection TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    updated_at TEXT,
+    name TEXT,
+    PRIMARY KEY (snapshot_id, collection, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS documents_by_doc ON documents (collection, doc_id, snapshot_id);
+CREATE TABLE IF NOT EXISTS contents (
+    hash TEXT PRIMARY KEY,
+    doc TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+_FILE_TIME = re.compile(r"(\d{8}_\d{6})")
+
+
+def connect(path=INDEX_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    # The index can always be rebuilt from the archive, so trade durability for speed
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def as_time(value):
+    """Parse an ISO time (date, minutes or more precise) into the stored text form"""
+    return datetime.fromisoformat(str(value).strip()).strftime(TIME_FORMAT)
+
+
+def _latest_time(ref):
+    """Stored form of the last instant a time names: "10:24" covers the whole minute"""
+    at = datetime.fromisoformat(ref.strip())
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", ref.strip()):
+        at = at.replace(hour=23, minute=59, second=59, microsecond=999999)
+    elif re.search(r"[T ]\d{2}:\d{2}$", ref.strip()):
+        at = at.replace(second=59, microsecond=999999)
+    return at.strftime(TIME_FORMAT)
+
+
+def _updated_at(doc):
+    value = doc.get("updated_at") or doc.get("created_at")
+    try:
+        return as_time(value) if value else None
+    except ValueError:
+        return None
+
+
+def _generated_at(source, header, mtime):
+    """Snapshot time from its header, else from the file name, else the file time"""
+    if header.get("generated_at"):
+        return as_time(header["generated_at"])
+    match = _FILE_TIME.search(os.path.basename(source))
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").strftime(TIME_FORMAT)
+    return datetime.fromtimestamp(mtime).strftime(TIME_FORMAT)
+
+
+def find_sources(export_dir=EXPORT_DIR):
+    """Paths of every full snapshot in the archive, oldest first"""
+    paths = []
+    for pattern in SNAPSHOT_PATTERNS:
+        paths += glob.glob(os.path.join(export_dir, pattern))
+    paths += glob.glob(os.path.join(export_dir, "store", "manifests", "*.json"))
+    return sorted(paths)
+
+
+def _read_source(path, header):
+    if os.path.dirname(path).endswith(os.path.join("store", "manifests")):
+        with open(path) as f:
+            manifest = json.load(f)
+        header["generated_at"] = manifest.get("generated_at")
+        # The store the manifest belongs to, wherever the archive is
+        return iter_snapshot(manifest, os.path.dirname(os.path.dirname(path)))
+    return iter_export(path, header)
+
+
+def index_source(conn, path):
+    """(Re)index one snapshot file; return its document count"""
+    stat = os.stat(path)
+    conn.execute("DELETE FROM documents WHERE snapshot_id IN (SELECT id FROM snapshots WHERE source = ?)", (path,))
+    conn.execute("DELETE FROM snapshots WHERE source = ?", (path,))
+    snapshot_id = conn.execute("INSERT INTO snapshots (source, generated_at, size, mtime) VALUES (?, '', ?, ?)",
+                               (path, stat.st_size, stat.st_mtime)).lastrowid
+
+    header = {}
+    count = 0
+    rows, contents = [], []
+    for collection, doc in _read_source(path, header):
+        text = canonical(doc)
+        digest = sha256(text)
+        contents.append((digest, text))
+        rows.append((snapshot_id, collection, str(doc.get("_id")), digest, _updated_at(doc),
+                     doc.get(NAME_FIELDS.get(collection, ""))))
+        count += 1
+        if len(rows) >= 1000:
+            _insert(conn, rows, contents)
+    _insert(conn, rows, contents)
+
+    conn.execute("UPDATE snapshots SET generated_at = ?, documents = ? WHERE id = ?",
+                 (_generated_at(path, header, stat.st_mtime), count, snapshot_id))
+    return count
+
+
+def _insert(conn, rows, contents):
+    conn.executemany("INSERT OR IGNORE INTO contents (hash, doc) VALUES (?, ?)", contents)
+    # A document listed twice in one file keeps its last version
+    conn.executemany("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?)", rows)
+    rows.clear()
+    contents.clear()
+
+
+def index_archive(conn, export_dir=EXPORT_DIR):
+    """Index new and changed snapshots and forget deleted ones; return (indexed, removed)"""
+    known = {source: (size, mtime) for source, size, mtime in conn.execute("SELECT source, size, mtime FROM snapshots")}
+    sources = find_sources(export_dir)
+    indexed = 0
+    for path in sources:
+        stat = os.stat(path)
+        if known.get(path) == (stat.st_size, stat.st_mtime):
+            continue
+        with conn:
+            index_source(conn, path)
+        indexed += 1
+
+    removed = [source for source in known if source not in set(sources)]
+    with conn:
+        for source in removed:
+            conn.execute("DELETE FROM documents WHERE snapshot_id IN (SELECT id FROM snapshots WHERE source = ?)",
+                         (source,))
+            conn.execute("DELETE FROM snapshots WHERE source = ?", (source,))
+        # Bodies no snapshot refers to any more
+        if removed:
+            conn.execute("DELETE FROM contents WHERE hash NOT IN (SELECT hash FROM documents)")
+    return indexed, len(removed)
+
+
+def resolve(conn, ref):
+    """Snapshot row (id, source, generated_at) named by a file name, "latest" or a time"""
+    if ref == "latest":
+        row = conn.execute("SELECT id, source, generated_at FROM snapshots ORDER BY generated_at DESC LIMIT 1").fetchone()
+    else:
+        # A bare file name matches the source's last path component
+        row = conn.execute("SELECT id, source, generated_at FROM snapshots WHERE source = ? OR source LIKE ? ESCAPE '\\'",
+                           (ref, "%" + re.sub(r"([\\%_])", r"\\\1", os.sep + ref))).fetchone()
+        if row is None:
+            try:
+                at = _latest_time(ref)
+            except ValueError:
+                raise ValueError(f"{ref} is neither an indexed snapshot nor a time")
+            row = conn.execute("SELECT id, source, generated_at FROM snapshots WHERE generated_at <= ? "
+                               "ORDER BY generated_at DESC LIMIT 1", (at,)).fetchone()
+    if row is None:
+        raise ValueError(f"No snapshot at or before {ref} (run index first?)")
+    return row
+
+
+def load_doc(conn, digest):
+    return json.loads(conn.execute("SELECT doc FROM contents WHERE hash = ?", (digest,)).fetchone()[0])
+
+
+def field_changes(old, new, prefix=""):
+    """{dotted field: (old value, new value)} between two documents"""
+    changes = {}
+    for key in sorted(set(old) | set(new), key=str):
+        path = f"{prefix}{key}"
+        before, after = old.get(key), new.get(key)
+        if isinstance(before, dict) and isinstance(after, dict):
+            changes.update(field_changes(before, after, f"{path}."))
+        elif before != after or (key in old) != (key in new):
+            changes[path] = (before, after)
+    return changes
+
+
+def diff(conn, old_id, new_id, collection=None):
+    """Per-document differences between two snapshots, as a list of dicts"""
+    scope = "" if collection is None else " AND a.collection = :collection"
+    params = {"old": old_id, "new": new_id, "collection": collection}
+    changed = conn.execute(
+        "SELECT a.collection, a.doc_id, a.hash, b.hash FROM documents a "
+        "LEFT JOIN documents b ON b.snapshot_id = :new AND b.collection = a.collection AND b.doc_id = a.doc_id "
+        f"WHERE a.snapshot_id = :old AND (b.hash IS NULL OR b.hash != a.hash){scope}", params).fetchall()
+    added = conn.execute(
+        "SELECT a.collection, a.doc_id, NULL, a.hash FROM documents a "
+        "LEFT JOIN documents b ON b.snapshot_id = :old AND b.collection = a.collection AND b.doc_id = a.doc_id "
+        f"WHERE a.snapshot_id = :new AND b.doc_id IS NULL{scope}", params).fetchall()
+
+    entries = []
+    for collection_name, doc_id, old_hash, new_hash in sorted(changed + added):
+        old = load_doc(conn, old_hash) if old_hash else None
+        new = load_doc(conn, new_hash) if new_hash else None
+        entry = {"collection": collection_name, "_id": doc_id,
+                 "name": (new or old).get(NAME_FIELDS.get(collection_name, ""))}
+        if old is None:
+            entry.update(change="added", doc=new)
+        elif new is None:
+            entry.update(change="removed", doc=old)
+        else:
+            entry.update(change="changed", fields=field_changes(old, new))
+        entries.append(entry)
+    return entries
+
+
+def documents_at(conn, snapshot_id, collection, doc_id=None, name=None):
+    """Documents of a collection in one snapshot, by _id or by a name fragment"""
+    query = "SELECT hash FROM documents WHERE snapshot_id = ? AND collection = ?"
+    params = [snapshot_id, collection]
+    if doc_id is not None:
+        query += " AND doc_id = ?"
+        params.append(doc_id)
+    if name is not None:
+        query += " AND name LIKE ?"
+        params.append(f"%{name}%")
+    return [load_doc(conn, digest) for digest, in conn.execute(query, params)]
+
+
+def doc_history(conn, collection, doc_id):
+    """(snapshot time, source, doc or None) at every snapshot where a document changed"""
+    rows = conn.execute(
+        "SELECT s.generated_at, s.source, d.hash FROM snapshots s "
+        "LEFT JOIN documents d ON d.snapshot_id = s.id AND d.collection = ? AND d.doc_id = ? "
+        "ORDER BY s.generated_at", (collection, doc_id)).fetchall()
+    history, last = [], None
+    for generated_at, source, digest in rows:
+        if digest != last:
+            history.append((generated_at, source, load_doc(conn, digest) if digest else None))
+            last = digest
+    # Drop the leading "absent" entry of documents created after the first snapshot
+    return history[1:] if history and history[0][2] is None else history
+
+
+def _short(value):
+    text = json.dumps(value, default=str)
+    return text if len(text) <= 60 else text[:57] + "..."
+
+
+def _label(entry):
+    return f"{entry['collection']} {entry['_id']}" + (f" ({entry['name']})" if entry.get("name") else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index, diff and query the exports archive")
+    parser.add_argument("--index-file", default=INDEX_FILE)
+    parser.add_argument("--exports", default=EXPORT_DIR, help="archive directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("index", help="index new and changed snapshots")
+    commands.add_parser("list", help="list indexed snapshots")
+    diff_parser = commands.add_parser("diff", help="documents that changed between two snapshots")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+    diff_parser.add_argument("--collection")
+    diff_parser.add_argument("--json", action="store_true", help="print the diff as JSON")
+    at_parser = commands.add_parser("at", help="documents as they were at a time")
+    at_parser.add_argument("time")
+    at_parser.add_argument("--collection", default="inventory")
+    at_parser.add_argument("--id", help="document _id")
+    at_parser.add_argument("--item", help="part of the item (or center) name")
+    history_parser = commands.add_parser("history", help="every change of one document")
+    history_parser.add_argument("collection")
+    history_parser.add_argument("id")
+    args = parser.parse_args()
+
+    conn = connect(args.index_file)
+    if args.command == "index":
+        indexed, removed = index_archive(conn, args.exports)
+        total = conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+        print(f"✅ Indexed {indexed} new or changed snapshot{'s' if indexed != 1 else ''}, forgot {removed}; "
+              f"{total} in {args.index_file}")
+        return
+
+    if args.command == "list":
+        for generated_at, source, documents in conn.execute(
+                "SELECT generated_at, source, documents FROM snapshots ORDER BY generated_at"):
+            print(f"{generated_at[:19]}  {documents:>7} docs  {os.path.basename(source)}")
+        return
+
+    if args.command == "diff":
+        old, new = resolve(conn, args.old), resolve(conn, args.new)
+        entries = diff(conn, old[0], new[0], args.collection)
+        if args.json:
+            print(json.dumps({"old": old[1], "new": new[1], "changes": entries}, indent=2, default=str))
+            return
+        print(f"📸 {os.path.basename(old[1])} ({old[2][:19]}) -> {os.path.basename(new[1])} ({new[2][:19]})")
+        for entry in entries:
+            if entry["change"] == "changed":
+                print(f"~ {_label(entry)}")
+                for field, (before, after) in entry["fields"].items():
+                    print(f"    {field}: {_short(before)} -> {_short(after)}")
+            else:
+                print(f"{'+' if entry['change'] == 'added' else '-'} {_label(entry)}")
+        counts = {kind: sum(1 for e in entries if e["change"] == kind) for kind in ("added", "changed", "removed")}
+        print(f"✅ {counts['added']} added, {counts['changed']} changed, {counts['removed']} removed")
+        return
+
+    if args.command == "at":
+        snapshot_id, source, generated_at = resolve(conn, args.time)
+        docs = documents_at(conn, snapshot_id, args.collection, args.id, args.item)
+        print(f"📸 As of {generated_at[:19]} ({os.path.basename(source)})")
+        for doc in docs:
+            if args.collection == "inventory":
+                print(f"• {doc.get('item_name')} - {doc.get('quantity', 0)} {doc.get('unit') or 'units'} "
+                      f"at center {doc.get('center_id')} [{doc.get('_id')}]")
+            else:
+                print(json.dumps(doc, indent=2, default=str))
+        if not docs:
+            print("No matching documents in that snapshot")
+        return
+
+    history = doc_history(conn, args.collection, args.id)
+    previous = {}
+    for generated_at, source, doc in history:
+        if doc is None:
+            print(f"{generated_at[:19]}  removed  ({os.path.basename(source)})")
+            previous = {}
+            continue
+        changes = field_changes(previous, doc) if previous else {}
+        summary = ", ".join(f"{field}: {_short(before)} -> {_short(after)}" for field, (before, after) in changes.items())
+        print(f"{generated_at[:19]}  {summary or 'present'}  ({os.path.basename(source)})")
+        previous = doc
+    if not history:
+        print(f"No {args.collection} document {args.id} in any snapshot")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,154 @@
+"""Content-addressed snapshot store for helpkart exports.
+
+Layout under exports/store/:
+
+    objects/ab/abcdef....ndjson   chunks of documents, named by content hash
+    manifests/<timestamp>.json    one per distinct snapshot
+    HEAD                          name of the latest manifest
+
+Each collection is read in _id order and cut into chunks at content-defined
+boundaries (a boundary falls after a document whose _id hashes to 0 modulo
+CHUNK_TARGET), so inserting or editing one document only changes the chunk
+that holds it. Chunks that already exist are never rewritten, and a run whose
+content hash matches HEAD writes nothing at all.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from export_io import serialize
+
+STORE_DIR = os.path.join("exports", "store")
+MANIFESTS_DIR = os.path.join(STORE_DIR, "manifests")
+HEAD_FILE = os.path.join(STORE_DIR, "HEAD")
+
+# Average documents per chunk, and a hard cap that bounds memory
+CHUNK_TARGET = 256
+CHUNK_MAX = CHUNK_TARGET * 4
+
+
+def canonical(doc):
+    """Serialize a document the same way on every run"""
+    return json.dumps(doc, default=serialize, sort_keys=True, separators=(",", ":"))
+
+
+def sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def is_boundary(doc_id):
+    return int(sha256(str(doc_id))[:8], 16) % CHUNK_TARGET == 0
+
+
+def object_path(digest, store_dir=STORE_DIR):
+    return os.path.join(store_dir, "objects", digest[:2], f"{digest}.ndjson")
+
+
+def write_chunk(lines):
+    """Store a chunk unless an identical one exists.
+
+    Returns the chunk hash and the number of bytes newly written.
+    """
+    content = "".join(f"{line}\n" for line in lines)
+    digest = sha256(content)
+    path = object_path(digest)
+    if os.path.exists(path):
+        return digest, 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return digest, len(content)
+
+
+def store_collection(cursor):
+    """Chunk one collection and return its manifest entry"""
+    chunks = []
+    lines = []
+    count = 0
+    new_bytes = 0
+
+    def flush():
+        nonlocal new_bytes
+        if lines:
+            digest, written = write_chunk(lines)
+            chunks.append(digest)
+            new_bytes += written
+            lines.clear()
+
+    for doc in cursor:
+        lines.append(canonical(doc))
+        count += 1
+        if is_boundary(doc["_id"]) or len(lines) >= CHUNK_MAX:
+            flush()
+    flush()
+
+    return {
+        "hash": sha256(",".join(chunks)),
+        "count": count,
+        "chunks": chunks,
+    }, new_bytes
+
+
+def read_head():
+    """Return the latest manifest, or None for an empty store"""
+    if not os.path.exists(HEAD_FILE):
+        return None
+    with open(HEAD_FILE) as f:
+        name = f.read().strip()
+    return load_manifest(name)
+
+
+def load_manifest(name):
+    with open(os.path.join(MANIFESTS_DIR, os.path.basename(name))) as f:
+        return json.load(f)
+
+
+def snapshot(db, collections, projections, batch_size=1000, summary=None):
+    """Store the current database content; return (manifest name, changed)"""
+    entries = {}
+    new_bytes = 0
+    for name in collections:
+        cursor = db[name].find({}, projections.get(name), batch_size=batch_size).sort("_id", 1)
+        if summary is not None:
+            cursor = _counting(cursor, name, summary)
+        entries[name], written = store_collection(cursor)
+        new_bytes += written
+
+    content_hash = sha256(",".join(f"{name}:{entries[name]['hash']}" for name in collections))
+    head = read_head()
+    if head is not None and head["content_hash"] == content_hash:
+        return head["name"], False
+
+    manifest_name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{content_hash[:8]}.json"
+    manifest = {
+        "name": manifest_name,
+        "generated_at": datetime.now().isoformat(),
+        "content_hash": content_hash,
+        "parent": head["name"] if head else None,
+        "new_bytes": new_bytes,
+        "summary": summary.as_dict() if summary is not None else None,
+        "collections": entries,
+    }
+    os.makedirs(MANIFESTS_DIR, exist_ok=True)
+    with open(os.path.join(MANIFESTS_DIR, manifest_name), "w") as f:
+        json.dump(manifest, f, indent=2)
+    with open(HEAD_FILE, "w") as f:
+        f.write(f"{manifest_name}\n")
+    return manifest_name, True
+
+
+def _counting(cursor, name, summary):
+    for doc in cursor:
+        summary.add(name, doc)
+        yield doc
+
+
+def iter_snapshot(manifest, store_dir=STORE_DIR):
+    """Yield (collection, doc) pairs of a stored snapshot, chunk by chunk"""
+    for name, entry in manifest["collections"].items():
+        for digest in entry["chunks"]:
+            with open(object_path(digest, store_dir), encoding="utf-8") as f:
+                for line in f:
+                    yield name, json.loads(line)
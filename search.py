@@ -0,0 +1,113 @@
+"""Ranked inventory search.
+
+Exact search runs on MongoDB's weighted text index over item_name and
+description (migration 5), ranked by text score and then quantity. When it
+finds nothing, typically because of a typo ("bandge"), fuzzy_search maps
+each query token to similar indexed words through an in-process trigram
+index and ranks items with the MatchIndex.
+"""
+import threading
+from collections import Counter, defaultdict
+from matching import tokenize
+
+SEARCH_SORT = [("score", {"$meta": "textScore"}), ("quantity", -1), ("_id", 1)]
+
+SIMILARITY_THRESHOLD = 0.3
+EXPANSIONS_PER_TOKEN = 3
+
+
+def text_query(query, search_term):
+    """Add a $text condition to a Browse query"""
+    return dict(query, **{"$text": {"$search": search_term}})
+
+
+def search_page(inventory, query, search_term, projection, page_size, offset=0):
+    """Fetch one page of text-search results; returns (items, has_next).
+
+    Relevance order has no stable keyset, so pages are addressed by offset.
+    """
+    projection = dict(projection, score={"$meta": "textScore"})
+    docs = list(inventory.find(text_query(query, search_term), projection)
+                .sort(SEARCH_SORT).skip(offset).limit(page_size + 1))
+    return docs[:page_size], len(docs) > page_size
+
+
+def trigrams(word):
+    """Character trigrams of a word padded like pg_trgm ("  w", " wo", ..., "d ")"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Trigram postings over the words currently used by network inventory"""
+
+    def __init__(self):
+        self._postings = defaultdict(set)  # trigram -> words
+        self._sizes = {}                   # word -> number of trigrams
+        self._counts = Counter()           # word -> items using it
+        self._item_words = {}              # _id -> words
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def _add_word(self, word):
+        self._counts[word] += 1
+        if self._counts[word] == 1:
+            grams = trigrams(word)
+            self._sizes[word] = len(grams)
+            for gram in grams:
+                self._postings[gram].add(word)
+
+    def _discard_word(self, word):
+        self._counts[word] -= 1
+        if self._counts[word] > 0:
+            return
+        del self._counts[word]
+        del self._sizes[word]
+        for gram in trigrams(word):
+            self._postings[gram].discard(word)
+            if not self._postings[gram]:
+                del self._postings[gram]
+
+    def on_change(self, old, new):
+        """NetworkView listener"""
+        _id = (new or old)["_id"]
+        words = set()
+        if new is not None:
+            words = set(tokenize(new.get("item_name"))) | set(tokenize(new.get("description")))
+        with self._lock:
+            for word in self._item_words.pop(_id, set()):
+                self._discard_word(word)
+            for word in words:
+                self._add_word(word)
+            if words:
+                self._item_words[_id] = words
+
+    def similar(self, word, limit=EXPANSIONS_PER_TOKEN, threshold=SIMILARITY_THRESHOLD):
+        """Indexed words most similar to word as (word, Jaccard similarity) pairs"""
+        grams = trigrams(word)
+        with self._lock:
+            shared = Counter()
+            for gram in grams:
+                shared.update(self._postings.get(gram, ()))
+            scored = []
+            for candidate, count in shared.items():
+                similarity = count / (len(grams) + self._sizes[candidate] - count)
+                if similarity >= threshold:
+                    scored.append((similarity, candidate))
+        scored.sort(reverse=True)
+        return [(candidate, similarity) for similarity, candidate in scored[:limit]]
+
+
+def fuzzy_search(match_index, trigram_index, search_term, min_quantity=0, exclude_center=None,
+                 k=25, accept=None):
+    """Rank items whose words resemble the search term; returns (score, item) pairs"""
+    boosts = {}
+    for token in tokenize(search_term):
+        for word, similarity in trigram_index.similar(token):
+            boosts[word] = max(boosts.get(word, 0.0), similarity)
+    if not boosts:
+        return []
+    return match_index.match_tokens(list(boosts), min_quantity, exclude_center, k,
+                                    accept=accept, boosts=boosts)
@@ -0,0 +1,208 @@
+"""Network-wide stock totals kept up to date by the inventory write paths.
+
+`stock_summary` holds one document per center, per category and per item
+(normalized name and unit):
+
+    {"_id": "center:<center_id>", "scope": "center", "key": "<center_id>",
+     "quantity": ..., "items": ..., "out_of_stock": ...}
+    {"_id": "category:Medical", "scope": "category", "key": "Medical", ..., "by_center": {"<center_id>": qty}}
+    {"_id": "item:insulin|vials", "scope": "item", "key": "insulin", "unit": "vials", "name": "Insulin",
+     ..., "by_center": {...}}
+
+Every write that changes inventory passes the items before and after it to
+record_summary(), which $inc's the difference, so "how much insulin exists
+and where" is one indexed read instead of a scan of every center's stock.
+
+Increments can drift from the source (a write that failed half-way, items
+loaded straight into the database), so verify() recomputes the totals from
+inventory and reports or repairs the documents that differ:
+
+    python stock_summary.py           # report drift
+    python stock_summary.py --fix     # $inc drifted documents back in line
+"""
+import argparse
+import logging
+import re
+import sys
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from matching import normalize
+from migrations import DATABASE_NAME
+from mongo_config import create_client
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_COLLECTION = "stock_summary"
+
+# Inventory fields the summary is computed from
+SUMMARY_FIELDS = {"center_id": 1, "item_name": 1, "category": 1, "unit": 1, "quantity": 1}
+
+
+def contributions(item):
+    """{summary _id: (identifying fields, counters)} an inventory item adds to the totals"""
+    if item is None:
+        return {}
+    center_id = str(item.get("center_id"))
+    category = item.get("category") or "Other"
+    name = normalize(item.get("item_name"))
+    unit = item.get("unit") or ""
+    quantity = int(item.get("quantity") or 0)
+    counts = {"quantity": quantity, "items": 1, "out_of_stock": int(quantity == 0)}
+    located = dict(counts, **{f"by_center.{center_id}": quantity})
+    return {
+        f"center:{center_id}": ({"scope": "center", "key": center_id}, counts),
+        f"category:{category}": ({"scope": "category", "key": category}, located),
+        f"item:{name}|{unit}": ({"scope": "item", "key": name, "unit": unit, "name": item.get("item_name")}, located),
+    }
+
+
+def summary_operations(pairs):
+    """$inc upserts that move the totals from each (before, after) item pair.
+
+    before is None for a new item and after is None for a deleted one.
+    """
+    totals = {}
+    for before, after in pairs:
+        for sign, item in ((-1, before), (1, after)):
+            for _id, (fields, counts) in contributions(item).items():
+                entry = totals.setdefault(_id, (fields, {}))
+                for name, value in counts.items():
+                    entry[1][name] = entry[1].get(name, 0) + sign * value
+
+    operations = []
+    for _id, (fields, counts) in totals.items():
+        increments = {name: value for name, value in counts.items() if value}
+        if increments:
+            operations.append(UpdateOne({"_id": _id}, {"$inc": increments, "$setOnInsert": fields}, upsert=True))
+    return operations
+
+
+def record_summary(db, pairs, session=None):
+    """Apply the totals change of inventory writes that already succeeded.
+
+    Like the stock history, outside a transaction a failure is only logged;
+    verify() repairs what was missed.
+    """
+    operations = summary_operations(pairs)
+    if not operations:
+        return
+    try:
+        db[SUMMARY_COLLECTION].bulk_write(operations, ordered=False, session=session)
+    except Exception as e:
+        if session is not None:
+            raise
+        logger.warning("Could not update the stock summary for %d items: %s", len(pairs), e)
+
+
+def item_totals(summary, name, unit=None):
+    """Summary documents of items whose normalized name starts with name, largest stock first"""
+    query = {"scope": "item", "key": {"$regex": f"^{re.escape(normalize(name))}"}, "quantity": {"$gt": 0}}
+    if unit:
+        query["unit"] = unit
+    return list(summary.find(query).sort("quantity", -1))
+
+
+def scope_totals(summary, scope):
+    """All summary documents of one scope that still hold items"""
+    return list(summary.find({"scope": scope, "items": {"$gt": 0}}).sort("key", 1))
+
+
+def expected_totals(inventory):
+    """Summary documents recomputed from every inventory item"""
+    expected = {}
+    for item in inventory.find({}, SUMMARY_FIELDS):
+        for _id, (fields, counts) in contributions(item).items():
+            doc = expected.setdefault(_id, dict(fields, _id=_id))
+            for name, value in counts.items():
+                if name.startswith("by_center."):
+                    by_center = doc.setdefault("by_center", {})
+                    center_id = name.split(".", 1)[1]
+                    by_center[center_id] = by_center.get(center_id, 0) + value
+                else:
+                    doc[name] = doc.get(name, 0) + value
+    return expected
+
+
+def _counts(doc):
+    """A summary document's counters, ignoring zeros left by deleted items"""
+    counts = {name: doc.get(name, 0) for name in ("quantity", "items", "out_of_stock") if doc.get(name)}
+    by_center = {center_id: value for center_id, value in (doc.get("by_center") or {}).items() if value}
+    if by_center:
+        counts["by_center"] = by_center
+    return counts
+
+
+def _flat_counts(doc):
+    """A summary document's counters as {field path: value}"""
+    counts = {name: doc.get(name, 0) for name in ("quantity", "items", "out_of_stock")}
+    for center_id, value in (doc.get("by_center") or {}).items():
+        counts[f"by_center.{center_id}"] = value
+    return counts
+
+
+def _drift(db):
+    """{_id: (identifying fields, {field path: expected - stored})} of documents that differ"""
+    expected = expected_totals(db["inventory"])
+    stored = {doc["_id"]: doc for doc in db[SUMMARY_COLLECTION].find()}
+
+    drift = {}
+    for _id in set(expected) | set(stored):
+        want, have = expected.get(_id, {}), stored.get(_id, {})
+        if _counts(want) == _counts(have):
+            continue
+        want, have = _flat_counts(want), _flat_counts(have)
+        increments = {name: want.get(name, 0) - have.get(name, 0) for name in set(want) | set(have)}
+        fields = {name: value for name, value in expected.get(_id, {}).items()
+                  if name in ("scope", "key", "unit", "name")}
+        drift[_id] = (fields, {name: value for name, value in increments.items() if value})
+    return drift
+
+
+def verify(db, fix=False):
+    """Compare the summary with inventory; return the _ids that differ, or with fix the _ids repaired.
+
+    A repair $inc's the difference rather than rewriting the document, so
+    increments from writes made meanwhile are kept, and only touches
+    documents that differ on two scans in a row and by the same amount, not
+    ones caught between an inventory write and its summary update.
+    """
+    drift = _drift(db)
+    if not fix or not drift:
+        return sorted(drift)
+
+    again = _drift(db)
+    steady = sorted(_id for _id, (fields, increments) in again.items()
+                    if increments and _id in drift and drift[_id][1] == increments)
+    if steady:
+        db[SUMMARY_COLLECTION].bulk_write([UpdateOne({"_id": _id}, {"$inc": again[_id][1], "$setOnInsert": again[_id][0]},
+                                                     upsert=True) for _id in steady], ordered=False)
+    return steady
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify the stock summary against inventory")
+    parser.add_argument("--fix", action="store_true", help="repair documents that differ from inventory")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = create_client()[DATABASE_NAME]
+    drifted = verify(db, fix=args.fix)
+    if not drifted:
+        print("✅ Stock summary matches inventory")
+        return
+    for _id in drifted[:50]:
+        print(f"   {_id}")
+    if args.fix:
+        print(f"✅ Repaired {len(drifted)} drifted summary document{'s' if len(drifted) != 1 else ''}")
+    else:
+        print(f"❌ {len(drifted)} summary document{'s' if len(drifted) != 1 else ''} differ from inventory "
+              f"(run with --fix to repair them)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,63 @@
+"""Grid edits must land on the row the user saw, even if the cached items change."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson.objectid import ObjectId  # noqa: E402
+from components.inventory import rendered_rows, save_changes  # noqa: E402
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def inventory(monkeypatch):
+    # pymongo passes a sort option to every update; mongomock's bulk builder
+    # predates it, and the grid never sorts updates
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.BulkOperationBuilder, "add_update", add_update_without_sort)
+    return mongomock.MongoClient()["helpkart_db"]["inventory"]
+
+
+def add_item(inventory, name, quantity=5):
+    doc = {"_id": ObjectId(), "center_id": "c1", "item_name": name, "quantity": quantity, "version": 0}
+    inventory.insert_one(dict(doc))
+    return doc
+
+
+def test_edits_and_deletes_follow_the_rendered_rows_when_items_shift(inventory):
+    rice, water, tents = (add_item(inventory, name) for name in ("Rice", "Water", "Tents"))
+    state = {}
+    grid_key = "inventory_grid_0"
+
+    # First draw, nothing pending yet
+    assert rendered_rows(state, grid_key, [rice, water, tents]) == [rice, water, tents]
+
+    # The user edits row 1 (Water) and deletes row 2 (Tents)...
+    state[grid_key] = {"edited_rows": {1: {"quantity": 2}}, "deleted_rows": [2], "added_rows": []}
+
+    # ...while another session deletes Rice, so the cached rows shift up
+    inventory.delete_one({"_id": rice["_id"]})
+    cached = [water, tents]
+    rows = rendered_rows(state, grid_key, cached)
+    applied, errors, conflicts = save_changes(inventory, "c1", rows, state[grid_key], cached)
+
+    assert (applied, errors, conflicts) == (2, [], [])
+    remaining = {doc["item_name"]: doc for doc in inventory.find({"center_id": "c1"})}
+    assert list(remaining) == ["Water"]
+    assert remaining["Water"]["quantity"] == 2
+    assert remaining["Water"]["version"] == 1
+
+
+def test_rows_refresh_once_nothing_is_pending():
+    rice = {"_id": ObjectId(), "item_name": "Rice"}
+    water = {"_id": ObjectId(), "item_name": "Water"}
+    state = {"inventory_grid_0": {"edited_rows": {}, "deleted_rows": [], "added_rows": []}}
+    rendered_rows(state, "inventory_grid_0", [rice])
+    assert rendered_rows(state, "inventory_grid_0", [rice, water]) == [rice, water]
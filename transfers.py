@@ -0,0 +1,235 @@
+"""Stock transfers between centers.
+
+A transfer debits the sender's item with a conditional update
+(`quantity >= n`), credits the matching item of the receiving center
+(creating it if needed), records the movement in `transactions` and can mark
+the request it fulfils (fully, or in part when fewer units than requested
+are sent). On a replica set (Atlas) all of this runs in one
+multi-document transaction; on a standalone server the same steps run in
+sequence and a failed credit is compensated by giving the stock back. The
+conditional debit is what prevents overdrafts either way, so no
+application-side locking is needed.
+
+Inventory documents carry a `version` counter that every write increments;
+edits made from a stale copy filter on the version they read and lose the
+race instead of overwriting someone else's change.
+
+Items with expiry lots (see expiry.py) give away the lots that expire first,
+and the receiver gets them with their expiry dates.
+"""
+import re
+import uuid
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from expiry import add_lots, allocate_fefo, set_lots
+from history import changes_from, record_changes
+from matching import normalize
+from stock_summary import record_summary
+
+# Server error code for transactions on a standalone mongod
+ILLEGAL_OPERATION = 20
+
+# Attempts at debiting an item with lots that keeps changing under us
+DEBIT_RETRIES = 3
+
+# Fields of the credited item that its history and the stock summary need
+CREDIT_PROJECTION = {"item_id": 1, "center_id": 1, "item_name": 1, "category": 1, "unit": 1, "quantity": 1}
+
+
+class TransferError(Exception):
+    """A transfer that could not be applied; nothing was changed"""
+
+
+def version_filter(item):
+    """Filter matching an item only while it is still at the version we read"""
+    if "version" in item:
+        return {"version": item["version"]}
+    return {"version": {"$exists": False}}
+
+
+def _debit(inventory, item_id, center_id, quantity, now, session=None):
+    """Take stock from the sender; return (item after the debit, lots taken).
+
+    The item is None when the sender does not hold enough.
+    """
+    # Items without lots: one conditional update, no read needed
+    debited = inventory.find_one_and_update(
+        {"_id": item_id, "center_id": center_id, "quantity": {"$gte": quantity}, "lots.0": {"$exists": False}},
+        {"$inc": {"quantity": -quantity, "version": 1}, "$set": {"updated_at": now}},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+    if debited is not None:
+        return debited, []
+
+    # Items with lots give away the earliest-expiring ones
+    for _ in range(DEBIT_RETRIES):
+        item = inventory.find_one({"_id": item_id, "center_id": center_id, "quantity": {"$gte": quantity}},
+                                  session=session)
+        if item is None or not item.get("lots"):
+            return None, []
+        lots, taken = allocate_fefo(item["lots"], item["quantity"], quantity)
+        update = set_lots({"$inc": {"quantity": -quantity, "version": 1}, "$set": {"updated_at": now}}, lots)
+        debited = inventory.find_one_and_update(dict({"_id": item_id}, **version_filter(item)), update,
+                                                return_document=ReturnDocument.AFTER, session=session)
+        if debited is not None:
+            return debited, taken
+    raise TransferError("The item is being changed by someone else, please try again")
+
+
+def _credit(inventory, source, center_id, quantity, lots, now, session=None):
+    """Add stock (and its lots) to the receiver's item with the same name and unit.
+
+    Returns (the item after the credit, whether it was created).
+    """
+    filter_ = {
+        "center_id": center_id,
+        "item_name": {"$regex": f"^{re.escape(source['item_name'].strip())}$", "$options": "i"},
+        "unit": source.get("unit"),
+    }
+    update = add_lots({"$inc": {"quantity": quantity, "version": 1}, "$set": {"updated_at": now}}, lots)
+    credited = inventory.find_one_and_update(filter_, update, CREDIT_PROJECTION,
+                                             return_document=ReturnDocument.AFTER, session=session)
+    if credited is not None:
+        return credited, False
+
+    # First delivery of this item: create it, keyed like bulk imports. The
+    # sender's item_id may already name a different item here (ids are
+    # caller-supplied on import), so only reuse it when it is free
+    item_id = source.get("item_id")
+    if not item_id or inventory.find_one({"center_id": center_id, "item_id": item_id}, {"_id": 1},
+                                         session=session) is not None:
+        item_id = str(uuid.uuid4())
+    key = {"center_id": center_id, "item_id": item_id}
+    insert = dict(update, **{"$setOnInsert": {
+        "item_name": source["item_name"],
+        "category": source.get("category", "Other"),
+        "unit": source.get("unit"),
+        "description": source.get("description", ""),
+        "created_at": now,
+    }})
+    try:
+        credited = inventory.find_one_and_update(dict(filter_, **key), insert, CREDIT_PROJECTION, upsert=True,
+                                                 return_document=ReturnDocument.AFTER, session=session)
+    except DuplicateKeyError:
+        if session is not None:
+            raise
+        # A concurrent transfer created it first
+        credited = inventory.find_one_and_update(filter_, update, CREDIT_PROJECTION,
+                                                 return_document=ReturnDocument.AFTER, session=session)
+        if credited is None:
+            raise TransferError("The receiving item changed while sending, please retry")
+        return credited, False
+    return credited, True
+
+
+def _pending_request(requests, request_id, center_id, item_name, session=None):
+    """The receiver's pending request a transfer of item_name can count towards"""
+    request = requests.find_one({"_id": request_id, "center_id": center_id, "status": "Pending"}, session=session)
+    if request is None:
+        raise TransferError("The request is no longer pending")
+    if normalize(request.get("item_name")) != normalize(item_name):
+        raise TransferError(f"The request is for {request.get('item_name')}, not {item_name}")
+    return request
+
+
+def _fulfil(requests, request_id, quantity, transaction_id, now, session=None):
+    """Count a transfer towards a request; it is Fulfilled once enough units arrived"""
+    request = requests.find_one_and_update(
+        {"_id": request_id, "status": "Pending"},
+        {"$inc": {"fulfilled_quantity": quantity}, "$push": {"transaction_ids": transaction_id},
+         "$set": {"transaction_id": transaction_id, "updated_at": now}},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+    if request is not None and request.get("fulfilled_quantity", 0) >= int(request.get("quantity") or 0):
+        requests.update_one({"_id": request_id, "status": "Pending"}, {"$set": {"status": "Fulfilled"}},
+                            session=session)
+
+
+def _apply(db, item_id, from_center, to_center, quantity, request_id, created_by, session=None):
+    inventory = db["inventory"]
+    now = datetime.now()
+
+    source, lots = _debit(inventory, item_id, from_center, quantity, now, session)
+    if source is None:
+        current = inventory.find_one({"_id": item_id, "center_id": from_center}, {"quantity": 1}, session=session)
+        if current is None:
+            raise TransferError("Item not found in your inventory")
+        raise TransferError(f"Only {current.get('quantity', 0)} available")
+
+    try:
+        if request_id is not None:
+            _pending_request(db["requests"], request_id, to_center, source["item_name"], session)
+        credited, created = _credit(inventory, source, to_center, quantity, lots, now, session)
+    except Exception:
+        if session is None:
+            # No transaction to roll back: give the stock back
+            inventory.update_one({"_id": item_id}, add_lots({"$inc": {"quantity": quantity, "version": 1},
+                                                             "$set": {"updated_at": datetime.now()}}, lots))
+        raise
+
+    transaction = {
+        "transaction_id": str(uuid.uuid4()),
+        "type": "transfer",
+        "from_center_id": from_center,
+        "to_center_id": to_center,
+        "item_id": source.get("item_id"),
+        "from_item": item_id,
+        "to_item": credited["_id"],
+        "item_name": source["item_name"],
+        "category": source.get("category"),
+        "unit": source.get("unit"),
+        "quantity": quantity,
+        "lots": lots,
+        "request_id": request_id,
+        "created_by": created_by,
+        "status": "completed",
+        "created_at": now,
+        "updated_at": now,
+    }
+    db["transactions"].insert_one(transaction, session=session)
+    pairs = [
+        (dict(source, quantity=source.get("quantity", 0) + quantity), source),
+        (None if created else dict(credited, quantity=credited.get("quantity", 0) - quantity), credited),
+    ]
+    record_changes(db, changes_from(pairs), "transfer", now, session)
+    record_summary(db, pairs, session)
+
+    if request_id is not None:
+        _fulfil(db["requests"], request_id, quantity, transaction["transaction_id"], now, session)
+    return transaction
+
+
+def transfer_stock(db, item_id, from_center, to_center, quantity, request_id=None, created_by=None):
+    """Move quantity units of an item to another center; return the transaction.
+
+    Raises TransferError when the sender does not hold enough stock or the
+    transfer cannot be applied.
+    """
+    quantity = int(quantity)
+    if quantity <= 0:
+        raise TransferError("Quantity must be at least 1")
+    if from_center == to_center:
+        raise TransferError("Cannot transfer to your own center")
+    item_id = ObjectId(item_id)
+    request_id = ObjectId(request_id) if request_id is not None else None
+
+    try:
+        with db.client.start_session() as session:
+            return session.with_transaction(
+                lambda s: _apply(db, item_id, from_center, to_center, quantity, request_id, created_by, s)
+            )
+    except DuplicateKeyError:
+        # Not transient, so with_transaction does not retry it
+        raise TransferError("The receiving center's stock changed while sending, please retry")
+    except OperationFailure as e:
+        if e.code != ILLEGAL_OPERATION:
+            raise
+    except NotImplementedError:
+        # Client or server without session support
+        pass
+    return _apply(db, item_id, from_center, to_center, quantity, request_id, created_by)
+
@@ -1,49 +1,201 @@
 import streamlit as st
-from pymongo import MongoClient
-from pymongo.server_api import ServerApi
 import bcrypt
 import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 import uuid
 from streamlit_cookies_controller import CookieController
+from migrations import DATABASE_NAME, run_migrations
+from mongo_config import create_client, read_preference, warm_up
+from cache import NETWORK, ReadCache
+from watcher import NetworkWatcher
+from matching import MatchIndex
+from search import TrigramIndex
+from auth import SESSION_TTL_SECONDS, create_session_token, verify_session_token
+from monitoring import CommandMonitor, start_metrics_server
 
 load_dotenv()
 
 MONGODB_URI = os.getenv("MONGODB_URI")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+WATCHER_POLL_SECONDS = float(os.getenv("WATCHER_POLL_SECONDS", "5"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", "16"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+MONITOR_BUFFER_SIZE = int(os.getenv("MONITOR_BUFFER_SIZE", "5000"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = no /metrics endpoint
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+MONITOR_REPLY_SIZES = os.getenv("MONITOR_REPLY_SIZES", "0").lower() in ("1", "true", "yes")
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("HELPKART_ADMIN_EMAILS", "").split(",") if email.strip()}
+
+# Without a configured secret, sessions only survive until the server restarts
+SESSION_SECRET = os.getenv("SESSION_SECRET") or secrets.token_hex(32)
 
 COOKIE_PREFIX = "helpkart"
+SESSION_COOKIE = f"{COOKIE_PREFIX}_session"
 
 def get_cookie_controller():
     # Use a fixed key so the component is stable across reruns
     return CookieController(key="helpkart_cookies")
 
 
+@st.cache_resource
+def get_command_monitor():
+    """Create the process-wide MongoDB command monitor (and /metrics endpoint if configured)"""
+    monitor = CommandMonitor(capacity=MONITOR_BUFFER_SIZE, slow_ms=SLOW_QUERY_MS, size_replies=MONITOR_REPLY_SIZES)
+    if METRICS_PORT:
+        cache = get_read_cache()
+        start_metrics_server(monitor, METRICS_PORT, extra=lambda: cache_metrics_text(cache), host=METRICS_HOST)
+    return monitor
+
+def cache_metrics_text(cache):
+    """Read cache gauges in the Prometheus text format"""
+    lines = ["# TYPE helpkart_read_cache gauge"]
+    for name, value in cache.stats().items():
+        if isinstance(value, (int, float)):
+            lines.append(f'helpkart_read_cache{{stat="{name}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def is_admin(email):
+    """Whether an account may open the Diagnostics page"""
+    return bool(email) and email.strip().lower() in ADMIN_EMAILS
+
+# Migration failure of the cached client, shown by get_database; the first
+# connection usually happens on the warm-up thread, where st.* output is lost
+_migration_error = None
+
 @st.cache_resource
 def get_mongo_client():
-    """Create and cache MongoDB connection"""
+    """Create and cache MongoDB connection.
+
+    Raises when the server cannot be reached, so a failed connection is not
+    cached and the next page load tries again.
+    """
+    global _migration_error
+    client = create_client(MONGODB_URI, tls=True, tlsAllowInvalidCertificates=False,
+                           event_listeners=[get_command_monitor()])
+    client.admin.command('ping')
+
+    try:
+        run_migrations(client[DATABASE_NAME])
+        _migration_error = None
+    except Exception as e:
+        # Missing indexes only slow queries down, so keep the app usable
+        _migration_error = e
+    warm_up(client)
+    return client
+
+def _connect_in_background():
+    try:
+        get_mongo_client()
+    except Exception:
+        # get_database reports it on the page
+        pass
+
+@st.cache_resource
+def start_client_warm_up():
+    """Connect, migrate and fill the pool in the background while the login page shows"""
+    thread = threading.Thread(target=_connect_in_background, name="helpkart-mongo-connect", daemon=True)
+    thread.start()
+    return thread
+
+def get_database(workload=None):
+    """Get the helpkart database, reading with the workload's read preference"""
     try:
-        client = MongoClient(MONGODB_URI, server_api=ServerApi('1'), tls=True, tlsAllowInvalidCertificates=False)
-        client.admin.command('ping')
-        return client
+        client = get_mongo_client()
     except Exception as e:
         st.error(f"Failed to connect to MongoDB: {e}")
         return None
+    if _migration_error is not None and not st.session_state.get("migration_warning_shown"):
+        st.session_state.migration_warning_shown = True
+        st.warning(f"Database migrations failed: {_migration_error}")
+    if workload is None:
+        return client[DATABASE_NAME]
+    return client.get_database(DATABASE_NAME, read_preference=read_preference(workload))
+
+@st.cache_resource
+def get_read_cache():
+    """Create the process-wide read cache shared by every session"""
+    return ReadCache(max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS)
+
+@st.cache_resource
+def get_network_watcher():
+    """Start the process-wide change watcher (None without a database)"""
+    db = get_database()
+    if db is None:
+        return None
+    return NetworkWatcher(db, get_read_cache(), poll_interval=WATCHER_POLL_SECONDS).start()
 
-def get_database():
-    """Get the helpkart database"""
-    client = get_mongo_client()
-    if client is not None:
-        return client["helpkart_db"]
-    return None
+@st.cache_resource
+def get_bcrypt_pool():
+    """Bounded pool for bcrypt work so a burst of logins cannot hog every core"""
+    return ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="helpkart-bcrypt")
+
+@st.cache_resource
+def get_query_pool():
+    """Pool that runs the independent queries of a page concurrently (see data_access)"""
+    return ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="helpkart-query")
+
+def _hashpw(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+@st.cache_resource
+def get_match_index():
+    """Build the request matching index and keep it fed by the network watcher"""
+    watcher = get_network_watcher()
+    if watcher is None:
+        return None
+    index = MatchIndex()
+    watcher.view.add_listener(index.on_change)
+    return index
+
+@st.cache_resource
+def get_trigram_index():
+    """Build the fuzzy search vocabulary and keep it fed by the network watcher"""
+    watcher = get_network_watcher()
+    if watcher is None:
+        return None
+    index = TrigramIndex()
+    watcher.view.add_listener(index.on_change)
+    return index
+
+def get_center_names():
+    """Map of center _id (as string) to center name, cached network-wide"""
+    db = get_database()
+    if db is None:
+        return {}
+    return get_read_cache().get_or_load(
+        NETWORK, "centers", "names",
+        lambda: {str(c["_id"]): c.get("center_name", "") for c in db["centers"].find({}, {"center_name": 1})}
+    )
 
 def hash_password(password):
     """Hash password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return get_bcrypt_pool().submit(_hashpw, password).result()
 
 def verify_password(password, hashed):
     """Verify password against hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    return get_bcrypt_pool().submit(_checkpw, password, hashed).result()
+
+def set_session_cookie(controller, center_id, email, center_name):
+    """Store a signed session token for the logged-in center"""
+    token = create_session_token(SESSION_SECRET, center_id, email, center_name)
+    controller.set(SESSION_COOKIE, token, max_age=SESSION_TTL_SECONDS)
+
+def read_session_cookie(controller):
+    """Return the claims of a valid session cookie, or None"""
+    try:
+        token = controller.get(SESSION_COOKIE)
+    except Exception:
+        return None
+    return verify_session_token(SESSION_SECRET, token)
 
 def init_session_state():
     """Initialize session state variables"""
@@ -0,0 +1,308 @@
+"""Background watcher that keeps a server process in sync with the network.
+
+One NetworkWatcher runs per server process (see utils.get_network_watcher).
+It consumes change streams on `inventory` and `requests`, keeps an in-memory
+NetworkView of every center's inventory up to date and invalidates the read
+cache for the centers a change touched. The resume token is stored in
+`watcher_state` so a restarted process picks up where it left off.
+
+Change streams need a replica set. On a standalone mongod the watcher falls
+back to polling both collections on (updated_at, _id).
+"""
+import logging
+import socket
+import threading
+import time
+from datetime import datetime
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure, PyMongoError
+from cache import NETWORK
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = ("inventory", "requests")
+STATE_COLLECTION = "watcher_state"
+
+# Server error codes that mean change streams cannot be used at all
+CHANGE_STREAMS_UNSUPPORTED = {40573, 40324}
+# Server error codes that mean the stored resume token is no longer usable
+RESUME_TOKEN_LOST = {260, 280, 286}
+
+# Fields kept in memory for every inventory item in the network
+NETWORK_VIEW_PROJECTION = {
+    "center_id": 1,
+    "item_name": 1,
+    "description": 1,
+    "category": 1,
+    "quantity": 1,
+    "unit": 1,
+    "earliest_expiry": 1,
+    "updated_at": 1,
+}
+
+
+class NetworkView:
+    """In-memory copy of every center's inventory, patched incrementally"""
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+        # Held while a change is applied and announced, so listeners see
+        # changes in order and a replay to a new listener cannot interleave
+        self._notify_lock = threading.RLock()
+        self._listeners = []
+        self.version = 0
+        self.updated_at = None
+
+    def add_listener(self, listener):
+        """Call listener(old_doc, new_doc) for every change; either may be None"""
+        with self._notify_lock:
+            with self._lock:
+                self._listeners.append(listener)
+                items = list(self._items.values())
+            for doc in items:
+                listener(None, doc)
+
+    def _notify(self, old, new):
+        for listener in list(self._listeners):
+            try:
+                listener(old, new)
+            except Exception:
+                logger.exception("Network view listener failed")
+
+    def load(self, docs):
+        """Replace the view with a fresh snapshot"""
+        fresh = {doc["_id"]: _project(doc) for doc in docs}
+        with self._notify_lock:
+            with self._lock:
+                old_items, self._items = self._items, fresh
+                self._touch()
+            for _id, old in old_items.items():
+                if _id not in fresh:
+                    self._notify(old, None)
+            for _id, new in fresh.items():
+                self._notify(old_items.get(_id), new)
+
+    def upsert(self, doc):
+        """Insert or replace one item and return its previous version"""
+        new = _project(doc)
+        with self._notify_lock:
+            with self._lock:
+                old = self._items.get(doc["_id"])
+                self._items[doc["_id"]] = new
+                self._touch()
+            self._notify(old, new)
+        return old
+
+    def remove(self, _id):
+        """Drop one item and return it, or None if it was unknown"""
+        with self._notify_lock:
+            with self._lock:
+                old = self._items.pop(_id, None)
+                self._touch()
+            if old is not None:
+                self._notify(old, None)
+        return old
+
+    def get(self, _id):
+        with self._lock:
+            return self._items.get(_id)
+
+    def items(self):
+        """Return a snapshot list of every item in the network"""
+        with self._lock:
+            return list(self._items.values())
+
+    def stats(self):
+        with self._lock:
+            centers = {doc.get("center_id") for doc in self._items.values()}
+            return {
+                "items": len(self._items),
+                "centers": len(centers),
+                "version": self.version,
+                "updated_at": self.updated_at,
+            }
+
+    def _touch(self):
+        self.version += 1
+        self.updated_at = datetime.now()
+
+
+def _project(doc):
+    """Keep only the fields of NETWORK_VIEW_PROJECTION"""
+    projected = {field: doc[field] for field in NETWORK_VIEW_PROJECTION if field in doc}
+    projected["_id"] = doc["_id"]
+    return projected
+
+
+class NetworkWatcher:
+    """Thread that follows inventory/requests changes for this process"""
+
+    def __init__(self, db, cache, poll_interval=5.0, resync_every=60):
+        self.db = db
+        self.cache = cache
+        self.view = NetworkView()
+        self.poll_interval = poll_interval
+        self.resync_every = resync_every  # polls between full id resyncs
+        self.mode = "starting"
+        self.state_id = f"network_watcher:{socket.gethostname()}"
+        self._stop = threading.Event()
+        self._thread = None
+        self._token_saved_at = 0.0
+        self._saved_token = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="helpkart-network-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.mode == "polling":
+                    self._poll()
+                else:
+                    self._watch()
+                    if not self._stop.is_set():
+                        # Invalidated or closed by the server; reopen it
+                        logger.info("Change stream closed; reconnecting")
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    logger.info("Change streams unavailable (%s); polling instead", e)
+                    self.mode = "polling"
+                    continue
+                if e.code in RESUME_TOKEN_LOST:
+                    logger.warning("Resume token expired; reloading the network view")
+                    self._save_token(None)
+                    continue
+                logger.exception("Change stream failed; retrying")
+            except NotImplementedError:
+                self.mode = "polling"
+                continue
+            except PyMongoError:
+                logger.exception("Watcher failed; retrying")
+            self._stop.wait(self.poll_interval)
+
+    # ---- change streams ----
+
+    def _watch(self):
+        if not hasattr(type(self.db), "watch"):
+            # In-memory stand-ins (e.g. mongomock) have no change streams
+            raise NotImplementedError("database does not support change streams")
+        state = self.db[STATE_COLLECTION].find_one({"_id": self.state_id}) or {}
+        pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}}]
+        with self.db.watch(pipeline, full_document="updateLookup",
+                           resume_after=state.get("resume_token"), max_await_time_ms=1000) as stream:
+            # Opening the stream first means no change can slip in between the
+            # snapshot and the first event; replayed events are idempotent.
+            self._reload()
+            self.mode = "change_stream"
+            while not self._stop.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    self._apply_change(change)
+                self._save_token(stream.resume_token)
+
+    def _apply_change(self, change):
+        collection = change["ns"]["coll"]
+        operation = change["operationType"]
+        doc = change.get("fullDocument")
+        _id = change.get("documentKey", {}).get("_id")
+
+        if collection == "inventory":
+            if operation == "delete" or doc is None:
+                old = self.view.remove(_id)
+                center_id = old.get("center_id") if old else None
+            else:
+                old = self.view.upsert(doc)
+                center_id = doc.get("center_id")
+            self._invalidate(center_id, old.get("center_id") if old else None, NETWORK)
+        else:
+            self._invalidate(doc.get("center_id") if doc else None)
+
+    def _save_token(self, token):
+        # Persist only new tokens, at most every few seconds, to keep write load low
+        now = time.monotonic()
+        if token is not None and (token == self._saved_token or now - self._token_saved_at < self.poll_interval):
+            return
+        self._token_saved_at = now
+        self._saved_token = token
+        self.db[STATE_COLLECTION].update_one(
+            {"_id": self.state_id},
+            {"$set": {"resume_token": token, "updated_at": datetime.now()}},
+            upsert=True
+        )
+
+    # ---- polling fallback ----
+
+    def _poll(self):
+        self.mode = "polling"
+        self._reload()
+        marks = {name: self._latest_mark(name) for name in WATCHED_COLLECTIONS}
+        polls = 0
+        while not self._stop.wait(self.poll_interval):
+            try:
+                for name in WATCHED_COLLECTIONS:
+                    marks[name] = self._poll_collection(name, marks[name])
+                polls += 1
+                # Polling cannot see deletes, so resync the id set now and then
+                if polls % self.resync_every == 0:
+                    self._resync_deletes()
+            except PyMongoError:
+                logger.exception("Polling for changes failed")
+
+    def _latest_mark(self, name):
+        doc = self.db[name].find_one({}, {"updated_at": 1}, sort=[("updated_at", -1), ("_id", -1)])
+        return (doc.get("updated_at"), doc["_id"]) if doc else None
+
+    def _poll_collection(self, name, mark):
+        query = {}
+        if mark is not None:
+            updated_at, last_id = mark
+            query = {"$or": [
+                {"updated_at": {"$gt": updated_at}},
+                {"updated_at": updated_at, "_id": {"$gt": last_id}},
+            ]}
+        projection = NETWORK_VIEW_PROJECTION if name == "inventory" else {"center_id": 1, "updated_at": 1}
+        for doc in self.db[name].find(query, projection).sort([("updated_at", ASCENDING), ("_id", ASCENDING)]):
+            self._apply_change({
+                "ns": {"coll": name},
+                "operationType": "update",
+                "documentKey": {"_id": doc["_id"]},
+                "fullDocument": doc,
+            })
+            mark = (doc.get("updated_at"), doc["_id"])
+        return mark
+
+    def _resync_deletes(self):
+        live_ids = {doc["_id"] for doc in self.db["inventory"].find({}, {"_id": 1})}
+        for doc in self.view.items():
+            if doc["_id"] not in live_ids:
+                self._apply_change({
+                    "ns": {"coll": "inventory"},
+                    "operationType": "delete",
+                    "documentKey": {"_id": doc["_id"]},
+                })
+
+    # ---- shared ----
+
+    def _reload(self):
+        self.view.load(self.db["inventory"].find({}, NETWORK_VIEW_PROJECTION))
+        # Anything cached before the snapshot may have missed remote writes
+        self.cache.clear()
+
+    def _invalidate(self, *center_ids):
+        center_ids = [c for c in center_ids if c is not None]
+        if center_ids:
+            self.cache.invalidate(*set(center_ids))
+        else:
+            self.cache.clear()
+
+    def stats(self):
+        return dict(self.view.stats(), mode=self.mode)